@@ -0,0 +1,337 @@
+import asyncio
+import contextvars
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Callable, Deque, Dict, Optional, Tuple
+
+from fastapi import HTTPException, Request
+
+# Token cost of one request per endpoint, override with ADMISSION_COST_<NAME>
+COSTS: Dict[str, float] = {
+    "chat": 1,
+    "mindmap": 2,
+    "expand": 1,
+    "audio": 4,
+    "art": 5,
+}
+
+# Concurrent calls per upstream and worker, override with ADMISSION_<UPSTREAM>_CONCURRENCY (0 = no cap)
+UPSTREAM_CONCURRENCY: Dict[str, int] = {
+    "gemini": 32,
+    "hf": 8,
+}
+
+# Who the current request is charged to; fair queueing for upstream slots uses it
+current_client: contextvars.ContextVar[str] = contextvars.ContextVar("admission_client", default="-")
+
+
+def _setting(name: str, default: float) -> float:
+    try:
+        return float(os.getenv(name, default))
+    except (TypeError, ValueError):
+        return default
+
+
+def _refill(tokens: float, updated: float, now: float, rate: float, burst: float) -> float:
+    return min(burst, tokens + max(0.0, now - updated) * rate)
+
+
+class MemoryBuckets:
+    """Token buckets in this process only (one worker, tests)."""
+
+    def __init__(self):
+        self._buckets: Dict[str, Tuple[float, float]] = {}
+        self._lock = threading.Lock()
+
+    def take(self, key: str, cost: float, rate: float, burst: float) -> float:
+        """Take `cost` tokens; returns 0 on success, else seconds until they are available."""
+        now = time.time()
+        with self._lock:
+            tokens, updated = self._buckets.get(key, (burst, now))
+            tokens = _refill(tokens, updated, now, rate, burst)
+            if tokens >= cost:
+                self._buckets[key] = (tokens - cost, now)
+                return 0.0
+            self._buckets[key] = (tokens, now)
+        return (cost - tokens) / rate if rate > 0 else 3600.0
+
+    def clear(self) -> None:
+        with self._lock:
+            self._buckets.clear()
+
+
+class SQLiteBuckets(MemoryBuckets):
+    """Token buckets in a SQLite file shared by every worker on the host."""
+
+    def __init__(self, path: Optional[str] = None):
+        super().__init__()
+        self.path = path or os.getenv("ADMISSION_DB_PATH", "admission.db")
+        self._conn: Optional[sqlite3.Connection] = None
+        self._takes = 0
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            conn = sqlite3.connect(self.path, timeout=5.0, check_same_thread=False, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            # Losing the last few updates on a crash only refills some buckets early
+            conn.execute("PRAGMA synchronous=OFF")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS admission_buckets ("
+                "key TEXT PRIMARY KEY, tokens REAL NOT NULL, updated REAL NOT NULL)"
+            )
+            self._conn = conn
+        return self._conn
+
+    def take(self, key: str, cost: float, rate: float, burst: float) -> float:
+        with self._lock:
+            conn = self._connect()
+            # IMMEDIATE takes the write lock up front, so read-modify-write is atomic across workers
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                now = time.time()
+                row = conn.execute(
+                    "SELECT tokens, updated FROM admission_buckets WHERE key = ?", (key,)).fetchone()
+                tokens = _refill(*(row or (burst, now)), now, rate, burst)
+                allowed = tokens >= cost
+                conn.execute(
+                    "INSERT OR REPLACE INTO admission_buckets (key, tokens, updated) VALUES (?, ?, ?)",
+                    (key, tokens - cost if allowed else tokens, now),
+                )
+                self._takes += 1
+                if self._takes % 1000 == 0 and rate > 0:
+                    # Buckets idle long enough to be full again carry no state
+                    conn.execute("DELETE FROM admission_buckets WHERE updated < ?", (now - burst / rate,))
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+        if allowed:
+            return 0.0
+        return (cost - tokens) / rate if rate > 0 else 3600.0
+
+    def clear(self) -> None:
+        with self._lock:
+            self._connect().execute("DELETE FROM admission_buckets")
+
+
+BACKENDS: Dict[str, Callable[[], MemoryBuckets]] = {
+    "memory": MemoryBuckets,
+    "sqlite": SQLiteBuckets,
+}
+
+
+def register_backend(name: str, factory: Callable[[], MemoryBuckets]) -> None:
+    BACKENDS[name] = factory
+
+
+class FairGate:
+    """Concurrency cap for one upstream. When every slot is taken, callers wait
+    in one queue per client and freed slots go to the clients round-robin, so
+    a client with many queued requests cannot starve the others."""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.active = 0
+        self._waiting: "OrderedDict[str, Deque[asyncio.Future]]" = OrderedDict()
+        self._hold = 0.0  # moving average of how long a slot is held
+        self.counters = {"admitted": 0, "queued": 0, "rejected": 0, "timedOut": 0}
+
+    def limit(self) -> int:
+        return int(_setting(f"ADMISSION_{self.name.upper()}_CONCURRENCY",
+                            UPSTREAM_CONCURRENCY.get(self.name, 0)))
+
+    @property
+    def waiting(self) -> int:
+        return sum(len(q) for q in self._waiting.values())
+
+    def retry_after(self) -> int:
+        limit = max(self.limit(), 1)
+        return max(1, int(self._hold * (self.waiting + 1) / limit) + 1)
+
+    def _reject(self, counter: str, detail: str) -> HTTPException:
+        self.counters[counter] += 1
+        return HTTPException(429, detail=detail, headers={"Retry-After": str(self.retry_after())})
+
+    async def acquire(self, client: str) -> None:
+        limit = self.limit()
+        if limit <= 0 or (self.active < limit and not self._waiting):
+            self.active += 1
+            self.counters["admitted"] += 1
+            return
+        if self.waiting >= int(_setting("ADMISSION_QUEUE_MAX", 100)):
+            raise self._reject("rejected", f"Too many requests waiting for {self.name}, retry later")
+        future = asyncio.get_running_loop().create_future()
+        self._waiting.setdefault(client, deque()).append(future)
+        self.counters["queued"] += 1
+        try:
+            # release() hands its slot over by resolving the future (active is not decremented)
+            await asyncio.wait_for(future, _setting("ADMISSION_QUEUE_TIMEOUT", 30))
+        except asyncio.TimeoutError:
+            self._forget(client, future)
+            raise self._reject("timedOut", f"Timed out waiting for {self.name}, retry later") from None
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                self.release()  # the slot arrived just as we were cancelled
+            else:
+                self._forget(client, future)
+            raise
+        self.counters["admitted"] += 1
+
+    def _forget(self, client: str, future: asyncio.Future) -> None:
+        queue = self._waiting.get(client)
+        if queue is not None and future in queue:
+            queue.remove(future)
+            if not queue:
+                del self._waiting[client]
+
+    def release(self) -> None:
+        while self._waiting:
+            client, queue = next(iter(self._waiting.items()))
+            future = queue.popleft()
+            if queue:
+                self._waiting.move_to_end(client)
+            else:
+                del self._waiting[client]
+            if not future.done():
+                future.set_result(None)
+                return
+        self.active -= 1
+
+    @asynccontextmanager
+    async def slot(self) -> AsyncIterator[None]:
+        await self.acquire(current_client.get())
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self._hold = 0.8 * self._hold + 0.2 * (time.perf_counter() - start)
+            self.release()
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            **self.counters,
+            "limit": self.limit(),
+            "active": self.active,
+            "waiting": self.waiting,
+            "waitingClients": len(self._waiting),
+        }
+
+
+class Admission:
+    """Per-client token buckets (cost weighted per endpoint) in front of the
+    expensive routes, plus fair concurrency caps around upstream calls.
+
+    Clients are identified by the X-User-Id header or `user_id` query
+    parameter, falling back to the client IP (ADMISSION_IDENTITY=ip ignores
+    user ids, which are self-declared). Bucket state lives in the backend
+    chosen by ADMISSION_BACKEND: sqlite (shared by the workers on one host)
+    or memory (this process only).
+    """
+
+    def __init__(self):
+        self._backend: Optional[MemoryBuckets] = None
+        self._backend_name: Optional[str] = None
+        self.gates: Dict[str, FairGate] = {}
+        self.counters: Dict[str, Dict[str, int]] = {}
+
+    @property
+    def enabled(self) -> bool:
+        return os.getenv("ADMISSION_ENABLED", "true").lower() != "false"
+
+    @property
+    def backend(self) -> MemoryBuckets:
+        name = os.getenv("ADMISSION_BACKEND", "sqlite").lower()
+        if self._backend is None or name != self._backend_name:
+            factory = BACKENDS.get(name)
+            if factory is None:
+                raise RuntimeError(f"Unknown ADMISSION_BACKEND '{name}'")
+            self._backend, self._backend_name = factory(), name
+        return self._backend
+
+    def identity(self, request: Request) -> str:
+        if os.getenv("ADMISSION_IDENTITY", "user").lower() != "ip":
+            user = request.headers.get("x-user-id") or request.query_params.get("user_id")
+            if user:
+                return f"user:{user.strip()[:128]}"
+        if os.getenv("ADMISSION_TRUST_FORWARDED", "false").lower() == "true":
+            forwarded = request.headers.get("x-forwarded-for", "").split(",")[0].strip()
+            if forwarded:
+                return f"ip:{forwarded}"
+        return f"ip:{request.client.host if request.client else 'unknown'}"
+
+    def cost(self, name: str) -> float:
+        return _setting(f"ADMISSION_COST_{name.upper()}", COSTS.get(name, 1))
+
+    async def charge(self, request: Request, name: str) -> None:
+        """Take `name`'s cost from the caller's bucket or raise 429 with Retry-After."""
+        client = self.identity(request)
+        current_client.set(client)
+        if not self.enabled:
+            return
+        counters = self.counters.setdefault(name, {"admitted": 0, "limited": 0})
+        wait = await asyncio.to_thread(
+            self.backend.take, client, self.cost(name),
+            _setting("ADMISSION_RATE", 1.0), _setting("ADMISSION_BURST", 30))
+        if wait > 0:
+            counters["limited"] += 1
+            raise HTTPException(
+                429, detail=f"Rate limit exceeded for '{name}', retry later",
+                headers={"Retry-After": str(int(wait) + 1)})
+        counters["admitted"] += 1
+
+    async def pace(self, request: Request, name: str) -> None:
+        """Like charge, but wait until the caller's bucket has refilled instead of
+        raising (items of a batch, which run under their own timeout)."""
+        client = self.identity(request)
+        current_client.set(client)
+        if not self.enabled:
+            return
+        counters = self.counters.setdefault(name, {"admitted": 0, "limited": 0})
+        while True:
+            wait = await asyncio.to_thread(
+                self.backend.take, client, self.cost(name),
+                _setting("ADMISSION_RATE", 1.0), _setting("ADMISSION_BURST", 30))
+            if wait <= 0:
+                break
+            counters["limited"] += 1
+            await asyncio.sleep(wait)
+        counters["admitted"] += 1
+
+    def limit(self, name: str) -> Callable[[Request], Any]:
+        """FastAPI dependency charging the caller `name`'s cost."""
+        async def dependency(request: Request) -> None:
+            await self.charge(request, name)
+        return dependency
+
+    def gate(self, upstream: str) -> FairGate:
+        gate = self.gates.get(upstream)
+        if gate is None:
+            gate = self.gates[upstream] = FairGate(upstream)
+        return gate
+
+    @asynccontextmanager
+    async def slot(self, upstream: str) -> AsyncIterator[None]:
+        """Hold one of `upstream`'s concurrency slots for the duration of the block."""
+        if not self.enabled:
+            yield
+            return
+        async with self.gate(upstream).slot():
+            yield
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "enabled": self.enabled,
+            "backend": os.getenv("ADMISSION_BACKEND", "sqlite").lower(),
+            "rate": _setting("ADMISSION_RATE", 1.0),
+            "burst": _setting("ADMISSION_BURST", 30),
+            "costs": {name: self.cost(name) for name in COSTS},
+            "routes": self.counters,
+            "upstreams": {name: gate.as_dict() for name, gate in self.gates.items()},
+        }
+
+
+admission = Admission()
@@ -0,0 +1,124 @@
+import asyncio
+import base64
+import hashlib
+import os
+import re
+import threading
+import time
+from typing import Any, Dict, Optional
+
+EXTENSIONS = {
+    "image/png": "png",
+    "image/jpeg": "jpg",
+    "image/webp": "webp",
+    "image/avif": "avif",
+    "image/gif": "gif",
+    "image/svg+xml": "svg",
+    "audio/mpeg": "mp3",
+}
+
+_NAME_RE = re.compile(r"^([0-9a-f]{64})\.([a-z0-9]{2,5})$")
+
+
+def data_urls_enabled() -> bool:
+    """Compatibility mode: inline generated media as base64 data URLs."""
+    return os.getenv("ARTIFACT_DATA_URLS", "false").lower() == "true"
+
+
+def to_data_url(data: bytes, mime: str) -> str:
+    return f"data:{mime};base64,{base64.b64encode(data).decode('utf-8')}"
+
+
+class ArtifactStore:
+    """Content-addressed files on local disk: each blob is written once as <sha256>.<ext>.
+
+    Files are sharded by the first two hex digits of the hash. Eviction removes
+    files older than `max_age` seconds, then the least recently written ones
+    until the store is under `max_bytes`.
+    """
+
+    def __init__(self, root: str, max_bytes: int, max_age: float):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self._lock = threading.Lock()
+        self._last_sweep = 0.0
+        self.counters = {"writes": 0, "dedupHits": 0, "evicted": 0, "evictedBytes": 0}
+
+    def path_for(self, name: str) -> Optional[str]:
+        if not _NAME_RE.match(name):
+            return None
+        return os.path.join(self.root, name[:2], name)
+
+    def exists(self, name: str) -> bool:
+        path = self.path_for(name)
+        return bool(path) and os.path.isfile(path)
+
+    def put(self, data: bytes, mime: str) -> str:
+        """Store `data` (blocking) and return its artifact name."""
+        digest = hashlib.sha256(data).hexdigest()
+        name = f"{digest}.{EXTENSIONS.get(mime, 'bin')}"
+        path = self.path_for(name)
+        if os.path.isfile(path):
+            # Same content already stored; refresh its age for eviction
+            os.utime(path)
+            self.counters["dedupHits"] += 1
+        else:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(tmp, "wb") as f:
+                f.write(data)
+            os.replace(tmp, path)
+            self.counters["writes"] += 1
+        if time.time() - self._last_sweep > float(os.getenv("ARTIFACT_SWEEP_INTERVAL", "60")):
+            self.evict()
+        return name
+
+    def evict(self) -> int:
+        with self._lock:
+            self._last_sweep = time.time()
+            entries = []
+            for dirpath, _, filenames in os.walk(self.root):
+                for fn in filenames:
+                    path = os.path.join(dirpath, fn)
+                    try:
+                        st = os.stat(path)
+                    except FileNotFoundError:
+                        continue
+                    entries.append((st.st_mtime, st.st_size, path))
+            entries.sort()
+            total = sum(size for _, size, _ in entries)
+            cutoff = time.time() - self.max_age
+            removed = 0
+            for mtime, size, path in entries:
+                if mtime >= cutoff and total <= self.max_bytes:
+                    break
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+                total -= size
+                removed += 1
+                self.counters["evicted"] += 1
+                self.counters["evictedBytes"] += size
+            return removed
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            **self.counters,
+            "root": self.root,
+            "maxBytes": self.max_bytes,
+            "maxAgeSeconds": self.max_age,
+            "dataUrls": data_urls_enabled(),
+        }
+
+
+artifacts = ArtifactStore(
+    os.getenv("ARTIFACT_DIR", "artifacts"),
+    int(os.getenv("ARTIFACT_MAX_BYTES", str(1024 * 1024 * 1024))),
+    float(os.getenv("ARTIFACT_MAX_AGE", str(7 * 24 * 3600))),
+)
+
+
+async def save_artifact(data: bytes, mime: str) -> str:
+    return await asyncio.to_thread(artifacts.put, data, mime)
@@ -0,0 +1,107 @@
+import asyncio
+import json
+import os
+import time
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Tuple
+
+from fastapi import HTTPException
+from fastapi.responses import StreamingResponse
+
+# Produces one item's result; HTTPExceptions become that item's error line
+Handler = Callable[[Any], Awaitable[Any]]
+
+
+class BatchRunner:
+    """Fans a batch of items out over a handler with bounded concurrency and a
+    per-item timeout, streaming NDJSON lines as items finish:
+
+        {"type": "result", "index": 3, "data": {...}}
+        {"type": "error", "index": 5, "status": 504, "detail": "..."}
+        {"type": "done", "data": {"succeeded": 9, "failed": 1, "seconds": 4.2}}
+
+    A failed item never fails the batch.
+    """
+
+    def __init__(self):
+        self.counters = {"batches": 0, "items": 0, "succeeded": 0, "failed": 0, "timedOut": 0}
+
+    def options(self, payload: Dict[str, Any]) -> Tuple[List[Any], int, float]:
+        """Validate `items`, `concurrency` and `timeout` (seconds per item) of a batch request."""
+        items = payload.get("items")
+        if not isinstance(items, list) or not items:
+            raise HTTPException(400, detail="Invalid or missing 'items', expected a non-empty list")
+        max_items = int(os.getenv("BATCH_MAX_ITEMS", "500"))
+        if len(items) > max_items:
+            raise HTTPException(413, detail=f"Batch larger than {max_items} items")
+        try:
+            concurrency = int(payload.get("concurrency") or os.getenv("BATCH_CONCURRENCY", "8"))
+            timeout = float(payload.get("timeout") or os.getenv("BATCH_ITEM_TIMEOUT", "60"))
+        except (TypeError, ValueError):
+            raise HTTPException(400, detail="Invalid 'concurrency' or 'timeout'")
+        concurrency = max(1, min(concurrency, int(os.getenv("BATCH_MAX_CONCURRENCY", "32"))))
+        timeout = max(0.1, min(timeout, float(os.getenv("BATCH_MAX_ITEM_TIMEOUT", "300"))))
+        return items, concurrency, timeout
+
+    async def _run_one(self, index: int, item: Any, handler: Handler, timeout: float) -> Dict[str, Any]:
+        try:
+            result = await asyncio.wait_for(handler(item), timeout)
+            self.counters["succeeded"] += 1
+            return {"type": "result", "index": index, "data": result}
+        except asyncio.TimeoutError:
+            self.counters["timedOut"] += 1
+            status, detail = 504, f"Item timed out after {timeout:g} s"
+        except HTTPException as e:
+            status, detail = e.status_code, e.detail
+        except Exception as e:
+            status, detail = 502, str(e) or type(e).__name__
+        self.counters["failed"] += 1
+        return {"type": "error", "index": index, "status": status, "detail": detail}
+
+    async def run(self, items: List[Any], handler: Handler, concurrency: int,
+                  timeout: float) -> AsyncIterator[Dict[str, Any]]:
+        """Yield one line per item in completion order, then the summary line."""
+        self.counters["batches"] += 1
+        self.counters["items"] += len(items)
+        start = time.perf_counter()
+        lines: asyncio.Queue = asyncio.Queue()
+        pending = iter(enumerate(items))
+
+        async def worker() -> None:
+            for index, item in pending:
+                await lines.put(await self._run_one(index, item, handler, timeout))
+
+        workers = [asyncio.create_task(worker()) for _ in range(min(concurrency, len(items)))]
+        failed = 0
+        try:
+            for _ in range(len(items)):
+                line = await lines.get()
+                failed += line["type"] == "error"
+                yield line
+        finally:
+            # Also reached when the client disconnects: stop the remaining items
+            for task in workers:
+                task.cancel()
+            await asyncio.gather(*workers, return_exceptions=True)
+        yield {"type": "done", "data": {
+            "succeeded": len(items) - failed, "failed": failed,
+            "seconds": round(time.perf_counter() - start, 3)}}
+
+    def stream(self, payload: Dict[str, Any], handler: Handler) -> StreamingResponse:
+        """NDJSON response for a batch request body with `items`."""
+        items, concurrency, timeout = self.options(payload)
+
+        async def body() -> AsyncIterator[str]:
+            async for line in self.run(items, handler, concurrency, timeout):
+                yield json.dumps(line, ensure_ascii=False) + "\n"
+
+        return StreamingResponse(
+            body(),
+            media_type="application/x-ndjson",
+            headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+        )
+
+    def stats(self) -> Dict[str, Any]:
+        return dict(self.counters)
+
+
+batches = BatchRunner()
@@ -0,0 +1,177 @@
+import asyncio
+import os
+import time
+from typing import Any, Dict, List, Optional
+
+from .metrics import record_upstream
+
+
+def _setting(name: str, default: float) -> float:
+    try:
+        return float(os.getenv(name, default))
+    except (TypeError, ValueError):
+        return default
+
+
+class CircuitOpen(Exception):
+    """Raised when an upstream candidate is skipped because its breaker is open."""
+
+
+class CircuitBreaker:
+    """Closed -> open after UPSTREAM_BREAKER_FAILURES consecutive failures (or one
+    permanent failure such as 404/403), half-open once the cooldown has passed.
+
+    In half-open state a single probe is let through: success closes the
+    breaker, failure re-opens it with the cooldown doubled (up to
+    UPSTREAM_BREAKER_MAX_COOLDOWN).
+    """
+
+    def __init__(self):
+        self.state = "closed"
+        self.failures = 0
+        self.trips = 0
+        self.cooldown = 0.0
+        self.opened_at = 0.0
+        self.probing = False
+        self.last_success: Optional[float] = None
+        self.last_failure: Optional[float] = None
+        self.last_error: Optional[str] = None
+
+    def retry_in(self) -> float:
+        if self.state != "open":
+            return 0.0
+        return max(0.0, self.opened_at + self.cooldown - time.time())
+
+    def available(self) -> bool:
+        """Whether a call may be attempted now (no side effects)."""
+        if self.state == "closed":
+            return True
+        if self.state == "open":
+            return self.retry_in() == 0.0
+        return not self.probing
+
+    def acquire(self) -> None:
+        if self.state == "closed":
+            return
+        if not self.available():
+            raise CircuitOpen()
+        self.state = "half_open"
+        self.probing = True
+
+    def release(self) -> None:
+        """The attempt ended without an outcome (cancelled, caller-side error)."""
+        self.probing = False
+
+    def success(self) -> None:
+        self.state = "closed"
+        self.failures = 0
+        self.cooldown = 0.0
+        self.probing = False
+        self.last_success = time.time()
+
+    def failure(self, error: str, permanent: bool = False) -> None:
+        self.failures += 1
+        self.last_failure = time.time()
+        self.last_error = error[:200]
+        threshold = max(1, int(_setting("UPSTREAM_BREAKER_FAILURES", 3)))
+        if self.state == "half_open" or permanent or self.failures >= threshold:
+            base = _setting("UPSTREAM_BREAKER_COOLDOWN", 30)
+            limit = _setting("UPSTREAM_BREAKER_MAX_COOLDOWN", 1800)
+            self.cooldown = min(limit, self.cooldown * 2 if self.state == "half_open" else base)
+            self.state = "open"
+            self.opened_at = time.time()
+            self.trips += 1
+        self.probing = False
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            "state": self.state,
+            "failures": self.failures,
+            "trips": self.trips,
+            "retryIn": round(self.retry_in(), 1) if self.state == "open" else None,
+            "lastSuccess": self.last_success,
+            "lastFailure": self.last_failure,
+            "lastError": self.last_error,
+        }
+
+
+class Attempt:
+    """One call to one candidate. Use as a context manager and report the result
+    with success() / failure(); leaving without either releases a half-open probe.
+    The call's duration and outcome are recorded in the upstream metrics."""
+
+    def __init__(self, upstream: str, key: str, breaker: CircuitBreaker):
+        self.upstream = upstream
+        self.key = key
+        self.breaker = breaker
+        self.done = False
+        self._start = 0.0
+
+    def __enter__(self) -> "Attempt":
+        self.breaker.acquire()
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        if not self.done:
+            self.breaker.release()
+            self._record("cancelled" if exc_type is not None and issubclass(exc_type, asyncio.CancelledError)
+                         else "error")
+
+    def _record(self, outcome: str, nbytes: int = 0) -> None:
+        record_upstream(self.upstream, self.key, time.perf_counter() - self._start, outcome, nbytes)
+
+    def success(self, nbytes: int = 0) -> None:
+        self.done = True
+        self.breaker.success()
+        self._record("success", nbytes)
+
+    def failure(self, error: str, permanent: bool = False) -> None:
+        self.done = True
+        self.breaker.failure(error, permanent)
+        self._record("failure")
+
+
+class RouteTable:
+    """Remembers which candidate of each upstream fallback chain (API version,
+    model, endpoint) last worked and keeps a circuit breaker per candidate."""
+
+    def __init__(self):
+        self._breakers: Dict[str, Dict[str, CircuitBreaker]] = {}
+        self.counters: Dict[str, Dict[str, int]] = {}
+
+    def breaker(self, upstream: str, key: str) -> CircuitBreaker:
+        return self._breakers.setdefault(upstream, {}).setdefault(key, CircuitBreaker())
+
+    def order(self, upstream: str, chain: List[str]) -> List[str]:
+        """`chain` minus open candidates, with the most recently successful one first."""
+        counters = self.counters.setdefault(upstream, {"skipped": 0, "preferred": 0})
+        available = [k for k in chain if self.breaker(upstream, k).available()]
+        counters["skipped"] += len(chain) - len(available)
+        best = max(available, key=lambda k: self.breaker(upstream, k).last_success or 0.0, default=None)
+        if best is None or self.breaker(upstream, best).last_success is None:
+            return available
+        if best != chain[0]:
+            counters["preferred"] += 1
+        return [best] + [k for k in available if k != best]
+
+    def attempt(self, upstream: str, key: str) -> Attempt:
+        return Attempt(upstream, key, self.breaker(upstream, key))
+
+    def retry_after(self, upstream: str, chain: List[str]) -> int:
+        """Seconds until the first candidate of `chain` can be probed again."""
+        waits = [self.breaker(upstream, k).retry_in() for k in chain]
+        return max(1, int(min(waits, default=1.0)) + 1)
+
+    def stats(self, upstream: Optional[str] = None) -> Dict[str, Any]:
+        names = [upstream] if upstream else list(self._breakers)
+        return {
+            name: {
+                **self.counters.get(name, {"skipped": 0, "preferred": 0}),
+                "candidates": {k: b.as_dict() for k, b in self._breakers.get(name, {}).items()},
+            }
+            for name in names
+        }
+
+
+upstream_routes = RouteTable()
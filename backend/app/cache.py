@@ -0,0 +1,273 @@
+import asyncio
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from fastapi import Request
+
+from .similar import similar_index
+from .singleflight import single_flight
+
+# Per-route TTL in seconds (0 = caching disabled), override with CACHE_<ROUTE>_TTL
+ROUTE_TTLS: Dict[str, int] = {
+    "chat": 0,
+    "art": 86400,
+    "audio": 86400,
+    "mindmap": 86400,
+}
+
+BYPASS_HEADER = "X-Cache-Bypass"
+
+_MISSING = object()
+
+
+def normalize_prompt(prompt: str) -> str:
+    return " ".join(prompt.split()).casefold()
+
+
+def cache_key(endpoint: str, model: str, prompt: str, params: Optional[Dict[str, Any]] = None) -> str:
+    raw = json.dumps(
+        [endpoint, model, normalize_prompt(prompt), params or {}],
+        sort_keys=True, separators=(",", ":"), ensure_ascii=False,
+    )
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def similar_namespace(route: str, model: str, params: Optional[Dict[str, Any]] = None) -> str:
+    """Calls whose results may be reused for similar prompts: same route, model and params."""
+    return json.dumps([route, model, params or {}], sort_keys=True, separators=(",", ":"), ensure_ascii=False)
+
+
+def route_ttl(route: str) -> int:
+    if os.getenv("CACHE_ENABLED", "true").lower() == "false":
+        return 0
+    try:
+        return int(os.getenv(f"CACHE_{route.upper()}_TTL", ROUTE_TTLS.get(route, 0)))
+    except ValueError:
+        return ROUTE_TTLS.get(route, 0)
+
+
+def should_bypass(request: Optional[Request]) -> bool:
+    if request is None:
+        return False
+    if request.headers.get(BYPASS_HEADER, "").lower() in ("1", "true", "yes"):
+        return True
+    return "no-cache" in request.headers.get("cache-control", "").lower()
+
+
+class _DiskStore:
+    """SQLite-backed key/value store shared by every worker on the host."""
+
+    def __init__(self, path: str, max_entries: int):
+        self.path = path
+        self.max_entries = max_entries
+        self._conn: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            conn = sqlite3.connect(self.path, timeout=5.0, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS response_cache ("
+                "key TEXT PRIMARY KEY, value TEXT NOT NULL, expires REAL NOT NULL)"
+            )
+            conn.execute(
+                "CREATE INDEX IF NOT EXISTS ix_response_cache_expires ON response_cache (expires)")
+            self._conn = conn
+        return self._conn
+
+    def get(self, key: str) -> Any:
+        with self._lock:
+            row = self._connect().execute(
+                "SELECT value, expires FROM response_cache WHERE key = ?", (key,)).fetchone()
+        if row is None or row[1] < time.time():
+            return _MISSING, 0.0
+        return json.loads(row[0]), row[1]
+
+    def set(self, key: str, value: Any, expires: float) -> int:
+        """Store a value; returns the number of entries pruned to stay in bounds."""
+        with self._lock:
+            conn = self._connect()
+            with conn:
+                conn.execute(
+                    "INSERT OR REPLACE INTO response_cache (key, value, expires) VALUES (?, ?, ?)",
+                    (key, json.dumps(value), expires),
+                )
+                pruned = conn.execute(
+                    "DELETE FROM response_cache WHERE expires < ?", (time.time(),)).rowcount
+                (count,) = conn.execute("SELECT COUNT(*) FROM response_cache").fetchone()
+                if count > self.max_entries:
+                    pruned += conn.execute(
+                        "DELETE FROM response_cache WHERE key IN ("
+                        "SELECT key FROM response_cache ORDER BY expires LIMIT ?)",
+                        (count - self.max_entries,),
+                    ).rowcount
+        return pruned
+
+    def clear(self) -> None:
+        with self._lock:
+            conn = self._connect()
+            with conn:
+                conn.execute("DELETE FROM response_cache")
+
+
+class ResponseCache:
+    """Two-tier cache: bounded in-memory LRU with TTL in front of a SQLite store."""
+
+    def __init__(self):
+        self.max_items = int(os.getenv("CACHE_MEMORY_MAX_ITEMS", "512"))
+        self.disk = _DiskStore(
+            os.getenv("CACHE_DB_PATH", "response_cache.db"),
+            int(os.getenv("CACHE_DISK_MAX_ENTRIES", "10000")),
+        )
+        self._memory: "OrderedDict[str, tuple]" = OrderedDict()
+        self.counters = {
+            "memoryHits": 0,
+            "diskHits": 0,
+            "misses": 0,
+            "sets": 0,
+            "evictions": 0,
+            "diskEvictions": 0,
+            "bypassed": 0,
+            "similarHits": 0,
+        }
+        self._saving: Optional[asyncio.Task] = None
+
+    def _remember(self, key: str, value: Any, expires: float) -> None:
+        self._memory[key] = (value, expires)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_items:
+            self._memory.popitem(last=False)
+            self.counters["evictions"] += 1
+
+    async def get(self, key: str) -> Any:
+        entry = self._memory.get(key)
+        if entry is not None:
+            if entry[1] >= time.time():
+                self._memory.move_to_end(key)
+                self.counters["memoryHits"] += 1
+                return entry[0]
+            del self._memory[key]
+        value, expires = await asyncio.to_thread(self.disk.get, key)
+        if value is _MISSING:
+            self.counters["misses"] += 1
+            return _MISSING
+        self.counters["diskHits"] += 1
+        self._remember(key, value, expires)
+        return value
+
+    async def set(self, key: str, value: Any, ttl: int) -> None:
+        expires = time.time() + ttl
+        self._remember(key, value, expires)
+        self.counters["sets"] += 1
+        self.counters["diskEvictions"] += await asyncio.to_thread(self.disk.set, key, value, expires)
+
+    async def similar(self, route: str, model: str, prompt: str, params: Optional[Dict[str, Any]],
+                      valid: Optional[Callable[[Any], bool]] = None) -> Any:
+        """Cached value of an earlier near-duplicate prompt (see `similar_index`), or _MISSING."""
+        if not similar_index.enabled:
+            return _MISSING
+        matches = await asyncio.to_thread(similar_index.search, similar_namespace(route, model, params), prompt,
+                                          similar_index.threshold(route))
+        for key, _score in matches:
+            value = await self.get(key)
+            if value is not _MISSING and (valid is None or valid(value)):
+                await asyncio.to_thread(similar_index.touch, key)
+                self.counters["similarHits"] += 1
+                return value
+            await asyncio.to_thread(similar_index.forget, key)
+        return _MISSING
+
+    async def index(self, route: str, model: str, prompt: str, params: Optional[Dict[str, Any]]) -> None:
+        """Make a stored value findable by near-duplicate prompts."""
+        if not similar_index.enabled:
+            return
+        await asyncio.to_thread(similar_index.add, similar_namespace(route, model, params), prompt,
+                                cache_key(route, model, prompt, params))
+        if similar_index.save_due() and (self._saving is None or self._saving.done()):
+            self._saving = asyncio.create_task(asyncio.to_thread(similar_index.save))
+
+    async def get_or_set(self, route: str, model: str, prompt: str, params: Optional[Dict[str, Any]],
+                         request: Optional[Request], produce: Callable[[], Awaitable[Any]],
+                         valid: Optional[Callable[[Any], bool]] = None, similar: bool = False) -> Any:
+        """Return the cached value for this call or produce and store it.
+
+        Concurrent calls with the same key are coalesced by `single_flight`,
+        also for routes whose TTL disables caching.
+
+        `valid` can reject a cached value that points at something since removed
+        (e.g. an evicted artifact file); it is then regenerated. With `similar`,
+        an exact miss falls back to the value of a near-duplicate earlier prompt.
+        """
+        ttl = route_ttl(route)
+        key = cache_key(route, model, prompt, params)
+        if ttl <= 0:
+            return await single_flight.do(route, key, produce)
+        if should_bypass(request):
+            # An explicit bypass asks for its own fresh call
+            self.counters["bypassed"] += 1
+            value = await produce()
+            await self.set(key, value, ttl)
+            if similar:
+                await self.index(route, model, prompt, params)
+            return value
+        value = await self.get(key)
+        if value is not _MISSING and (valid is None or valid(value)):
+            return value
+        if similar:
+            value = await self.similar(route, model, prompt, params, valid)
+            if value is not _MISSING:
+                return value
+
+        async def produce_and_store() -> Any:
+            value = await produce()
+            await self.set(key, value, ttl)
+            if similar:
+                await self.index(route, model, prompt, params)
+            return value
+
+        # Identical concurrent misses share one upstream call
+        return await single_flight.do(route, key, produce_and_store)
+
+    async def lookup(self, route: str, model: str, prompt: str, params: Optional[Dict[str, Any]],
+                     request: Optional[Request], similar: bool = False) -> Optional[Any]:
+        """Cached value for this call, or None (for callers that produce it incrementally)."""
+        if route_ttl(route) <= 0:
+            return None
+        if should_bypass(request):
+            self.counters["bypassed"] += 1
+            return None
+        value = await self.get(cache_key(route, model, prompt, params))
+        if value is _MISSING and similar:
+            value = await self.similar(route, model, prompt, params)
+        return None if value is _MISSING else value
+
+    async def store(self, route: str, model: str, prompt: str, params: Optional[Dict[str, Any]],
+                    value: Any, similar: bool = False) -> None:
+        ttl = route_ttl(route)
+        if ttl > 0:
+            await self.set(cache_key(route, model, prompt, params), value, ttl)
+            if similar:
+                await self.index(route, model, prompt, params)
+
+    def stats(self) -> Dict[str, Any]:
+        hits = self.counters["memoryHits"] + self.counters["diskHits"]
+        lookups = hits + self.counters["misses"]
+        return {
+            **self.counters,
+            "hitRatio": round(hits / lookups, 3) if lookups else None,
+            "memoryItems": len(self._memory),
+            "memoryMaxItems": self.max_items,
+            "ttls": {route: route_ttl(route) for route in ROUTE_TTLS},
+            "similar": similar_index.stats(),
+        }
+
+
+response_cache = ResponseCache()
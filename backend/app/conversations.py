@@ -0,0 +1,215 @@
+import asyncio
+import logging
+import math
+import os
+import time
+import uuid
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from fastapi import HTTPException
+from sqlmodel import delete, func, select, update
+
+from .db import async_session
+from .models import Conversation, ConversationMessage
+
+logger = logging.getLogger(__name__)
+
+# Produces text for a prompt (gemini_chat bound to a client, or a mock)
+Generate = Callable[[str], Awaitable[str]]
+
+SUMMARY_PROMPT = (
+    "You keep a running summary of a conversation between a user and an assistant. "
+    "Update the summary with the new turns below. Keep names, facts, decisions, "
+    "preferences and open questions; drop greetings and small talk. Reply with the "
+    "updated summary only, in at most {words} words.\n\n"
+    "Current summary:\n{summary}\n\nNew turns:\n{turns}"
+)
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count (CHAT_CHARS_PER_TOKEN characters per token)."""
+    return max(1, math.ceil(len(text) / float(os.getenv("CHAT_CHARS_PER_TOKEN", "4"))))
+
+
+def _turn(role: str, text: str) -> Dict[str, Any]:
+    return {"role": role, "parts": [{"text": text}]}
+
+
+class Conversations:
+    """Server-side chat sessions stored in the database.
+
+    Each request sends Gemini the conversation's rolling summary, as many of the
+    latest turns as fit in CHAT_CONTEXT_TOKENS and the new message. Once the
+    turns not yet summarized exceed CHAT_KEEP_RECENT_TOKENS by
+    CHAT_SUMMARY_BATCH_TOKENS, the oldest of them are folded into the summary by
+    a background task, so the request size stays flat however long the
+    conversation runs.
+    """
+
+    def __init__(self):
+        self._summarizing: Dict[str, asyncio.Task] = {}
+        self.counters = {
+            "created": 0, "turns": 0, "contexts": 0, "contextTokens": 0, "droppedTurns": 0,
+            "summaries": 0, "summarizedMessages": 0, "summaryFailures": 0,
+        }
+
+    @staticmethod
+    def budget() -> int:
+        return int(os.getenv("CHAT_CONTEXT_TOKENS", "4000"))
+
+    async def create(self, user_id: Optional[str] = None) -> Conversation:
+        now = time.time()
+        conversation = Conversation(id=uuid.uuid4().hex, user_id=user_id or None, created_at=now, updated_at=now)
+        async with async_session() as session:
+            session.add(conversation)
+            await session.commit()
+        self.counters["created"] += 1
+        return conversation
+
+    async def get(self, conversation_id: str) -> Conversation:
+        async with async_session() as session:
+            conversation = await session.get(Conversation, conversation_id)
+        if conversation is None:
+            raise HTTPException(404, detail="Conversation not found")
+        return conversation
+
+    async def messages(self, conversation_id: str, limit: int, before: Optional[int] = None) -> List[ConversationMessage]:
+        """Up to `limit` messages before message id `before` (default: the latest), oldest first."""
+        query = select(ConversationMessage).where(ConversationMessage.conversation_id == conversation_id)
+        if before is not None:
+            query = query.where(ConversationMessage.id < before)
+        async with async_session() as session:
+            rows = (await session.exec(query.order_by(ConversationMessage.id.desc()).limit(limit))).all()
+        return list(reversed(rows))
+
+    async def delete(self, conversation_id: str) -> None:
+        await self.get(conversation_id)
+        task = self._summarizing.pop(conversation_id, None)
+        if task is not None:
+            task.cancel()
+        async with async_session() as session:
+            await session.exec(delete(ConversationMessage).where(ConversationMessage.conversation_id == conversation_id))
+            await session.exec(delete(Conversation).where(Conversation.id == conversation_id))
+            await session.commit()
+
+    async def contents(self, conversation: Conversation, message: str) -> List[Dict[str, Any]]:
+        """Gemini `contents` for the next turn, within the token budget."""
+        budget = self.budget() - estimate_tokens(message) - estimate_tokens(conversation.summary)
+        scan = int(os.getenv("CHAT_CONTEXT_MAX_MESSAGES", "200"))
+        async with async_session() as session:
+            rows = (await session.exec(
+                select(ConversationMessage.role, ConversationMessage.text, ConversationMessage.tokens)
+                .where(ConversationMessage.conversation_id == conversation.id,
+                       ConversationMessage.id > conversation.summarized_upto)
+                .order_by(ConversationMessage.id.desc()).limit(scan))).all()
+        recent, used = [], 0
+        for role, text, tokens in rows:
+            if used + tokens > budget:
+                break
+            recent.append((role, text))
+            used += tokens
+        recent.reverse()
+        # The history must open with a user turn
+        while recent and recent[0][0] != "user":
+            recent.pop(0)
+        self.counters["droppedTurns"] += len(rows) - len(recent)
+
+        contents = []
+        if conversation.summary:
+            contents += [
+                _turn("user", f"Summary of our conversation so far:\n{conversation.summary}"),
+                _turn("model", "Understood, I will continue from there."),
+            ]
+        contents += [_turn(role, text) for role, text in recent]
+        contents.append(_turn("user", message))
+        self.counters["contexts"] += 1
+        self.counters["contextTokens"] += used + estimate_tokens(message) + estimate_tokens(conversation.summary)
+        return contents
+
+    async def record(self, conversation: Conversation, message: str, reply: str, summarize: Generate) -> None:
+        """Store one user/model exchange and refresh the summary in the background."""
+        now = time.time()
+        async with async_session() as session:
+            session.add(ConversationMessage(conversation_id=conversation.id, role="user", text=message,
+                                            tokens=estimate_tokens(message), created_at=now))
+            session.add(ConversationMessage(conversation_id=conversation.id, role="model", text=reply,
+                                            tokens=estimate_tokens(reply), created_at=now))
+            await session.exec(update(Conversation).where(Conversation.id == conversation.id).values(updated_at=now))
+            await session.commit()
+        self.counters["turns"] += 1
+        task = self._summarizing.get(conversation.id)
+        if task is None or task.done():
+            task = asyncio.create_task(self._summarize(conversation.id, summarize))
+            self._summarizing[conversation.id] = task
+            task.add_done_callback(lambda t: self._finished(conversation.id, t))
+
+    def _finished(self, conversation_id: str, task: asyncio.Task) -> None:
+        if self._summarizing.get(conversation_id) is task:
+            del self._summarizing[conversation_id]
+
+    async def _summarize(self, conversation_id: str, summarize: Generate) -> None:
+        keep = int(os.getenv("CHAT_KEEP_RECENT_TOKENS", "1500"))
+        batch = int(os.getenv("CHAT_SUMMARY_BATCH_TOKENS", "1000"))
+        max_tokens = int(os.getenv("CHAT_SUMMARY_MAX_TOKENS", "400"))
+        try:
+            while True:
+                async with async_session() as session:
+                    conversation = await session.get(Conversation, conversation_id)
+                    if conversation is None:
+                        return
+                    pending = (await session.exec(
+                        select(func.coalesce(func.sum(ConversationMessage.tokens), 0))
+                        .where(ConversationMessage.conversation_id == conversation_id,
+                               ConversationMessage.id > conversation.summarized_upto))).one()
+                    if pending <= keep + batch:
+                        return
+                    rows = (await session.exec(
+                        select(ConversationMessage)
+                        .where(ConversationMessage.conversation_id == conversation_id,
+                               ConversationMessage.id > conversation.summarized_upto)
+                        .order_by(ConversationMessage.id))).all()
+                # Fold the oldest messages, whole exchanges only, leaving `keep` tokens
+                fold = []
+                for row in rows:
+                    if pending <= keep and fold and fold[-1].role == "model":
+                        break
+                    fold.append(row)
+                    pending -= row.tokens
+                turns = "\n".join(f"{'User' if m.role == 'user' else 'Assistant'}: {m.text}" for m in fold)
+                summary = (await summarize(SUMMARY_PROMPT.format(
+                    words=int(max_tokens * 0.75), summary=conversation.summary or "(none)", turns=turns))).strip()
+                summary = summary[:int(max_tokens * float(os.getenv("CHAT_CHARS_PER_TOKEN", "4")))]
+                async with async_session() as session:
+                    # Skip if another worker folded these messages meanwhile
+                    result = await session.exec(
+                        update(Conversation)
+                        .where(Conversation.id == conversation_id,
+                               Conversation.summarized_upto == conversation.summarized_upto)
+                        .values(summary=summary, summarized_upto=fold[-1].id))
+                    await session.commit()
+                if result.rowcount:
+                    self.counters["summaries"] += 1
+                    self.counters["summarizedMessages"] += len(fold)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            self.counters["summaryFailures"] += 1
+            logger.warning("Summarizing conversation %s failed: %s", conversation_id, e)
+
+    async def stop(self) -> None:
+        tasks = list(self._summarizing.values())
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    def stats(self) -> Dict[str, Any]:
+        contexts = self.counters["contexts"]
+        return {
+            **self.counters,
+            "contextBudget": self.budget(),
+            "avgContextTokens": round(self.counters["contextTokens"] / contexts) if contexts else None,
+            "summarizing": len(self._summarizing),
+        }
+
+
+conversations = Conversations()
@@ -1,15 +1,93 @@
-from contextlib import asynccontextmanager
-from sqlmodel import SQLModel, create_engine, Session
 import os
+import time
+
+from sqlalchemy import event, text
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlmodel import SQLModel
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from .metrics import record_db
 
 DB_URL = os.getenv("DB_URL", "sqlite:///backend.db")
-engine = create_engine(DB_URL, echo=False)
+
+# Async drivers for the plain URLs used in .env / render.yaml
+ASYNC_DRIVERS = {
+    "sqlite://": "sqlite+aiosqlite://",
+    "postgresql://": "postgresql+asyncpg://",
+    "postgres://": "postgresql+asyncpg://",
+}
+
+# Idempotent schema changes for databases created before the matching model
+# change (create_all only creates missing tables, not indexes on existing ones).
+MIGRATIONS = [
+    "CREATE INDEX IF NOT EXISTS ix_task_user_id_id ON task (user_id, id)",
+    "CREATE INDEX IF NOT EXISTS ix_task_user_id_completed_id ON task (user_id, completed, id)",
+]
+
+
+def async_url(url: str) -> str:
+    for prefix, replacement in ASYNC_DRIVERS.items():
+        if url.startswith(prefix):
+            return replacement + url[len(prefix):]
+    return url
+
+
+def _engine_options(url: str) -> dict:
+    if url.startswith("sqlite") and ":memory:" in url:
+        return {}
+    return {
+        "pool_size": int(os.getenv("DB_POOL_SIZE", "5")),
+        "max_overflow": int(os.getenv("DB_MAX_OVERFLOW", "10")),
+        "pool_pre_ping": not url.startswith("sqlite"),
+    }
+
+
+engine = create_async_engine(async_url(DB_URL), echo=False, **_engine_options(DB_URL))
+async_session = async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+
+
+if engine.dialect.name == "sqlite":
+    @event.listens_for(engine.sync_engine, "connect")
+    def _sqlite_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        # WAL lets readers run alongside the single writer; NORMAL is durable enough with WAL
+        cursor.execute("PRAGMA journal_mode=WAL")
+        cursor.execute("PRAGMA synchronous=NORMAL")
+        cursor.execute(f"PRAGMA busy_timeout={int(os.getenv('DB_SQLITE_BUSY_TIMEOUT_MS', '5000'))}")
+        cursor.execute(f"PRAGMA mmap_size={int(os.getenv('DB_SQLITE_MMAP_SIZE', str(256 * 1024 * 1024)))}")
+        cursor.close()
+
+
+@event.listens_for(engine.sync_engine, "before_cursor_execute")
+def _query_start(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_start", []).append(time.perf_counter())
+
+
+@event.listens_for(engine.sync_engine, "after_cursor_execute")
+def _query_end(conn, cursor, statement, parameters, context, executemany):
+    start = conn.info["query_start"].pop()
+    record_db(statement.lstrip().split(None, 1)[0].upper(), time.perf_counter() - start)
+
+
+@event.listens_for(engine.sync_engine, "handle_error")
+def _query_failed(context):
+    starts = context.connection.info.get("query_start") if context.connection is not None else None
+    if starts:
+        record_db("ERROR", time.perf_counter() - starts.pop())
+
+
+async def migrate():
+    async with engine.begin() as conn:
+        for statement in MIGRATIONS:
+            await conn.execute(text(statement))
 
 
-def init_db():
-    SQLModel.metadata.create_all(engine)
+async def init_db():
+    async with engine.begin() as conn:
+        await conn.run_sync(SQLModel.metadata.create_all)
+    await migrate()
 
 
-def get_session():
-    with Session(engine) as session:
+async def get_session():
+    async with async_session() as session:
         yield session
@@ -0,0 +1,191 @@
+import asyncio
+import io
+import logging
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+# Variants a client can ask for with ?variant=; "original" is the upstream image as received
+VARIANTS = ("original", "full", "thumb")
+
+FORMATS = {
+    "webp": "image/webp",
+    "avif": "image/avif",
+    "jpeg": "image/jpeg",
+    "png": "image/png",
+}
+
+# Upstream images the pipeline can decode (placeholder SVGs are passed through)
+RASTER_TYPES = ("image/png", "image/jpeg", "image/webp", "image/gif", "image/bmp", "image/avif")
+
+_B83 = "0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz#$%*+,-.:;=?@[]^_{|}~"
+
+
+def settings() -> Dict[str, Any]:
+    """Encoding options, read in the app process and passed to the workers."""
+    components = os.getenv("IMAGE_BLURHASH_COMPONENTS", "4x3").lower().split("x")
+    return {
+        "format": os.getenv("IMAGE_FORMAT", "webp").lower(),
+        "quality": int(os.getenv("IMAGE_QUALITY", "80")),
+        "thumb_size": int(os.getenv("IMAGE_THUMB_SIZE", "256")),
+        "thumb_quality": int(os.getenv("IMAGE_THUMB_QUALITY", "70")),
+        "blurhash": os.getenv("IMAGE_BLURHASH", "true").lower() != "false",
+        "blurhash_components": (int(components[0]), int(components[-1])),
+    }
+
+
+def _encode83(value: int, length: int) -> str:
+    return "".join(_B83[(value // 83 ** (length - i)) % 83] for i in range(1, length + 1))
+
+
+def _linear_to_srgb(value: float) -> int:
+    v = min(max(value, 0.0), 1.0)
+    if v <= 0.0031308:
+        return int(v * 12.92 * 255 + 0.5)
+    return int((1.055 * v ** (1 / 2.4) - 0.055) * 255 + 0.5)
+
+
+def blurhash(pixels, x_components: int = 4, y_components: int = 3) -> str:
+    """BlurHash (https://blurha.sh) of an RGB uint8 array of shape (h, w, 3).
+
+    Pass a small image (about 32 px); the hash only keeps a few DCT components.
+    """
+    import numpy as np
+
+    if not (1 <= x_components <= 9 and 1 <= y_components <= 9):
+        raise ValueError("BlurHash components must be between 1 and 9")
+    srgb = np.asarray(pixels, dtype=np.float64) / 255.0
+    linear = np.where(srgb <= 0.04045, srgb / 12.92, ((srgb + 0.055) / 1.055) ** 2.4)
+    height, width = linear.shape[:2]
+    cos_x = np.cos(np.pi * np.outer(np.arange(x_components), np.arange(width)) / width)
+    cos_y = np.cos(np.pi * np.outer(np.arange(y_components), np.arange(height)) / height)
+    # factors[j, i] = mean over pixels of cos_y[j] * cos_x[i] * colour, doubled for AC terms
+    factors = np.einsum("jy,ix,yxc->jic", cos_y, cos_x, linear) / (width * height)
+    factors[1:, :] *= 2
+    factors[0, 1:] *= 2
+    dc, ac = factors[0, 0], factors.reshape(-1, 3)[1:]
+
+    result = _encode83((x_components - 1) + (y_components - 1) * 9, 1)
+    if len(ac):
+        quantised_max = int(max(0, min(82, np.floor(np.abs(ac).max() * 166 - 0.5))))
+        maximum = (quantised_max + 1) / 166
+        result += _encode83(quantised_max, 1)
+    else:
+        maximum = 1.0
+        result += _encode83(0, 1)
+    r, g, b = (_linear_to_srgb(c) for c in dc)
+    result += _encode83((r << 16) + (g << 8) + b, 4)
+    quantised = np.clip(np.floor(np.sign(ac) * np.sqrt(np.abs(ac / maximum)) * 9 + 9.5), 0, 18).astype(int)
+    for qr, qg, qb in quantised:
+        result += _encode83(int(qr) * 19 * 19 + int(qg) * 19 + int(qb), 2)
+    return result
+
+
+def _save(img, fmt: str, quality: int) -> bytes:
+    buf = io.BytesIO()
+    if fmt == "jpeg" and img.mode != "RGB":
+        img = img.convert("RGB")
+    options = {"quality": quality} if fmt != "png" else {"optimize": True}
+    img.save(buf, format=fmt.upper(), **options)
+    return buf.getvalue()
+
+
+def encode_variants(data: bytes, options: Dict[str, Any]) -> Dict[str, Any]:
+    """Decode `data` once and build the configured variants. CPU-bound; runs in a
+    worker process. Returns {"full": (bytes, mime), "thumb": (bytes, mime),
+    "blurhash": str, "width": int, "height": int, "format": str}."""
+    from PIL import Image, features
+
+    img = Image.open(io.BytesIO(data))
+    img.load()
+    if img.mode not in ("RGB", "RGBA"):
+        img = img.convert("RGBA" if "transparency" in img.info or img.mode in ("LA", "PA") else "RGB")
+    fmt = options["format"] if options["format"] in FORMATS else "webp"
+    if fmt in ("webp", "avif") and not features.check(fmt):
+        fmt = "webp" if features.check("webp") else "jpeg"
+
+    out: Dict[str, Any] = {"width": img.width, "height": img.height, "format": fmt}
+    out["full"] = (_save(img, fmt, options["quality"]), FORMATS[fmt])
+    thumb = img.copy()
+    thumb.thumbnail((options["thumb_size"], options["thumb_size"]), Image.Resampling.BILINEAR, reducing_gap=2.0)
+    out["thumb"] = (_save(thumb, fmt, options["thumb_quality"]), FORMATS[fmt])
+    if options["blurhash"]:
+        small = thumb.convert("RGB")
+        small.thumbnail((32, 32), Image.Resampling.BILINEAR)
+        out["blurhash"] = blurhash(small, *options["blurhash_components"])
+    return out
+
+
+class ImagePipeline:
+    """Post-processes generated images on a process pool: a compressed full-size
+    WebP/AVIF, a thumbnail and a BlurHash placeholder, so the event loop and the
+    request threads never run the encoders.
+
+    The pool is created on first use with the spawn start method (forking a
+    process that runs an event loop and threads is not safe).
+    """
+
+    def __init__(self):
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self.counters = {"processed": 0, "skipped": 0, "failed": 0,
+                         "inputBytes": 0, "outputBytes": 0, "seconds": 0.0}
+
+    @property
+    def enabled(self) -> bool:
+        return os.getenv("IMAGE_PIPELINE", "true").lower() != "false"
+
+    @property
+    def executor(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            workers = int(os.getenv("IMAGE_WORKERS", str(min(2, os.cpu_count() or 1))))
+            self._executor = ProcessPoolExecutor(
+                max_workers=max(1, workers), mp_context=multiprocessing.get_context("spawn"))
+        return self._executor
+
+    async def process(self, data: bytes, mime: str) -> Optional[Dict[str, Any]]:
+        """Variants of one image, or None when the pipeline is off, the image is
+        not a raster format or encoding failed (callers keep the original)."""
+        if not self.enabled or mime not in RASTER_TYPES:
+            self.counters["skipped"] += 1
+            return None
+        start = time.perf_counter()
+        try:
+            loop = asyncio.get_running_loop()
+            result = await loop.run_in_executor(self.executor, encode_variants, data, settings())
+        except BrokenProcessPool:
+            self._executor = None  # a worker died; start a fresh pool next time
+            self.counters["failed"] += 1
+            logger.warning("Image worker pool broke; serving the original image")
+            return None
+        except Exception as e:
+            self.counters["failed"] += 1
+            logger.warning("Image post-processing failed: %s", e)
+            return None
+        self.counters["processed"] += 1
+        self.counters["seconds"] += time.perf_counter() - start
+        self.counters["inputBytes"] += len(data)
+        self.counters["outputBytes"] += sum(len(result[v][0]) for v in ("full", "thumb") if v in result)
+        return result
+
+    async def shutdown(self) -> None:
+        """Cancel queued work and wait for the workers to exit (in a thread)."""
+        executor, self._executor = self._executor, None
+        if executor is not None:
+            await asyncio.to_thread(executor.shutdown, wait=True, cancel_futures=True)
+
+    def stats(self) -> Dict[str, Any]:
+        done = self.counters["processed"]
+        return {
+            **self.counters,
+            "enabled": self.enabled,
+            "format": settings()["format"],
+            "avgSeconds": round(self.counters["seconds"] / done, 4) if done else None,
+        }
+
+
+image_pipeline = ImagePipeline()
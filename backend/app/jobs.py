@@ -0,0 +1,299 @@
+import asyncio
+import json
+import logging
+import os
+import time
+import uuid
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from fastapi import HTTPException
+from sqlmodel import delete, select, update
+
+from .db import async_session
+from .models import Job
+
+logger = logging.getLogger(__name__)
+
+Handler = Callable[[Dict[str, Any]], Awaitable[Dict[str, Any]]]
+
+TERMINAL = ("succeeded", "failed")
+
+# A running job older than JOB_TIMEOUT plus this many seconds has lost its
+# worker (crash or restart); stale jobs are looked for this often, too
+STALE_GRACE = 60.0
+
+
+class JobQueue:
+    """In-process worker pool for slow generation jobs, persisted in the Job table.
+
+    Every kind has its own queue, a fixed number of workers (its concurrency
+    limit) and a maximum queue depth beyond which submissions get a 429.
+    A job runs for at most JOB_TIMEOUT seconds, so a job still marked running
+    well after that has lost its worker; such jobs are re-queued at startup
+    and by a periodic check, which also deletes finished jobs older than
+    JOB_RETENTION seconds.
+    """
+
+    def __init__(self):
+        self._handlers: Dict[str, Handler] = {}
+        self._defaults: Dict[str, int] = {}
+        self._queues: Dict[str, asyncio.Queue] = {}
+        self._workers: List[asyncio.Task] = []
+        self._events: Dict[str, asyncio.Event] = {}
+        self._waiting: Dict[str, int] = {}
+        # Submissions accepted but not yet enqueued (still being written to the DB)
+        self._reserved: Dict[str, int] = {}
+        self.counters: Dict[str, Dict[str, float]] = {}
+
+    def register(self, kind: str, handler: Handler, concurrency: int = 2) -> None:
+        self._handlers[kind] = handler
+        self._defaults[kind] = concurrency
+        self.counters[kind] = {
+            "submitted": 0, "rejected": 0, "succeeded": 0, "failed": 0, "runSeconds": 0.0,
+        }
+
+    @property
+    def kinds(self) -> List[str]:
+        return list(self._handlers)
+
+    def concurrency(self, kind: str) -> int:
+        return max(1, int(os.getenv(f"JOB_{kind.upper()}_CONCURRENCY", self._defaults[kind])))
+
+    @staticmethod
+    def timeout() -> float:
+        return float(os.getenv("JOB_TIMEOUT", "600"))
+
+    @staticmethod
+    def retention() -> float:
+        return float(os.getenv("JOB_RETENTION", str(24 * 3600)))
+
+    def max_depth(self, kind: str) -> int:
+        return int(os.getenv(f"JOB_{kind.upper()}_QUEUE_MAX", os.getenv("JOB_QUEUE_MAX", "50")))
+
+    async def start(self) -> None:
+        for kind in self._handlers:
+            self._queues[kind] = asyncio.Queue()
+            for _ in range(self.concurrency(kind)):
+                self._workers.append(asyncio.create_task(self._worker(kind)))
+        await self._reclaim()
+        await self._prune()
+        self._enqueue(await self._queued())
+        self._workers.append(asyncio.create_task(self._reaper()))
+
+    async def stop(self) -> None:
+        workers, self._workers = self._workers, []
+        for task in workers:
+            task.cancel()
+        await asyncio.gather(*workers, return_exceptions=True)
+
+    async def submit(self, kind: str, payload: Dict[str, Any]) -> Job:
+        queue = self._queues.get(kind)
+        if queue is None:
+            raise HTTPException(503, detail="Job queue not running")
+        counters = self.counters[kind]
+        if self._depth(kind) >= self.max_depth(kind):
+            counters["rejected"] += 1
+            raise HTTPException(
+                429, detail=f"Too many queued '{kind}' jobs, retry later",
+                headers={"Retry-After": str(self._retry_after(kind))})
+        job = Job(id=uuid.uuid4().hex, kind=kind, payload=json.dumps(payload), created_at=time.time())
+        self._reserved[kind] = self._reserved.get(kind, 0) + 1
+        try:
+            await self._insert(job)
+        finally:
+            self._reserved[kind] -= 1
+        counters["submitted"] += 1
+        queue.put_nowait(job.id)
+        return job
+
+    async def get(self, job_id: str) -> Optional[Job]:
+        return await self._load(job_id)
+
+    async def wait_for_change(self, job_id: str, timeout: float) -> None:
+        """Wait until this process updates the job, or `timeout` seconds pass."""
+        event = self._events.setdefault(job_id, asyncio.Event())
+        self._waiting[job_id] = self._waiting.get(job_id, 0) + 1
+        try:
+            await asyncio.wait_for(event.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+        finally:
+            self._waiting[job_id] -= 1
+            if not self._waiting[job_id]:
+                del self._waiting[job_id]
+                if self._events.get(job_id) is event:
+                    del self._events[job_id]
+
+    def _notify(self, job_id: str) -> None:
+        event = self._events.pop(job_id, None)
+        if event is not None:
+            event.set()
+
+    def _enqueue(self, jobs: List[tuple]) -> None:
+        for job_id, kind in jobs:
+            if kind in self._queues:
+                self._queues[kind].put_nowait(job_id)
+
+    def _depth(self, kind: str) -> int:
+        return self._queues[kind].qsize() + self._reserved.get(kind, 0)
+
+    def _retry_after(self, kind: str) -> int:
+        c = self.counters[kind]
+        done = c["succeeded"] + c["failed"]
+        avg = c["runSeconds"] / done if done else 10.0
+        depth = self._depth(kind)
+        return max(1, int(avg * depth / self.concurrency(kind)))
+
+    async def _worker(self, kind: str) -> None:
+        queue = self._queues[kind]
+        handler = self._handlers[kind]
+        counters = self.counters[kind]
+        while True:
+            job_id = await queue.get()
+            claimed = False
+            try:
+                payload = await self._claim(job_id)
+                if payload is None:
+                    continue  # already taken by another worker process
+                claimed = True
+                self._notify(job_id)
+                start = time.perf_counter()
+                try:
+                    result = await asyncio.wait_for(handler(payload), self.timeout())
+                    status, result_json, error = "succeeded", json.dumps(result), None
+                except asyncio.TimeoutError:
+                    status, result_json, error = "failed", None, f"Job timed out after {self.timeout():g} s"
+                except HTTPException as e:
+                    status, result_json, error = "failed", None, str(e.detail)
+                except Exception as e:
+                    status, result_json, error = "failed", None, str(e)
+                counters["runSeconds"] += time.perf_counter() - start
+                await self._finish(job_id, status, result_json, error)
+                counters[status] += 1
+                self._notify(job_id)
+            except Exception as e:
+                # A database error (e.g. "database is locked") fails this job, not the worker
+                logger.exception("Job %s (%s) failed outside its handler", job_id, kind)
+                counters["failed"] += 1
+                await self._fail(job_id, "running" if claimed else "queued", f"Internal error: {e}")
+                self._notify(job_id)
+            finally:
+                queue.task_done()
+
+    async def _reaper(self) -> None:
+        while True:
+            await asyncio.sleep(STALE_GRACE)
+            try:
+                self._enqueue(await self._reclaim())
+            except Exception as e:
+                logger.warning("Looking for stale jobs failed: %s", e)
+            try:
+                await self._prune()
+            except Exception as e:
+                logger.warning("Deleting old jobs failed: %s", e)
+
+    # Database helpers
+
+    async def _insert(self, job: Job) -> None:
+        async with async_session() as session:
+            session.add(job)
+            await session.commit()
+
+    async def _load(self, job_id: str) -> Optional[Job]:
+        async with async_session() as session:
+            return await session.get(Job, job_id)
+
+    async def _claim(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """Atomically move a queued job to running; None if someone else got it."""
+        async with async_session() as session:
+            claimed = (await session.exec(
+                update(Job)
+                .where(Job.id == job_id, Job.status == "queued")
+                .values(status="running", started_at=time.time())
+            )).rowcount
+            await session.commit()
+            if not claimed:
+                return None
+            return json.loads((await session.get(Job, job_id)).payload)
+
+    async def _finish(self, job_id: str, status: str, result: Optional[str], error: Optional[str]) -> None:
+        async with async_session() as session:
+            job = await session.get(Job, job_id)
+            if job is None:
+                return
+            job.status = status
+            job.result = result
+            job.error = error
+            job.finished_at = time.time()
+            session.add(job)
+            await session.commit()
+
+    async def _fail(self, job_id: str, expected: str, error: str) -> None:
+        """Best effort: mark the job failed if it is still `expected` (ours)."""
+        try:
+            async with async_session() as session:
+                await session.exec(
+                    update(Job)
+                    .where(Job.id == job_id, Job.status == expected)
+                    .values(status="failed", error=error, finished_at=time.time())
+                )
+                await session.commit()
+        except Exception as e:
+            logger.warning("Could not mark job %s failed: %s", job_id, e)
+
+    async def _reclaim(self) -> List[tuple]:
+        """Re-queue running jobs whose worker is gone and return them."""
+        stale = time.time() - self.timeout() - STALE_GRACE
+        reclaimed = []
+        async with async_session() as session:
+            jobs = (await session.exec(
+                select(Job.id, Job.kind).where(Job.status == "running", Job.started_at < stale)
+            )).all()
+            for job_id, kind in jobs:
+                # Conditional, so only one process re-queues each job
+                if (await session.exec(
+                    update(Job)
+                    .where(Job.id == job_id, Job.status == "running", Job.started_at < stale)
+                    .values(status="queued", started_at=None)
+                )).rowcount:
+                    reclaimed.append((job_id, kind))
+            await session.commit()
+        if reclaimed:
+            logger.warning("Re-queued %d stale running job(s)", len(reclaimed))
+        return reclaimed
+
+    async def _prune(self) -> int:
+        """Delete succeeded/failed jobs finished more than JOB_RETENTION seconds ago (0 keeps them)."""
+        retention = self.retention()
+        if retention <= 0:
+            return 0
+        async with async_session() as session:
+            deleted = (await session.exec(
+                delete(Job).where(Job.status.in_(TERMINAL), Job.finished_at < time.time() - retention)
+            )).rowcount
+            await session.commit()
+        if deleted:
+            logger.info("Deleted %d finished job(s) older than %g s", deleted, retention)
+        return deleted
+
+    async def _queued(self) -> List[tuple]:
+        async with async_session() as session:
+            return list((await session.exec(
+                select(Job.id, Job.kind).where(Job.status == "queued").order_by(Job.created_at)
+            )).all())
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            kind: {
+                **{k: v for k, v in c.items() if k != "runSeconds"},
+                "queued": self._depth(kind) if kind in self._queues else 0,
+                "concurrency": self.concurrency(kind),
+                "maxDepth": self.max_depth(kind),
+                "avgRunSeconds": round(c["runSeconds"] / (c["succeeded"] + c["failed"]), 3)
+                if c["succeeded"] + c["failed"] else None,
+            }
+            for kind, c in self.counters.items()
+        }
+
+
+job_queue = JobQueue()
@@ -0,0 +1,112 @@
+"""Incremental JSON scanning for model replies that arrive in chunks.
+
+Model output may wrap the JSON in markdown fences or add prose around it, so
+the scanner ignores everything before the first ``{`` and after the matching
+``}``. While text is fed in, items of selected top-level arrays (e.g. the
+``nodes`` and ``edges`` of a mind map) are returned as soon as each one is a
+complete JSON object or array; scalar items are skipped. Raw control
+characters inside strings (common in model output) are accepted.
+"""
+import json
+from typing import Any, Iterable, List, Optional, Tuple
+
+
+class JSONObjectStream:
+    """Tracks string/escape state and nesting over the accumulated text, so each
+    character is examined once no matter how the reply is chunked."""
+
+    def __init__(self, arrays: Iterable[str] = ()):
+        self.arrays = set(arrays)
+        self._text = ""
+        self._pos = 0
+        self._start: Optional[int] = None  # index of the top-level "{"
+        self._end: Optional[int] = None  # index just past the matching "}"
+        self._stack: List[str] = []
+        self._in_string = False
+        self._escape = False
+        self._expect_key = False  # a top-level key may start next
+        self._key_start: Optional[int] = None
+        self._last_key: Optional[str] = None
+        self._array: Optional[str] = None  # top-level key of the array being read
+        self._item_start: Optional[int] = None
+
+    @property
+    def complete(self) -> bool:
+        return self._end is not None
+
+    def feed(self, chunk: str) -> List[Tuple[str, Any]]:
+        """Add text; return (array key, item) for every array item completed by it."""
+        if self.complete or not chunk:
+            return []
+        self._text += chunk
+        items: List[Tuple[str, Any]] = []
+        text = self._text
+        for i in range(self._pos, len(text)):
+            ch = text[i]
+            if self._start is None:
+                if ch == "{":
+                    self._start = i
+                    self._stack.append("{")
+                    self._expect_key = True
+                continue
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif ch == "\\":
+                    self._escape = True
+                elif ch == '"':
+                    self._in_string = False
+                    if self._key_start is not None:
+                        self._last_key = json.loads(text[self._key_start:i + 1], strict=False)
+                        self._key_start = None
+                continue
+            if ch == '"':
+                self._in_string = True
+                # Only keys of the top-level object, not its string values
+                if len(self._stack) == 1 and self._expect_key:
+                    self._key_start = i
+                    self._expect_key = False
+            elif ch == "," and len(self._stack) == 1:
+                self._expect_key = True
+            elif ch in "{[":
+                if self._array is not None and len(self._stack) == 2 and self._item_start is None:
+                    self._item_start = i
+                self._stack.append(ch)
+                if ch == "[" and len(self._stack) == 2 and self._last_key in self.arrays:
+                    self._array = self._last_key
+            elif ch in "}]":
+                self._stack.pop()
+                depth = len(self._stack)
+                if self._array is not None and depth == 2 and self._item_start is not None:
+                    items.extend(self._item(text[self._item_start:i + 1]))
+                    self._item_start = None
+                elif depth == 1:
+                    self._array = None
+                elif depth == 0:
+                    self._end = i + 1
+                    self._pos = self._end
+                    return items
+        self._pos = len(text)
+        return items
+
+    def _item(self, raw: str) -> List[Tuple[str, Any]]:
+        try:
+            return [(self._array, json.loads(raw, strict=False))]
+        except ValueError:
+            return []
+
+    def text(self) -> str:
+        """The complete top-level object's source text."""
+        if not self.complete:
+            raise ValueError("No complete JSON object found in response")
+        return self._text[self._start:self._end]
+
+    def value(self) -> Any:
+        return json.loads(self.text(), strict=False)
+
+
+def extract_json(content: str) -> str:
+    """Source text of the first balanced JSON object in a model reply."""
+    stream = JSONObjectStream()
+    stream.feed(content)
+    return stream.text()
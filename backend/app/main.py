@@ -1,13 +1,72 @@
+import asyncio
+import logging
 import os
-from fastapi import FastAPI
-from fastapi.middleware.cors import CORSMiddleware
+from contextlib import asynccontextmanager
+
 from dotenv import load_dotenv
-from .db import init_db
-from .routers import ai, tasks, media
 
+# Before the app modules below read their settings from the environment
 load_dotenv()
 
-app = FastAPI(title="MindSpace Backend (FastAPI)")
+from .startup import startup_profile, warmup  # noqa: E402
+
+startup_profile.start_imports()
+
+from fastapi import FastAPI  # noqa: E402
+from fastapi.middleware.cors import CORSMiddleware  # noqa: E402
+from .conversations import conversations  # noqa: E402
+from .db import engine, init_db  # noqa: E402
+from .images import image_pipeline  # noqa: E402
+from .jobs import job_queue  # noqa: E402
+from .metrics import MetricsMiddleware, enabled as metrics_enabled, monitor_loop_lag  # noqa: E402
+from .routers import ai, artifacts, conversations as conversation_routes, jobs, metrics, tasks, media  # noqa: E402
+from .similar import similar_index  # noqa: E402
+from .task_sync import task_sync  # noqa: E402
+from .upstream import pool  # noqa: E402
+
+# App loggers (e.g. the mind map debug dumps) go to stderr at LOG_LEVEL
+_log_handler = logging.StreamHandler()
+_log_handler.setFormatter(logging.Formatter("%(levelname)s:     %(name)s - %(message)s"))
+logging.getLogger(__package__).addHandler(_log_handler)
+logging.getLogger(__package__).setLevel(os.getenv("LOG_LEVEL", "INFO").upper())
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Create tables and apply index migrations
+    with startup_profile.step("init_db"):
+        await init_db()
+    # Shared pooled upstream clients (Gemini, Hugging Face)
+    with startup_profile.step("upstream_pool"):
+        await pool.start()
+    app.state.upstream = pool
+    # Background workers for /api/jobs
+    with startup_profile.step("job_queue"):
+        await job_queue.start()
+    lag_monitor = asyncio.create_task(monitor_loop_lag()) if metrics_enabled() else None
+    startup_profile.mark_ready()
+    # Optional heavy imports (NumPy layout, huggingface_hub, gTTS) load off the
+    # event loop while the server already accepts requests
+    warming = None
+    if os.getenv("STARTUP_WARMUP", "true").lower() != "false":
+        warming = asyncio.create_task(asyncio.to_thread(warmup))
+    try:
+        yield
+    finally:
+        if lag_monitor:
+            lag_monitor.cancel()
+        if warming:
+            await asyncio.gather(warming, return_exceptions=True)
+        await job_queue.stop()
+        await conversations.stop()
+        await image_pipeline.shutdown()
+        await task_sync.stop()
+        await asyncio.to_thread(similar_index.save)
+        await pool.aclose()
+        await engine.dispose()
+
+
+app = FastAPI(title="MindSpace Backend (FastAPI)", lifespan=lifespan)
 
 # CORS - allow local dev and production
 allowed_origins = os.getenv("ALLOWED_ORIGINS", "*").split(",")
@@ -17,15 +76,19 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Audio-Text", "X-Next-Cursor", "Server-Timing"],
 )
-
-# Init DB
-init_db()
+# Outermost, so latency includes every other middleware
+app.add_middleware(MetricsMiddleware)
 
 # Routers
 app.include_router(ai.router)
 app.include_router(tasks.router)
 app.include_router(media.router)
+app.include_router(artifacts.router)
+app.include_router(jobs.router)
+app.include_router(conversation_routes.router)
+app.include_router(metrics.router)
 
 
 @app.get("/")
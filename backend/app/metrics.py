@@ -0,0 +1,272 @@
+"""In-process metrics in the Prometheus text format.
+
+Covers HTTP routes (latency histogram, in-flight gauge, status counts),
+upstream calls (Gemini per version/model, HF per endpoint/model, TTS
+engines), database statements, event-loop lag and process memory. Values are per worker process; scrape
+each worker or run a single one.
+"""
+import asyncio
+import contextvars
+import os
+import sys
+import threading
+import time
+from bisect import bisect_left
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from starlette.routing import Match
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+Labels = Tuple[Tuple[str, str], ...]
+
+
+def _labels(values: Dict[str, Any]) -> Labels:
+    return tuple(sorted((k, str(v)) for k, v in values.items()))
+
+
+def _format_labels(labels: Labels, extra: Optional[Tuple[str, str]] = None) -> str:
+    pairs = list(labels) + ([extra] if extra else [])
+    if not pairs:
+        return ""
+    escaped = (v.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, v in pairs)
+    return "{" + ",".join(f'{k}="{v}"' for (k, _), v in zip(pairs, escaped)) + "}"
+
+
+class _Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, help_text: str):
+        self.name = name
+        self.help = help_text
+        self._lock = threading.Lock()
+
+    def header(self) -> List[str]:
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, help_text: str):
+        super().__init__(name, help_text)
+        self._values: Dict[Labels, float] = {}
+
+    def inc(self, amount: float = 1.0, **labels: Any) -> None:
+        key = _labels(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def set_total(self, value: float, **labels: Any) -> None:
+        """Mirror a cumulative count kept elsewhere (e.g. in a pool's stats)."""
+        with self._lock:
+            self._values[_labels(labels)] = value
+
+    def render(self) -> List[str]:
+        return [f"{self.name}{_format_labels(k)} {v:g}" for k, v in sorted(self._values.items())]
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def dec(self, amount: float = 1.0, **labels: Any) -> None:
+        self.inc(-amount, **labels)
+
+    def set(self, value: float, **labels: Any) -> None:
+        self.set_total(value, **labels)
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help_text: str, buckets: Tuple[float, ...] = LATENCY_BUCKETS):
+        super().__init__(name, help_text)
+        self.buckets = buckets
+        # Per label set: per-bucket counts (non-cumulative, last one is +Inf), sum
+        self._values: Dict[Labels, Tuple[List[int], List[float]]] = {}
+
+    def observe(self, value: float, **labels: Any) -> None:
+        key = _labels(labels)
+        with self._lock:
+            counts, total = self._values.setdefault(key, ([0] * (len(self.buckets) + 1), [0.0]))
+            counts[bisect_left(self.buckets, value)] += 1
+            total[0] += value
+
+    def render(self) -> List[str]:
+        lines = []
+        for key, (counts, total) in sorted(self._values.items()):
+            running = 0
+            for bound, count in zip(self.buckets, counts):
+                running += count
+                lines.append(f"{self.name}_bucket{_format_labels(key, ('le', f'{bound:g}'))} {running}")
+            running += counts[-1]
+            lines.append(f"{self.name}_bucket{_format_labels(key, ('le', '+Inf'))} {running}")
+            lines.append(f"{self.name}_sum{_format_labels(key)} {total[0]:.6f}")
+            lines.append(f"{self.name}_count{_format_labels(key)} {running}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: List[_Metric] = []
+        # Callbacks that refresh gauges from other components right before a scrape
+        self._collectors: List[Callable[[], None]] = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def add_collector(self, collect: Callable[[], None]) -> None:
+        self._collectors.append(collect)
+
+    def render(self) -> str:
+        for collect in self._collectors:
+            collect()
+        lines: List[str] = []
+        for metric in self._metrics:
+            lines.extend(metric.header())
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+http_requests = registry.register(Counter(
+    "http_requests_total", "HTTP requests by method, route template and status code."))
+http_duration = registry.register(Histogram(
+    "http_request_duration_seconds", "HTTP request latency until the response body is complete."))
+http_in_flight = registry.register(Gauge(
+    "http_requests_in_flight", "HTTP requests currently being handled."))
+upstream_duration = registry.register(Histogram(
+    "upstream_request_duration_seconds", "Upstream call latency by upstream, target and outcome."))
+upstream_bytes = registry.register(Counter(
+    "upstream_response_bytes_total", "Bytes received from upstream calls."))
+db_duration = registry.register(Histogram(
+    "db_query_duration_seconds", "Database statement latency by operation.",
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0)))
+loop_lag = registry.register(Histogram(
+    "event_loop_lag_seconds", "How late a periodic event-loop timer fired.",
+    buckets=(0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)))
+process_memory = registry.register(Gauge(
+    "process_resident_memory_bytes", "Resident set size of this worker."))
+process_max_memory = registry.register(Gauge(
+    "process_max_resident_memory_bytes", "Peak resident set size of this worker."))
+
+
+def _collect_memory() -> None:
+    try:
+        with open("/proc/self/statm") as f:
+            process_memory.set(int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE"))
+    except (OSError, ValueError, IndexError):
+        pass
+    try:
+        import resource
+        # ru_maxrss is in KiB on Linux, bytes on macOS
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        process_max_memory.set(peak if sys.platform == "darwin" else peak * 1024)
+    except (ImportError, OSError):
+        pass
+
+
+registry.add_collector(_collect_memory)
+
+
+def enabled() -> bool:
+    return os.getenv("METRICS_ENABLED", "true").lower() != "false"
+
+
+# Per-request time spent waiting on upstreams / the database, for Server-Timing.
+# The dict is shared with tasks spawned by the request (they copy the context).
+_request_timings: contextvars.ContextVar[Optional[Dict[str, float]]] = contextvars.ContextVar(
+    "request_timings", default=None)
+
+
+async def monitor_loop_lag() -> None:
+    """Sleep METRICS_LOOP_LAG_INTERVAL seconds at a time and record how much later
+    than that the loop woke us: time the loop spent blocked on other work."""
+    interval = float(os.getenv("METRICS_LOOP_LAG_INTERVAL", "0.1"))
+    while True:
+        start = time.perf_counter()
+        await asyncio.sleep(interval)
+        loop_lag.observe(max(0.0, time.perf_counter() - start - interval))
+
+
+def _add_timing(name: str, seconds: float) -> None:
+    timings = _request_timings.get()
+    if timings is not None:
+        timings[name] = timings.get(name, 0.0) + seconds
+
+
+def record_upstream(upstream: str, target: str, seconds: float, outcome: str, nbytes: int = 0) -> None:
+    if not enabled():
+        return
+    upstream_duration.observe(seconds, upstream=upstream, target=target, outcome=outcome)
+    if nbytes:
+        upstream_bytes.inc(nbytes, upstream=upstream, target=target)
+    _add_timing(upstream, seconds)
+
+
+def record_db(operation: str, seconds: float) -> None:
+    if not enabled():
+        return
+    db_duration.observe(seconds, operation=operation)
+    _add_timing("db", seconds)
+
+
+def _route_template(scope) -> str:
+    app = scope.get("app")
+    for route in getattr(getattr(app, "router", None), "routes", []):
+        match, _ = route.matches(scope)
+        if match == Match.FULL:
+            return getattr(route, "path", scope["path"])
+    return "<unmatched>"
+
+
+def _server_timing(timings: Dict[str, float], total: float) -> bytes:
+    waited = sum(timings.values())
+    parts = [f"{name};dur={seconds * 1000:.1f}" for name, seconds in sorted(timings.items())]
+    parts.append(f"app;dur={max(total - waited, 0.0) * 1000:.1f};desc=\"local\"")
+    parts.append(f"total;dur={total * 1000:.1f}")
+    return ", ".join(parts).encode("latin-1")
+
+
+class MetricsMiddleware:
+    """ASGI middleware recording per-route latency, in-flight requests and status
+    codes. Adds a Server-Timing header (upstream/db vs local time) when
+    SERVER_TIMING=true or the request sends `X-Server-Timing: 1`."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not enabled():
+            await self.app(scope, receive, send)
+            return
+        method = scope["method"]
+        route = _route_template(scope)
+        headers = dict(scope.get("headers") or [])
+        want_timing = (os.getenv("SERVER_TIMING", "false").lower() == "true"
+                       or headers.get(b"x-server-timing", b"").lower() in (b"1", b"true"))
+        timings: Dict[str, float] = {}
+        token = _request_timings.set(timings)
+        status = 500
+        start = time.perf_counter()
+        http_in_flight.inc(method=method, route=route)
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                if want_timing:
+                    value = _server_timing(timings, time.perf_counter() - start)
+                    extra = [(b"server-timing", value), (b"timing-allow-origin", b"*")]
+                    message = {**message, "headers": list(message.get("headers", [])) + extra}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            _request_timings.reset(token)
+            http_in_flight.dec(method=method, route=route)
+            http_requests.inc(method=method, route=route, status=status)
+            http_duration.observe(time.perf_counter() - start, method=method, route=route)
@@ -0,0 +1,252 @@
+"""Server-side mind map layout: radial or layered tree placement, plus a
+vectorized force-directed refinement in NumPy.
+
+Mind maps use the React Flow shape produced by /api/media/mindmap:
+``{"nodes": [{"id", "type", "data", "position"}], "edges": [{"id", "source", "target"}]}``.
+"""
+import math
+import os
+from collections import deque
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+import numpy as np
+
+LEVEL_GAP = 260.0  # distance between rings / layers
+SIBLING_GAP = 220.0  # horizontal spacing between leaves in tree mode
+
+
+def _tree(mindmap: Dict[str, Any]) -> Tuple[List[str], Dict[str, List[str]], Dict[str, str], str]:
+    """Return (node ids, children, parent, root) treating the edges as a tree.
+
+    Extra edges (cycles, second parents) are ignored for placement.
+    """
+    ids = [n["id"] for n in mindmap.get("nodes", [])]
+    known = set(ids)
+    children: Dict[str, List[str]] = {i: [] for i in ids}
+    parent: Dict[str, str] = {}
+    for e in mindmap.get("edges", []):
+        s, t = e.get("source"), e.get("target")
+        if s in known and t in known and t not in parent and s != t:
+            parent[t] = s
+            children[s].append(t)
+    root = next((n["id"] for n in mindmap.get("nodes", []) if n.get("type") == "topicNode"), None)
+    if root is None or root in parent:
+        root = next((i for i in ids if i not in parent), ids[0] if ids else "")
+    parent.pop(root, None)
+    if root:
+        children = {k: [c for c in v if c != root] for k, v in children.items()}
+    return ids, children, parent, root
+
+
+def _bfs(root: str, children: Dict[str, List[str]]) -> List[str]:
+    order, seen, queue = [], {root}, deque([root])
+    while queue:
+        node = queue.popleft()
+        order.append(node)
+        for c in children.get(node, []):
+            if c not in seen:
+                seen.add(c)
+                queue.append(c)
+    return order
+
+
+def _leaf_counts(order: List[str], children: Dict[str, List[str]]) -> Dict[str, int]:
+    counts: Dict[str, int] = {}
+    for node in reversed(order):
+        kids = [c for c in children.get(node, []) if c in counts]
+        counts[node] = sum(counts[c] for c in kids) or 1
+    return counts
+
+
+def radial_positions(mindmap: Dict[str, Any]) -> Dict[str, Tuple[float, float]]:
+    """Root at the origin, each depth on its own ring; every subtree gets an
+    angular wedge proportional to its number of leaves."""
+    ids, children, _, root = _tree(mindmap)
+    if not ids:
+        return {}
+    order = _bfs(root, children)
+    leaves = _leaf_counts(order, children)
+    wedge = {root: (0.0, 2 * math.pi)}
+    depth = {root: 0}
+    pos = {root: (0.0, 0.0)}
+    for node in order:
+        start, span = wedge[node]
+        kids = [c for c in children.get(node, []) if c in leaves]
+        total = sum(leaves[c] for c in kids) or 1
+        for c in kids:
+            share = span * leaves[c] / total
+            wedge[c] = (start, share)
+            depth[c] = depth[node] + 1
+            angle = start + share / 2
+            r = depth[c] * LEVEL_GAP
+            pos[c] = (r * math.cos(angle), r * math.sin(angle))
+            start += share
+    _place_unreached(ids, pos)
+    return pos
+
+
+def tree_positions(mindmap: Dict[str, Any]) -> Dict[str, Tuple[float, float]]:
+    """Layered top-down tree: leaves on a grid, parents centred over their children."""
+    ids, children, _, root = _tree(mindmap)
+    if not ids:
+        return {}
+    order = _bfs(root, children)
+    reached = set(order)
+    depth = {root: 0}
+    for node in order:
+        for c in children.get(node, []):
+            depth.setdefault(c, depth[node] + 1)
+    x: Dict[str, float] = {}
+    next_leaf = 0.0
+    # Post-order without recursion so deep maps do not hit the recursion limit
+    stack: List[Tuple[str, bool]] = [(root, False)]
+    while stack:
+        node, expanded = stack.pop()
+        kids = [c for c in children.get(node, []) if c in reached]
+        if not kids:
+            x[node] = next_leaf
+            next_leaf += SIBLING_GAP
+        elif expanded:
+            x[node] = (x[kids[0]] + x[kids[-1]]) / 2
+        else:
+            stack.append((node, True))
+            stack.extend((c, False) for c in reversed(kids))
+    offset = x[root]
+    pos = {n: (x[n] - offset, depth[n] * LEVEL_GAP) for n in order}
+    _place_unreached(ids, pos)
+    return pos
+
+
+def _place_unreached(ids: Iterable[str], pos: Dict[str, Tuple[float, float]]) -> None:
+    """Nodes not connected to the root go on a row below everything else."""
+    missing = [i for i in ids if i not in pos]
+    if not missing:
+        return
+    bottom = max((p[1] for p in pos.values()), default=0.0) + LEVEL_GAP
+    for k, node in enumerate(missing):
+        pos[node] = ((k - (len(missing) - 1) / 2) * SIBLING_GAP, bottom)
+
+
+def force_refine(positions: np.ndarray, edges: np.ndarray, movable: Optional[np.ndarray] = None,
+                 iterations: Optional[int] = None, ideal: float = LEVEL_GAP * 0.8) -> np.ndarray:
+    """Fruchterman-Reingold style refinement.
+
+    `positions` is (n, 2), `edges` is (m, 2) of node indices, `movable` is an
+    optional boolean mask of nodes allowed to move. Repulsion is computed in
+    row blocks so memory stays O(block * n) for maps with thousands of nodes.
+    """
+    n = len(positions)
+    pos = positions.astype(np.float32, copy=True)
+    if n < 2:
+        return pos.astype(np.float64)
+    if movable is None:
+        movable = np.ones(n, dtype=bool)
+    if iterations is None:
+        # Keep large maps bounded: fewer passes as the pair count grows
+        iterations = int(np.clip(4e7 / (n * n), 5, 60))
+    block = max(1, min(n, int(os.getenv("MINDMAP_LAYOUT_BLOCK", "1024"))))
+    k2 = np.float32(ideal * ideal)
+    temperature = ideal
+    cooling = temperature / (iterations + 1)
+    src, dst = (edges[:, 0], edges[:, 1]) if len(edges) else (np.empty(0, int), np.empty(0, int))
+
+    # Fixed nodes never move, so only forces on movable rows are computed
+    rows = np.flatnonzero(movable)
+    for _ in range(iterations):
+        disp = np.zeros_like(pos)
+        x, y = pos[:, 0], pos[:, 1]
+        for start in range(0, len(rows), block):
+            idx = rows[start:start + block]
+            dx = x[idx, None] - x[None, :]  # (b, n)
+            dy = y[idx, None] - y[None, :]
+            # Repulsion k^2 / d, direction delta / d  ->  delta * k^2 / d^2
+            scale = k2 / np.maximum(dx * dx + dy * dy, 1e-2)
+            disp[idx, 0] = (dx * scale).sum(axis=1)
+            disp[idx, 1] = (dy * scale).sum(axis=1)
+        if len(src):
+            delta = pos[src] - pos[dst]
+            dist = np.sqrt(np.einsum("ij,ij->i", delta, delta)) + 1e-3
+            # Attraction d^2 / k along each edge, direction delta / d
+            pull = delta * (dist / ideal)[:, None]
+            np.add.at(disp, src, -pull)
+            np.add.at(disp, dst, pull)
+        length = np.sqrt(np.einsum("ij,ij->i", disp, disp)) + 1e-6
+        step = disp * (np.minimum(length, temperature) / length)[:, None]
+        step[~movable] = 0
+        pos += step
+        temperature -= cooling
+    return pos.astype(np.float64)
+
+
+def layout_mindmap(mindmap: Dict[str, Any], mode: str = "radial", refine: bool = True) -> Dict[str, Any]:
+    """Return a copy of `mindmap` with every node's `position` filled in."""
+    nodes = mindmap.get("nodes", [])
+    if not nodes or mode == "none":
+        return mindmap
+    seed = tree_positions(mindmap) if mode == "tree" else radial_positions(mindmap)
+    ids = [n["id"] for n in nodes]
+    index = {node_id: i for i, node_id in enumerate(ids)}
+    coords = np.array([seed[i] for i in ids], dtype=np.float64)
+    movable = np.ones(len(ids), dtype=bool)
+    # The root anchors the map; everything else settles around it
+    movable[index[_tree(mindmap)[3]]] = False
+    edges = np.array(
+        [(index[e["source"]], index[e["target"]]) for e in mindmap.get("edges", [])
+         if e.get("source") in index and e.get("target") in index],
+        dtype=np.int64,
+    ).reshape(-1, 2)
+    if refine and mode == "radial":
+        coords = force_refine(coords, edges, movable)
+    out_nodes = []
+    for n, (x, y) in zip(nodes, coords):
+        out_nodes.append({**n, "position": {"x": round(float(x), 1) + 0.0, "y": round(float(y), 1) + 0.0}})
+    return {**mindmap, "nodes": out_nodes}
+
+
+def subtree_ids(mindmap: Dict[str, Any], node_id: str) -> Set[str]:
+    _, children, _, _ = _tree(mindmap)
+    return set(_bfs(node_id, children)) if node_id in children else set()
+
+
+def place_children(mindmap: Dict[str, Any], parent_id: str, child_ids: List[str]) -> Dict[str, Any]:
+    """Fan new children out from `parent_id`, pointing away from its own parent,
+    then refine only the parent's subtree while the rest of the map stays put."""
+    by_id = {n["id"]: n for n in mindmap.get("nodes", [])}
+    _, _, parent, _ = _tree(mindmap)
+    p = (by_id[parent_id].get("position") or {})
+    px, py = float(p.get("x", 0.0)), float(p.get("y", 0.0))
+    grand = parent.get(parent_id)
+    if grand is not None:
+        g = by_id[grand].get("position") or {}
+        base = math.atan2(py - float(g.get("y", 0.0)), px - float(g.get("x", 0.0)))
+    else:
+        base = -math.pi / 2
+    spread = min(math.pi * 0.9, 0.45 * max(len(child_ids) - 1, 1))
+    nodes = []
+    for n in mindmap.get("nodes", []):
+        if n["id"] in child_ids:
+            k = child_ids.index(n["id"])
+            angle = base + (k / max(len(child_ids) - 1, 1) - 0.5) * spread if len(child_ids) > 1 else base
+            n = {**n, "position": {"x": px + LEVEL_GAP * math.cos(angle), "y": py + LEVEL_GAP * math.sin(angle)}}
+        nodes.append(n)
+    placed = {**mindmap, "nodes": nodes}
+    affected = subtree_ids(placed, parent_id) - {parent_id}
+    return _refine_only(placed, affected)
+
+
+def _refine_only(mindmap: Dict[str, Any], movable_ids: Set[str]) -> Dict[str, Any]:
+    nodes = mindmap["nodes"]
+    index = {n["id"]: i for i, n in enumerate(nodes)}
+    coords = np.array([[float((n.get("position") or {}).get("x", 0.0)),
+                        float((n.get("position") or {}).get("y", 0.0))] for n in nodes])
+    movable = np.array([n["id"] in movable_ids for n in nodes])
+    edges = np.array(
+        [(index[e["source"]], index[e["target"]]) for e in mindmap.get("edges", [])
+         if e.get("source") in index and e.get("target") in index],
+        dtype=np.int64,
+    ).reshape(-1, 2)
+    if movable.any():
+        coords = force_refine(coords, edges, movable, iterations=30)
+    out = [{**n, "position": {"x": round(float(x), 1) + 0.0, "y": round(float(y), 1) + 0.0}}
+           for n, (x, y) in zip(nodes, coords)]
+    return {**mindmap, "nodes": out}
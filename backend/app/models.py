@@ -1,8 +1,15 @@
-from typing import Optional
+from typing import List, Optional
+from sqlalchemy import Index
 from sqlmodel import SQLModel, Field
 
 
 class Task(SQLModel, table=True):
+    # Serve the per-user list query (filter on user_id, optionally completed, ordered by id)
+    __table_args__ = (
+        Index("ix_task_user_id_id", "user_id", "id"),
+        Index("ix_task_user_id_completed_id", "user_id", "completed", "id"),
+    )
+
     id: Optional[int] = Field(default=None, primary_key=True)
     title: str
     completed: bool = False
@@ -17,3 +24,56 @@ class TaskCreate(SQLModel):
 class TaskUpdate(SQLModel):
     title: Optional[str] = None
     completed: Optional[bool] = None
+
+
+class TaskBatchUpdate(TaskUpdate):
+    id: int
+
+
+class TaskBatch(SQLModel):
+    create: List[TaskCreate] = []
+    update: List[TaskBatchUpdate] = []
+    delete: List[int] = []
+
+
+class TaskBatchResult(SQLModel):
+    created: List[Task] = []
+    updated: List[Task] = []
+    deleted: int = 0
+
+
+class Job(SQLModel, table=True):
+    id: str = Field(primary_key=True)
+    kind: str = Field(index=True)
+    status: str = Field(default="queued", index=True)  # queued | running | succeeded | failed
+    payload: str  # JSON request body
+    result: Optional[str] = None  # JSON response body once succeeded
+    error: Optional[str] = None
+    created_at: float
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+
+
+class Conversation(SQLModel, table=True):
+    id: str = Field(primary_key=True)
+    user_id: Optional[str] = Field(default=None, index=True)
+    summary: str = ""  # rolling summary of the turns up to summarized_upto
+    summarized_upto: int = 0  # id of the last message folded into summary
+    created_at: float
+    updated_at: float
+
+
+class ConversationCreate(SQLModel):
+    user_id: Optional[str] = None
+
+
+class ConversationMessage(SQLModel, table=True):
+    # Serve "messages of a conversation after id N" in id order
+    __table_args__ = (Index("ix_conversationmessage_conversation_id_id", "conversation_id", "id"),)
+
+    id: Optional[int] = Field(default=None, primary_key=True)
+    conversation_id: str
+    role: str  # user | model (Gemini's role names)
+    text: str
+    tokens: int  # estimated, see conversations.estimate_tokens
+    created_at: float
@@ -1,84 +1,365 @@
-import base64
+import asyncio
+import json
 import os
-from typing import Any, Dict
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional, Tuple
 from io import BytesIO
 
 import httpx
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Request
+from fastapi.responses import StreamingResponse
 
-try:
-    from huggingface_hub import InferenceClient  # type: ignore
-except ImportError:
-    InferenceClient = None  # type: ignore
+from ..admission import admission
+from ..artifacts import artifacts, data_urls_enabled, save_artifact, to_data_url
+from ..batch import batches
+from ..breakers import CircuitOpen, upstream_routes
+from ..cache import response_cache
+from ..conversations import conversations
+from ..images import VARIANTS, image_pipeline
+from .artifacts import artifact_url
+from ..singleflight import single_flight
+from ..task_sync import task_sync
+from ..upstream import gemini_client, hf_client, pool
 
 router = APIRouter(prefix="/api/ai", tags=["ai"])
 
 GEMINI_MODEL_DEFAULT = "gemini-2.5-pro"
 # Prefer SDXL as default; broadly supported on Inference API
 HF_DEFAULT_MODEL = "stabilityai/stable-diffusion-xl-base-1.0"
+HF_ENDPOINTS = {
+    "pipeline": "pipeline/text-to-image/",
+    "models": "models/",
+}
 
+# Blocking InferenceClient calls and PIL encoding run here, never on the event loop
+_image_executor = ThreadPoolExecutor(
+    max_workers=int(os.getenv("HF_IMAGE_WORKERS", "4")), thread_name_prefix="hf-image")
 
-async def gemini_chat(prompt: str) -> str:
+# Per-model image generation outcomes, reported by /api/ai/health
+_image_model_stats: Dict[str, Dict[str, float]] = {}
+
+
+def gemini_routes(model: str) -> List[str]:
+    """Fallback chain of "<api version>/<model>" candidates for `model`."""
+    return list(dict.fromkeys([f"v1beta/{model}", f"v1/{model}", "v1beta/gemini-pro"]))
+
+
+def _gemini_url(route: str, method: str, api_key: str) -> str:
+    version, model = route.split("/", 1)
+    base = os.getenv("GEMINI_BASE_URL", "https://generativelanguage.googleapis.com").rstrip("/")
+    return f"{base}/{version}/models/{model}:{method}key={api_key}"
+
+
+def _hf_url(endpoint: str, model: str) -> str:
+    base = os.getenv("HF_BASE_URL", "https://api-inference.huggingface.co").rstrip("/")
+    return f"{base}/{HF_ENDPOINTS[endpoint]}{model}"
+
+
+def _model_missing(msg: str) -> bool:
+    return "not found" in msg.lower() or "not supported" in msg.lower()
+
+
+def _record_gemini_error(route, status: int, msg: str) -> None:
+    # Only errors that say something about this version/model count against it
+    if _model_missing(msg) or status >= 500 or status == 429:
+        route.failure(msg, permanent=_model_missing(msg))
+
+
+def _gemini_exhausted(chain: List[str], last_error: Optional[str]) -> HTTPException:
+    if last_error is None:
+        return HTTPException(
+            503, detail="Gemini unavailable: every model route is failing, retry later",
+            headers={"Retry-After": str(upstream_routes.retry_after("gemini", chain))})
+    return HTTPException(502, detail=f"Gemini fallback failed: {last_error}")
+
+
+async def gemini_generate(prompt: str, client: Optional[httpx.AsyncClient] = None,
+                          model: Optional[str] = None, timeout: Optional[float] = None,
+                          contents: Optional[List[Dict[str, Any]]] = None) -> Dict[str, Any]:
+    """POST generateContent and return the response JSON.
+
+    Walks the v1beta -> v1 -> gemini-pro chain, starting from the route that
+    last worked and skipping routes whose circuit breaker is open. `contents`
+    (a multi-turn history ending with the user's turn) replaces the single
+    `prompt` turn.
+    """
     api_key = os.getenv("GEMINI_API_KEY")
     if not api_key:
         raise HTTPException(500, detail="GEMINI_API_KEY not configured")
-    configured = os.getenv("GEMINI_MODEL", GEMINI_MODEL_DEFAULT)
-
-    async def call(version: str, model_name: str) -> str:
-        url = f"https://generativelanguage.googleapis.com/{version}/models/{model_name}:generateContent?key={api_key}"
-        async with httpx.AsyncClient(timeout=60) as client:
-            r = await client.post(url, json={"contents": [{"parts": [{"text": prompt}]}]})
-        if r.status_code >= 400:
-            raise HTTPException(502, detail=r.text)
-        data = r.json()
-        return (
-            data.get("candidates", [{}])[0]
-            .get("content", {})
-            .get("parts", [{}])[0]
-            .get("text", "No response.")
-        )
+    configured = model or os.getenv("GEMINI_MODEL", GEMINI_MODEL_DEFAULT)
+    client = client or pool.client("gemini")
+    body = {"contents": contents or [{"parts": [{"text": prompt}]}]}
+
+    chain = gemini_routes(configured)
+    last_error = None
+    # Waits (fairly across clients) while every Gemini slot is busy
+    async with admission.slot("gemini"):
+        for key in upstream_routes.order("gemini", chain):
+            try:
+                with upstream_routes.attempt("gemini", key) as route:
+                    try:
+                        r = await client.post(
+                            _gemini_url(key, "generateContent?", api_key), json=body,
+                            timeout=httpx.USE_CLIENT_DEFAULT if timeout is None else timeout)
+                    except httpx.HTTPError as e:
+                        route.failure(str(e) or type(e).__name__)
+                        raise
+                    if r.status_code < 400:
+                        route.success(len(r.content))
+                        return r.json()
+                    _record_gemini_error(route, r.status_code, r.text)
+                    if not _model_missing(r.text):
+                        raise HTTPException(502, detail=r.text)
+                    last_error = r.text
+            except CircuitOpen:
+                continue
+        raise _gemini_exhausted(chain, last_error)
+
+
+async def gemini_chat(prompt: str, client: Optional[httpx.AsyncClient] = None,
+                      contents: Optional[List[Dict[str, Any]]] = None) -> str:
+    data = await gemini_generate(prompt, client, contents=contents)
+    return (
+        data.get("candidates", [{}])[0]
+        .get("content", {})
+        .get("parts", [{}])[0]
+        .get("text", "No response.")
+    )
+
+
+async def gemini_chat_stream(prompt: str, client: Optional[httpx.AsyncClient] = None,
+                             model: Optional[str] = None,
+                             contents: Optional[List[Dict[str, Any]]] = None) -> AsyncIterator[str]:
+    """Yield reply text chunks from Gemini's streamGenerateContent (SSE).
+
+    Uses the same route chain and breakers as gemini_generate; a fallback is
+    only possible before the first chunk has been yielded. `model` overrides
+    GEMINI_MODEL; `contents` is as for gemini_generate.
+    """
+    api_key = os.getenv("GEMINI_API_KEY")
+    if not api_key:
+        raise HTTPException(500, detail="GEMINI_API_KEY not configured")
+    configured = model or os.getenv("GEMINI_MODEL", GEMINI_MODEL_DEFAULT)
+    client = client or pool.client("gemini")
+    body = {"contents": contents or [{"parts": [{"text": prompt}]}]}
+
+    chain = gemini_routes(configured)
+    last_error = None
+    # The slot is held until the stream ends or the client goes away
+    async with admission.slot("gemini"):
+        for key in upstream_routes.order("gemini", chain):
+            try:
+                with upstream_routes.attempt("gemini", key) as route:
+                    url = _gemini_url(key, "streamGenerateContent?alt=sse&", api_key)
+                    try:
+                        # Leaving this block (normally, on error or on cancellation when the
+                        # client disconnects) closes the upstream response.
+                        async with client.stream("POST", url, json=body) as r:
+                            if r.status_code >= 400:
+                                msg = (await r.aread()).decode("utf-8", "replace")
+                                _record_gemini_error(route, r.status_code, msg)
+                                if not _model_missing(msg):
+                                    raise HTTPException(502, detail=msg)
+                                last_error = msg
+                                continue
+                            route.success()  # recorded at time to first byte
+                            async for line in r.aiter_lines():
+                                if not line.startswith("data:"):
+                                    continue
+                                try:
+                                    data = json.loads(line[5:].strip())
+                                except ValueError:
+                                    continue
+                                parts = (
+                                    data.get("candidates", [{}])[0]
+                                    .get("content", {})
+                                    .get("parts", [])
+                                )
+                                text = "".join(p.get("text", "") for p in parts)
+                                if text:
+                                    yield text
+                            return
+                    except httpx.HTTPError as e:
+                        if not route.done:
+                            route.failure(str(e) or type(e).__name__)
+                        raise
+            except CircuitOpen:
+                continue
+        raise _gemini_exhausted(chain, last_error)
+
 
-    # Try configured model on v1beta then v1, fallback to gemini-pro on v1beta
-    for ver, model in [("v1beta", configured), ("v1", configured)]:
+async def mock_chat_stream(msg: str) -> AsyncIterator[str]:
+    """Word-by-word mock reply; MOCK_STREAM_DELAY_MS sets the gap between chunks."""
+    try:
+        delay = float(os.getenv("MOCK_STREAM_DELAY_MS", "50")) / 1000
+    except ValueError:
+        delay = 0.05
+    words = f"🤖 (mock) You said: {msg}".split(" ")
+    for i, word in enumerate(words):
+        await asyncio.sleep(delay)
+        yield word if i == len(words) - 1 else word + " "
+
+
+def summarizer(client: Optional[httpx.AsyncClient] = None) -> Callable[[str], Awaitable[str]]:
+    """Text generator for conversation summaries (a plain excerpt when MOCK_AI=true)."""
+    if os.getenv("MOCK_AI", "false").lower() == "true":
+        async def mock_summary(prompt: str) -> str:
+            return "(mock summary) " + prompt.rsplit("New turns:", 1)[-1].strip()[-400:]
+        return mock_summary
+    return lambda prompt: gemini_chat(prompt, client)
+
+
+def sse_event(data: Any, event: Optional[str] = None) -> str:
+    head = f"event: {event}\n" if event else ""
+    return f"{head}data: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+def _record_image_attempt(model: str, outcome: str, seconds: float) -> None:
+    stats = _image_model_stats.setdefault(model, {
+        "attempts": 0, "wins": 0, "failures": 0, "cancelled": 0,
+        "totalSeconds": 0.0, "winSeconds": 0.0,
+    })
+    stats["attempts"] += 1
+    stats[outcome] += 1
+    stats["totalSeconds"] += seconds
+    if outcome == "wins":
+        stats["winSeconds"] += seconds
+
+
+def image_model_stats() -> Dict[str, Dict[str, Any]]:
+    out = {}
+    for model, s in _image_model_stats.items():
+        finished = s["attempts"] - s["cancelled"]
+        out[model] = {
+            "attempts": int(s["attempts"]),
+            "wins": int(s["wins"]),
+            "failures": int(s["failures"]),
+            "cancelled": int(s["cancelled"]),
+            "winRate": round(s["wins"] / s["attempts"], 3) if s["attempts"] else None,
+            "avgSeconds": round(s["totalSeconds"] / finished, 3) if finished else None,
+            "avgWinSeconds": round(s["winSeconds"] / s["wins"], 3) if s["wins"] else None,
+        }
+    return out
+
+
+_inference_client_cls: Any = None
+
+
+def inference_client_class() -> Any:
+    """huggingface_hub.InferenceClient, or None if it is not installed. Imported on
+    first use (or by the startup warmup): with Pillow it adds a lot to cold start."""
+    global _inference_client_cls
+    if _inference_client_cls is None:
         try:
-            return await call(ver, model)
-        except HTTPException as e:
-            msg = e.detail if isinstance(e.detail, str) else str(e.detail)
-            if "not found" not in msg.lower() and "not supported" not in msg.lower():
-                raise
+            from huggingface_hub import InferenceClient  # type: ignore
+        except ImportError:
+            InferenceClient = False
+        _inference_client_cls = InferenceClient
+    return _inference_client_cls or None
+
+
+def _inference_client_image(api_key: str, model: str, prompt: str) -> bytes:
+    """Blocking InferenceClient call plus PNG encoding; run on _image_executor.
+
+    The PNG is only the lossless hand-off to the image pipeline (and the
+    `original` variant), so it is written with the fastest compression level.
+    """
+    client = inference_client_class()(api_key=api_key)
+    img = client.text_to_image(prompt=prompt, model=model)
+
+    # Convert PIL Image or bytes to raw PNG bytes
+    if hasattr(img, "save"):
+        buf = BytesIO()
+        img.save(buf, format="PNG", compress_level=1)
+        return buf.getvalue()
+    if isinstance(img, (bytes, bytearray)):
+        return bytes(img)
+    raise RuntimeError("Unexpected image type from HF client")
+
+
+def _transport_failure(e: httpx.HTTPError) -> Dict[str, Any]:
+    """A candidate's connection error or timeout counts as that candidate failing."""
+    return {"ok": False, "reason": f"{type(e).__name__}: {e}" if str(e) else type(e).__name__}
+
+
+async def _race_candidates(models: list, run) -> tuple:
+    """Start `run(model)` for each model with staggered starts; first image wins.
+
+    Returns (winning result or None, failure reasons) once one succeeds or all
+    have failed; transport errors are failures too. Losers are cancelled. Other
+    exceptions (the 401 HTTPException) are re-raised.
+    """
+    try:
+        delay = float(os.getenv("HF_HEDGE_DELAY", "3"))
+    except ValueError:
+        delay = 3.0
+
+    async def staggered(i: int, model: str) -> Dict[str, Any]:
+        if i:
+            await asyncio.sleep(i * delay)
+        return await run(model)
+
+    tasks = {asyncio.create_task(staggered(i, m)): m for i, m in enumerate(models)}
+    pending = set(tasks)
+    reasons = []
     try:
-        return await call("v1beta", "gemini-pro")
-    except HTTPException as e:
-        raise HTTPException(502, detail=f"Gemini fallback failed: {e.detail}")
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for t in done:
+                try:
+                    res = t.result()
+                except httpx.HTTPError as e:
+                    res = _transport_failure(e)
+                if res.get("ok"):
+                    return res, reasons
+                reasons.append(f"{tasks[t]}: {res.get('reason')}")
+    finally:
+        for t in pending:
+            t.cancel()
+        if pending:
+            await asyncio.gather(*pending, return_exceptions=True)
+    return None, reasons
+
+
+async def hf_generate_image(prompt: str, client: Optional[httpx.AsyncClient] = None) -> str:
+    """Generate an image and return it as a data URL."""
+    image_bytes, mime = await hf_generate_image_bytes(prompt, client)
+    return to_data_url(image_bytes, mime)
+
 
+async def hf_generate_image_bytes(prompt: str, client: Optional[httpx.AsyncClient] = None) -> Tuple[bytes, str]:
+    """Generate an image and return (raw bytes, mime type)."""
+    async with admission.slot("hf"):
+        return await _hf_generate_image_bytes(prompt, client)
 
-async def hf_generate_image(prompt: str) -> str:
+
+async def _hf_generate_image_bytes(prompt: str, client: Optional[httpx.AsyncClient] = None) -> Tuple[bytes, str]:
     api_key = os.getenv("HF_API_KEY")
     if not api_key:
         raise HTTPException(500, detail="HF_API_KEY not configured")
+    http = client or pool.client("hf")
 
     configured = (os.getenv("HF_MODEL") or HF_DEFAULT_MODEL).strip()
 
-    # Try using huggingface_hub InferenceClient first if available
-    if InferenceClient:
+    # Try using huggingface_hub InferenceClient first if available (and not failing lately);
+    # it always talks to the public endpoint, so it is skipped when HF_BASE_URL is set
+    if not os.getenv("HF_BASE_URL") and await asyncio.to_thread(inference_client_class):
         try:
-            client = InferenceClient(api_key=api_key)
-            img = client.text_to_image(prompt=prompt, model=configured)
-
-            # Convert PIL Image or bytes to base64 data URL
-            if hasattr(img, "save"):
-                buf = BytesIO()
-                img.save(buf, format="PNG")
-                image_bytes = buf.getvalue()
-            elif isinstance(img, (bytes, bytearray)):
-                image_bytes = bytes(img)
-            else:
-                raise RuntimeError("Unexpected image type from HF client")
-
-            b64 = base64.b64encode(image_bytes).decode("utf-8")
-            return f"data:image/png;base64,{b64}"
-        except Exception as e:
-            # Fall back to HTTP requests approach
+            with upstream_routes.attempt("hf", f"client/{configured}") as route:
+                start = time.perf_counter()
+                try:
+                    loop = asyncio.get_running_loop()
+                    image_bytes = await loop.run_in_executor(
+                        _image_executor, _inference_client_image, api_key, configured, prompt)
+                    _record_image_attempt(configured, "wins", time.perf_counter() - start)
+                    route.success(len(image_bytes))
+                    return image_bytes, "image/png"
+                except Exception as e:
+                    # Fall back to HTTP requests approach
+                    _record_image_attempt(configured, "failures", time.perf_counter() - start)
+                    route.failure(str(e) or type(e).__name__)
+        except CircuitOpen:
             pass
 
     # Fallback to HTTP requests approach
@@ -89,17 +370,18 @@ async def hf_generate_image(prompt: str) -> str:
         "black-forest-labs/FLUX.1-schnell",
         "runwayml/stable-diffusion-v1-5",
     ]
-    candidates = []
+    models = []
     for m in [configured, *(fallbacks if allow_fallback else [])]:
-        if m not in candidates:
-            candidates.append(m)
+        if m not in models:
+            models.append(m)
+    # Try the task-specific pipeline endpoint first, then fall back to the generic
+    # models endpoint; the (endpoint, model) pair that last worked goes first and
+    # pairs with an open circuit breaker are skipped.
+    chain = [f"{ep}/{m}" for m in models for ep in HF_ENDPOINTS]
+    routes = upstream_routes.order("hf", chain)
+    candidates = list(dict.fromkeys(r.split("/", 1)[1] for r in routes))
 
     async def attempt(model: str) -> Dict[str, Any]:
-        # Try the task-specific pipeline endpoint first, then fall back to the generic models endpoint
-        endpoints = [
-            f"https://api-inference.huggingface.co/pipeline/text-to-image/{model}",
-            f"https://api-inference.huggingface.co/models/{model}",
-        ]
         headers = {
             "Authorization": f"Bearer {api_key}",
             # Accept any image; we'll infer type from response
@@ -107,44 +389,85 @@ async def hf_generate_image(prompt: str) -> str:
             "Content-Type": "application/json",
         }
 
-        async with httpx.AsyncClient(timeout=120) as client:
-            last_resp: httpx.Response | None = None
-            for url in endpoints:
-                r = await client.post(url, headers=headers, json={"inputs": prompt})
-                last_resp = r
-                # If warming up, retry once
-                if r.status_code == 503:
-                    r = await client.post(url, headers=headers, json={"inputs": prompt})
-                ct = r.headers.get("content-type", "")
-                if r.status_code == 401:
-                    raise HTTPException(
-                        502, detail="Unauthorized: set HF_API_KEY correctly")
-                if r.status_code == 403:
-                    return {"ok": False, "reason": f"restricted: accept terms for {model}"}
-                if r.status_code == 404:
-                    # Try next endpoint if available; otherwise report not found
-                    continue
-                if 200 <= r.status_code < 300 and "image" in ct:
-                    mime = ct.split(";")[0].strip() or "image/png"
-                    b64 = base64.b64encode(r.content).decode("utf-8")
-                    return {"ok": True, "data_url": f"data:{mime};base64,{b64}", "model": model}
-                # Non-image successful responses sometimes include JSON with errors
-                try:
-                    data = r.json()
-                    msg = data.get("error") or data.get(
-                        "message") or f"HTTP {r.status_code}"
+        for key in [r for r in routes if r.split("/", 1)[1] == model]:
+            url = _hf_url(key.split("/", 1)[0], model)
+            try:
+                with upstream_routes.attempt("hf", key) as route:
+                    try:
+                        r = await http.post(url, headers=headers, json={"inputs": prompt})
+                        # If warming up, retry once
+                        if r.status_code == 503:
+                            r = await http.post(url, headers=headers, json={"inputs": prompt})
+                    except httpx.HTTPError as e:
+                        route.failure(str(e) or type(e).__name__)
+                        raise
+                    ct = r.headers.get("content-type", "")
+                    if r.status_code == 401:
+                        raise HTTPException(
+                            502, detail="Unauthorized: set HF_API_KEY correctly")
+                    if r.status_code == 403:
+                        route.failure("restricted", permanent=True)
+                        return {"ok": False, "reason": f"restricted: accept terms for {model}"}
+                    if r.status_code == 404:
+                        # Try next endpoint if available; otherwise report not found
+                        route.failure("not found", permanent=True)
+                        continue
+                    if 200 <= r.status_code < 300 and "image" in ct:
+                        route.success(len(r.content))
+                        mime = ct.split(";")[0].strip() or "image/png"
+                        return {"ok": True, "content": r.content, "mime": mime, "model": model}
+                    # Non-image successful responses sometimes include JSON with errors
+                    try:
+                        data = r.json()
+                        msg = data.get("error") or data.get(
+                            "message") or f"HTTP {r.status_code}"
+                    except Exception:
+                        msg = f"HTTP {r.status_code}"
+                    route.failure(str(msg))
                     return {"ok": False, "reason": msg}
-                except Exception:
-                    return {"ok": False, "reason": f"HTTP {r.status_code}"}
+            except CircuitOpen:
+                continue
 
-        # If both endpoints 404'd
+        # If both endpoints 404'd (or were skipped)
         return {"ok": False, "reason": f"not-found or unsupported on Inference API: {model}"}
 
+    async def timed_attempt(model: str) -> Dict[str, Any]:
+        start = time.perf_counter()
+        try:
+            res = await attempt(model)
+        except asyncio.CancelledError:
+            _record_image_attempt(model, "cancelled", time.perf_counter() - start)
+            raise
+        except Exception:
+            _record_image_attempt(model, "failures", time.perf_counter() - start)
+            raise
+        _record_image_attempt(
+            model, "wins" if res.get("ok") else "failures", time.perf_counter() - start)
+        return res
+
     reasons = []
-    for m in candidates:
-        res = await attempt(m)
+    if not candidates:
+        reasons.append(f"every endpoint is failing, retry in {upstream_routes.retry_after('hf', chain)}s")
+    remaining = candidates
+    # Hedged mode: race the first HF_HEDGE_COUNT candidates, then walk the rest
+    if candidates and os.getenv("HF_HEDGE", "false").lower() == "true":
+        try:
+            hedge_count = max(1, int(os.getenv("HF_HEDGE_COUNT", "2")))
+        except ValueError:
+            hedge_count = 2
+        res, race_reasons = await _race_candidates(candidates[:hedge_count], timed_attempt)
+        reasons.extend(race_reasons)
+        if res:
+            return res["content"], res["mime"]
+        remaining = candidates[hedge_count:]
+
+    for m in remaining:
+        try:
+            res = await timed_attempt(m)
+        except httpx.HTTPError as e:
+            res = _transport_failure(e)
         if res.get("ok"):
-            return res["data_url"]
+            return res["content"], res["mime"]
         reasons.append(f"{m}: {res.get('reason')}")
 
     placeholder = os.getenv("HF_PLACEHOLDER_ON_FAIL",
@@ -160,29 +483,132 @@ async def hf_generate_image(prompt: str) -> str:
             f"<text x='50%' y='60%' dominant-baseline='middle' text-anchor='middle' fill='#9ca3af' font-size='14' font-family='sans-serif'>{reasons_s}</text>"
             f"</svg>"
         )
-        return f"data:image/svg+xml;utf8,{svg}"
+        return svg.encode("utf-8"), "image/svg+xml"
 
     raise HTTPException(
         502, detail=f"HF failed for all candidates. Reasons: {'; '.join(reasons)}")
 
 
-@router.post("/chat")
-async def chat(payload: Dict[str, str]):
+@router.post("/chat", dependencies=[Depends(admission.limit("chat"))])
+async def chat(request: Request, payload: Dict[str, str],
+               client: httpx.AsyncClient = Depends(gemini_client)):
+    """Reply to `message`. With `conversationId` (see /api/conversations) the
+    server keeps the history and sends Gemini the recent turns plus a rolling
+    summary; without it every message stands alone."""
     msg = payload.get("message")
     if not isinstance(msg, str) or not msg.strip():
         raise HTTPException(400, detail="Invalid or missing 'message'")
+    if payload.get("conversationId"):
+        conversation = await conversations.get(payload["conversationId"])
+        if os.getenv("MOCK_AI", "false").lower() == "true":
+            reply = f"🤖 (mock) You said: {msg}"
+        else:
+            reply = await gemini_chat(msg, client, contents=await conversations.contents(conversation, msg))
+        await conversations.record(conversation, msg, reply, summarizer(client))
+        return {"reply": reply, "conversationId": conversation.id}
+    return await create_chat(msg, client, request)
+
+
+async def create_chat(msg: str, client: Optional[httpx.AsyncClient] = None,
+                      request: Optional[Request] = None) -> Dict[str, Any]:
+    """Response body for /api/ai/chat without a conversation (also used by /chat/batch)."""
     # Optional mock
     if os.getenv("MOCK_AI", "false").lower() == "true":
         return {"reply": f"🤖 (mock) You said: {msg}"}
-    reply = await gemini_chat(msg)
+    model = os.getenv("GEMINI_MODEL", GEMINI_MODEL_DEFAULT)
+    reply = await response_cache.get_or_set(
+        "chat", model, msg, None, request, lambda: gemini_chat(msg, client))
     return {"reply": reply}
 
 
-@router.post("/art")
-async def art(payload: Dict[str, str]):
-    prompt = payload.get("prompt")
-    if not isinstance(prompt, str) or not prompt.strip():
-        raise HTTPException(400, detail="Invalid or missing 'prompt'")
+@router.post("/chat/batch")
+async def chat_batch(request: Request, payload: Dict[str, Any],
+                     client: httpx.AsyncClient = Depends(gemini_client)):
+    """Reply to many messages concurrently, streamed back as NDJSON as each one finishes.
+
+    `items` are messages (or {"message"} objects); `concurrency` and `timeout`
+    (seconds per item) are optional. Each item is charged like one /chat call.
+    """
+    async def run(item: Any) -> Dict[str, Any]:
+        msg = item.get("message") if isinstance(item, dict) else item
+        if not isinstance(msg, str) or not msg.strip():
+            raise HTTPException(400, detail="Invalid or missing 'message'")
+        await admission.pace(request, "chat")
+        return await create_chat(msg, client, request)
+
+    return batches.stream(payload, run)
+
+
+@router.post("/chat/stream", dependencies=[Depends(admission.limit("chat"))])
+async def chat_stream(request: Request, payload: Dict[str, str],
+                      client: httpx.AsyncClient = Depends(gemini_client)):
+    """Stream the chat reply as Server-Sent Events (one `data` event per chunk)."""
+    msg = payload.get("message")
+    if not isinstance(msg, str) or not msg.strip():
+        raise HTTPException(400, detail="Invalid or missing 'message'")
+    conversation = None
+    if payload.get("conversationId"):
+        conversation = await conversations.get(payload["conversationId"])
+    if os.getenv("MOCK_AI", "false").lower() == "true":
+        chunks = mock_chat_stream(msg)
+    elif conversation is not None:
+        chunks = gemini_chat_stream(msg, client, contents=await conversations.contents(conversation, msg))
+    else:
+        chunks = gemini_chat_stream(msg, client)
+
+    # Wait for the first chunk so setup errors (missing key, failed fallback
+    # chain) still surface as a normal HTTP error instead of a 200 stream.
+    try:
+        first = await chunks.__anext__()
+    except StopAsyncIteration:
+        first = None
+
+    async def events() -> AsyncIterator[str]:
+        reply = []
+        try:
+            if first is not None:
+                reply.append(first)
+                yield sse_event({"text": first})
+            async for text in chunks:
+                if await request.is_disconnected():
+                    return
+                reply.append(text)
+                yield sse_event({"text": text})
+            if conversation is None:
+                yield sse_event({}, event="done")
+            else:
+                # Only complete replies become part of the conversation
+                await conversations.record(conversation, msg, "".join(reply), summarizer(client))
+                yield sse_event({"conversationId": conversation.id}, event="done")
+        except HTTPException as e:
+            yield sse_event({"detail": e.detail}, event="error")
+        except httpx.HTTPError as e:
+            yield sse_event({"detail": f"Upstream stream failed: {e}"}, event="error")
+        finally:
+            await chunks.aclose()
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+def image_variant(value: Optional[str] = None) -> str:
+    variant = (value or os.getenv("IMAGE_DEFAULT_VARIANT", "full")).lower()
+    if variant not in VARIANTS:
+        raise HTTPException(400, detail=f"Invalid 'variant', expected one of {', '.join(VARIANTS)}")
+    return variant
+
+
+async def create_art(prompt: str, base_url: str, client: Optional[httpx.AsyncClient] = None,
+                     request: Optional[Request] = None, variant: Optional[str] = None) -> Dict[str, Any]:
+    """Response body for /api/ai/art (also used by the job queue).
+
+    `base_url` is the public base of this API, used to build artifact URLs.
+    `art` is the requested variant (full-size WebP/AVIF by default, `thumb` or
+    the `original` upstream image); `variants` lists all of them.
+    """
     if os.getenv("MOCK_AI", "false").lower() == "true":
         svg = (
             f"<svg xmlns='http://www.w3.org/2000/svg' width='512' height='320'>"
@@ -191,8 +617,53 @@ async def art(payload: Dict[str, str]):
             f"</svg>"
         )
         return {"art": f"data:image/svg+xml;utf8,{svg}"}
-    data_url = await hf_generate_image(prompt)
-    return {"art": data_url}
+    model = (os.getenv("HF_MODEL") or HF_DEFAULT_MODEL).strip()
+    variant = image_variant(variant)
+    if data_urls_enabled():
+        async def produce_data_url() -> Dict[str, Any]:
+            image_bytes, mime = await hf_generate_image_bytes(prompt, client)
+            processed = await image_pipeline.process(image_bytes, mime) or {}
+            data, mime = processed.get(variant, (image_bytes, mime))
+            return {"art": to_data_url(data, mime), "blurhash": processed.get("blurhash")}
+
+        return await response_cache.get_or_set(
+            "art", model, prompt, {"format": "data_url", "variant": variant}, request, produce_data_url,
+            similar=True)
+
+    async def produce() -> Dict[str, Any]:
+        image_bytes, mime = await hf_generate_image_bytes(prompt, client)
+        names = {"original": await save_artifact(image_bytes, mime)}
+        processed = await image_pipeline.process(image_bytes, mime) or {}
+        for name in ("full", "thumb"):
+            if name in processed:
+                names[name] = await save_artifact(*processed[name])
+        return {
+            "variants": names,
+            "blurhash": processed.get("blurhash"),
+            "width": processed.get("width"),
+            "height": processed.get("height"),
+        }
+
+    entry = await response_cache.get_or_set(
+        "art", model, prompt, {"format": "variants"}, request, produce,
+        valid=lambda e: all(artifacts.exists(n) for n in e["variants"].values()), similar=True)
+    urls = {name: artifact_url(base_url, n) for name, n in entry["variants"].items()}
+    return {
+        "art": urls.get(variant, urls["original"]),
+        "variants": urls,
+        "blurhash": entry["blurhash"],
+        "width": entry["width"],
+        "height": entry["height"],
+    }
+
+
+@router.post("/art", dependencies=[Depends(admission.limit("art"))])
+async def art(request: Request, payload: Dict[str, str], variant: Optional[str] = None,
+              client: httpx.AsyncClient = Depends(hf_client)):
+    prompt = payload.get("prompt")
+    if not isinstance(prompt, str) or not prompt.strip():
+        raise HTTPException(400, detail="Invalid or missing 'prompt'")
+    return await create_art(prompt, str(request.base_url), client, request, variant)
 
 
 @router.get("/health")
@@ -208,5 +679,17 @@ async def health():
             "apiKeyPresent": bool(os.getenv("HF_API_KEY")),
             "model": os.getenv("HF_MODEL", HF_DEFAULT_MODEL),
             "allowFallback": os.getenv("HF_ALLOW_FALLBACK", "true").lower() != "false",
+            "hedge": os.getenv("HF_HEDGE", "false").lower() == "true",
+            "models": image_model_stats(),
         },
+        "upstream": pool.stats(),
+        "routes": upstream_routes.stats(),
+        "cache": response_cache.stats(),
+        "singleFlight": single_flight.stats(),
+        "artifacts": artifacts.stats(),
+        "admission": admission.stats(),
+        "images": image_pipeline.stats(),
+        "conversations": conversations.stats(),
+        "batches": batches.stats(),
+        "taskSync": task_sync.stats(),
     }
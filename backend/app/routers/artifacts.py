@@ -0,0 +1,37 @@
+import os
+
+from fastapi import APIRouter, HTTPException, Request, Response
+from fastapi.responses import FileResponse
+
+from ..artifacts import artifacts
+
+router = APIRouter(prefix="/api/artifacts", tags=["artifacts"])
+
+IMMUTABLE = "public, max-age=31536000, immutable"
+
+
+def artifact_url(base_url: str, name: str) -> str:
+    """Absolute URL for a stored artifact (the frontend is served from another origin).
+
+    PUBLIC_BASE_URL, when set, replaces the request's base URL, e.g. behind a
+    proxy that does not send X-Forwarded-Proto.
+    """
+    base_url = os.getenv("PUBLIC_BASE_URL") or base_url
+    return f"{base_url.rstrip('/')}{router.prefix}/{name}"
+
+
+@router.api_route("/{name}", methods=["GET", "HEAD"], name="get_artifact")
+async def get_artifact(name: str, request: Request):
+    """Serve a generated file by content hash (supports Range and If-None-Match)."""
+    path = artifacts.path_for(name)
+    if not path or not artifacts.exists(name):
+        raise HTTPException(404, detail="Artifact not found")
+
+    # The name is the content hash, so it is a strong validator
+    etag = f'"{name.split(".")[0]}"'
+    headers = {"ETag": etag, "Cache-Control": IMMUTABLE}
+    if_none_match = request.headers.get("if-none-match", "")
+    if if_none_match.strip() == "*" or etag in [t.strip() for t in if_none_match.split(",")]:
+        return Response(status_code=304, headers=headers)
+
+    return FileResponse(path, headers=headers)
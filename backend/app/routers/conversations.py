@@ -0,0 +1,43 @@
+from typing import Any, Dict, Optional
+
+from fastapi import APIRouter, Query
+
+from ..conversations import conversations
+from ..models import Conversation, ConversationCreate
+
+router = APIRouter(prefix="/api/conversations", tags=["conversations"])
+
+
+def conversation_view(conversation: Conversation) -> Dict[str, Any]:
+    return {
+        "id": conversation.id,
+        "userId": conversation.user_id,
+        "summary": conversation.summary,
+        "createdAt": conversation.created_at,
+        "updatedAt": conversation.updated_at,
+    }
+
+
+@router.post("")
+async def create_conversation(payload: Optional[ConversationCreate] = None):
+    """Start a conversation; pass its id as `conversationId` to /api/ai/chat."""
+    conversation = await conversations.create(payload.user_id if payload else None)
+    return conversation_view(conversation)
+
+
+@router.get("/{conversation_id}")
+async def get_conversation(conversation_id: str, limit: int = Query(50, ge=1, le=500),
+                           before: Optional[int] = Query(None, description="Return messages with id less than this cursor")):
+    """The conversation with its latest messages (oldest first); page back with `before`."""
+    conversation = await conversations.get(conversation_id)
+    messages = await conversations.messages(conversation_id, limit, before)
+    return {
+        **conversation_view(conversation),
+        "messages": [{"id": m.id, "role": m.role, "text": m.text, "createdAt": m.created_at} for m in messages],
+    }
+
+
+@router.delete("/{conversation_id}")
+async def delete_conversation(conversation_id: str):
+    await conversations.delete(conversation_id)
+    return {"success": True}
@@ -0,0 +1,121 @@
+import json
+import os
+from typing import Any, AsyncIterator, Dict
+
+from fastapi import APIRouter, HTTPException, Request
+from fastapi.responses import StreamingResponse
+
+from ..admission import admission
+from ..jobs import TERMINAL, job_queue
+from ..models import Job
+from .ai import create_art, image_variant, sse_event
+from .media import create_audio, create_mindmap, layout_mode
+
+router = APIRouter(prefix="/api/jobs", tags=["jobs"])
+
+
+async def run_art(payload: Dict[str, Any]) -> Dict[str, Any]:
+    return await create_art(payload["prompt"], payload["base_url"], variant=payload.get("variant"))
+
+
+async def run_audio(payload: Dict[str, Any]) -> Dict[str, Any]:
+    return await create_audio(payload["prompt"], payload["generate_content"], payload["base_url"])
+
+
+async def run_mindmap(payload: Dict[str, Any]) -> Dict[str, Any]:
+    return await create_mindmap(payload["topic"], layout=payload.get("layout"))
+
+
+job_queue.register("art", run_art, concurrency=2)
+job_queue.register("audio", run_audio, concurrency=2)
+job_queue.register("mindmap", run_mindmap, concurrency=4)
+
+
+def _job_payload(kind: str, payload: Dict[str, Any]) -> Dict[str, Any]:
+    """Validate a submission the same way the synchronous endpoint does."""
+    if kind == "art":
+        prompt = payload.get("prompt")
+        if not isinstance(prompt, str) or not prompt.strip():
+            raise HTTPException(400, detail="Invalid or missing 'prompt'")
+        return {"prompt": prompt, "variant": image_variant(payload.get("variant"))}
+    if kind == "audio":
+        prompt = payload.get("text") or payload.get("prompt")
+        if not isinstance(prompt, str) or not prompt.strip():
+            raise HTTPException(400, detail="Invalid or missing 'text' or 'prompt'")
+        return {"prompt": prompt, "generate_content": bool(payload.get("generate_content", True))}
+    topic = payload.get("topic") or payload.get("prompt")
+    if not isinstance(topic, str) or not topic.strip():
+        raise HTTPException(400, detail="Invalid or missing 'topic' or 'prompt'")
+    return {"topic": topic, "layout": layout_mode(payload.get("layout"))}
+
+
+def job_view(job: Job) -> Dict[str, Any]:
+    return {
+        "id": job.id,
+        "kind": job.kind,
+        "status": job.status,
+        "result": json.loads(job.result) if job.result else None,
+        "error": job.error,
+        "createdAt": job.created_at,
+        "startedAt": job.started_at,
+        "finishedAt": job.finished_at,
+    }
+
+
+@router.post("/{kind}", status_code=202)
+async def submit_job(kind: str, request: Request, payload: Dict[str, Any]):
+    """Queue an art, audio or mindmap generation and return its job id immediately."""
+    if kind not in job_queue.kinds:
+        raise HTTPException(404, detail=f"Unknown job kind '{kind}'")
+    await admission.charge(request, kind)
+    data = _job_payload(kind, payload)
+    data["base_url"] = str(request.base_url)
+    job = await job_queue.submit(kind, data)
+    return {
+        "jobId": job.id,
+        "status": job.status,
+        "statusUrl": str(request.url_for("get_job", job_id=job.id)),
+        "eventsUrl": str(request.url_for("job_events", job_id=job.id)),
+    }
+
+
+@router.get("/{job_id}", name="get_job")
+async def get_job(job_id: str):
+    job = await job_queue.get(job_id)
+    if not job:
+        raise HTTPException(404, detail="Job not found")
+    return job_view(job)
+
+
+@router.get("/{job_id}/events", name="job_events")
+async def job_events(job_id: str, request: Request):
+    """Server-Sent Events stream of status changes, ending once the job finishes."""
+    job = await job_queue.get(job_id)
+    if not job:
+        raise HTTPException(404, detail="Job not found")
+    # Jobs may run in another worker process, so also re-read the row periodically
+    poll = float(os.getenv("JOB_POLL_INTERVAL", "1"))
+
+    async def events() -> AsyncIterator[str]:
+        current = job
+        last_status = None
+        while True:
+            if current.status != last_status:
+                last_status = current.status
+                yield sse_event(job_view(current), event=current.status)
+            if current.status in TERMINAL or await request.is_disconnected():
+                return
+            await job_queue.wait_for_change(job_id, poll)
+            current = await job_queue.get(job_id) or current
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@router.get("")
+async def job_stats():
+    """Per-kind queue depth, concurrency and outcome counters."""
+    return job_queue.stats()
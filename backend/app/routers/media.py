@@ -1,17 +1,34 @@
-import base64
+import asyncio
+import logging
 import os
-from typing import Any, Dict
-import io
+from typing import Any, AsyncIterator, Dict, Optional
+from urllib.parse import quote
 import json
-import re
 
 import httpx
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from fastapi.responses import StreamingResponse
+
+from ..admission import admission
+from ..artifacts import artifacts, data_urls_enabled, save_artifact, to_data_url
+from ..batch import batches
+from ..breakers import upstream_routes
+from ..cache import response_cache
+from ..json_stream import JSONObjectStream, extract_json
+from ..singleflight import single_flight
+from ..tts import tts
+from ..upstream import gemini_client, pool
+from .ai import gemini_chat_stream, gemini_generate, sse_event
+from .artifacts import artifact_url
+
+LAYOUT_MODES = ("radial", "tree", "none")
+CHILD_NODE_TYPES = ("ideaNode", "processNode", "decisionNode")
 
 router = APIRouter(prefix="/api/media", tags=["media"])
+logger = logging.getLogger(__name__)
 
 
-async def generate_content_for_audio(prompt: str) -> str:
+async def generate_content_for_audio(prompt: str, client: Optional[httpx.AsyncClient] = None) -> str:
     """Generate text content based on prompt using Gemini AI."""
     GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
     GEMINI_MODEL = os.getenv("GEMINI_MODEL", "gemini-2.5-flash")
@@ -22,20 +39,17 @@ async def generate_content_for_audio(prompt: str) -> str:
 
     try:
         # Try Gemini API to generate content
-        async with httpx.AsyncClient(timeout=30.0) as client:
-            url = f"https://generativelanguage.googleapis.com/v1beta/models/{GEMINI_MODEL}:generateContent?key={GEMINI_API_KEY}"
-
-            # Create a better prompt for content generation
-            # Extract if user wants poem, song, story etc.
-            content_type = "creative content"
-            if "poem" in prompt.lower():
-                content_type = "poem"
-            elif "song" in prompt.lower() or "lyrics" in prompt.lower():
-                content_type = "song lyrics"
-            elif "story" in prompt.lower():
-                content_type = "short story"
-
-            enhanced_prompt = f"""Generate ONLY the {content_type} based on this request: {prompt}
+        # Create a better prompt for content generation
+        # Extract if user wants poem, song, story etc.
+        content_type = "creative content"
+        if "poem" in prompt.lower():
+            content_type = "poem"
+        elif "song" in prompt.lower() or "lyrics" in prompt.lower():
+            content_type = "song lyrics"
+        elif "story" in prompt.lower():
+            content_type = "short story"
+
+        enhanced_prompt = f"""Generate ONLY the {content_type} based on this request: {prompt}
 
 Important instructions:
 - Output ONLY the {content_type} itself
@@ -45,30 +59,29 @@ Important instructions:
 - Keep it concise and suitable for audio narration (2-3 verses/paragraphs max)
 - Make it engaging and creative"""
 
-            payload = {
-                "contents": [{
-                    "parts": [{"text": enhanced_prompt}]
-                }]
-            }
-
-            response = await client.post(url, json=payload)
-
-            if response.status_code == 200:
-                data = response.json()
-                if "candidates" in data and len(data["candidates"]) > 0:
-                    content = data["candidates"][0]["content"]["parts"][0]["text"]
-                    return content.strip()
+        data = await gemini_generate(enhanced_prompt, client, GEMINI_MODEL, timeout=30.0)
+        if "candidates" in data and len(data["candidates"]) > 0:
+            content = data["candidates"][0]["content"]["parts"][0]["text"]
+            return content.strip()
 
         # If Gemini fails, return the original prompt
         return prompt
 
     except Exception as e:
-        print(f"Content generation failed: {e}")
+        logger.warning("Content generation failed: %s", e)
         return prompt
 
 
-async def local_generate_audio(prompt: str, generate_content: bool = True) -> tuple:
+async def local_generate_audio(prompt: str, generate_content: bool = True,
+                               client: Optional[httpx.AsyncClient] = None) -> tuple:
     """Generate audio from prompt. If generate_content=True, first generates content using AI."""
+    audio_bytes, text_content = await local_generate_audio_bytes(prompt, generate_content, client)
+    return to_data_url(audio_bytes, "audio/mpeg"), text_content
+
+
+async def local_generate_audio_bytes(prompt: str, generate_content: bool = True,
+                                     client: Optional[httpx.AsyncClient] = None) -> tuple:
+    """Like local_generate_audio, but returns (raw MP3 bytes, text)."""
 
     if not prompt or not str(prompt).strip():
         raise HTTPException(400, detail="Prompt is required")
@@ -76,20 +89,13 @@ async def local_generate_audio(prompt: str, generate_content: bool = True) -> tu
     try:
         # Step 1: Generate content if requested (like Suno)
         if generate_content:
-            text_content = await generate_content_for_audio(prompt)
+            text_content = await generate_content_for_audio(prompt, client)
         else:
             text_content = prompt
 
-        # Step 2: Convert generated content to speech using gTTS
+        # Step 2: Convert generated content to speech (chunked, parallel TTS pipeline)
         try:
-            from gtts import gTTS
-            gtts = gTTS(text=text_content, lang='en', slow=False)
-            speech_buffer = io.BytesIO()
-            gtts.write_to_fp(speech_buffer)
-            speech_buffer.seek(0)
-
-            b64 = base64.b64encode(speech_buffer.read()).decode("utf-8")
-            return f"data:audio/mpeg;base64,{b64}", text_content
+            return await tts.synthesize(text_content, lang="en"), text_content
         except ImportError:
             raise HTTPException(
                 500, detail="TTS not available. Install: pip install gtts")
@@ -100,8 +106,53 @@ async def local_generate_audio(prompt: str, generate_content: bool = True) -> tu
         raise HTTPException(502, detail=f"Audio generation failed: {str(e)}")
 
 
-@router.post("/audio")
-async def generate_audio(payload: Dict[str, Any]):
+async def create_audio(prompt: str, generate_content: bool, base_url: str,
+                       client: Optional[httpx.AsyncClient] = None,
+                       request: Optional[Request] = None) -> Dict[str, Any]:
+    """Response body for /api/media/audio (also used by the job queue)."""
+    model = os.getenv("GEMINI_MODEL", "gemini-2.5-flash")
+    if data_urls_enabled():
+        audio_url, generated_text = await response_cache.get_or_set(
+            "audio",
+            model,
+            prompt,
+            {"generate_content": bool(generate_content), "format": "data_url"},
+            request,
+            lambda: local_generate_audio(
+                prompt,
+                generate_content=generate_content,
+                client=client,
+            ),
+            # Without generated content the clip reads the prompt itself
+            similar=bool(generate_content),
+        )
+    else:
+        async def produce() -> tuple:
+            audio_bytes, text = await local_generate_audio_bytes(prompt, generate_content, client)
+            return await save_artifact(audio_bytes, "audio/mpeg"), text
+
+        name, generated_text = await response_cache.get_or_set(
+            "audio",
+            model,
+            prompt,
+            {"generate_content": bool(generate_content), "format": "artifact"},
+            request,
+            produce,
+            valid=lambda value: artifacts.exists(value[0]),
+            similar=bool(generate_content),
+        )
+        audio_url = artifact_url(base_url, name)
+
+    return {
+        "audio": audio_url,
+        "text": generated_text,
+        "prompt": prompt
+    }
+
+
+@router.post("/audio", dependencies=[Depends(admission.limit("audio"))])
+async def generate_audio(request: Request, payload: Dict[str, Any],
+                         client: httpx.AsyncClient = Depends(gemini_client)):
     """Generate audio/speech from text prompt. Can generate content first (like Suno)."""
     prompt = payload.get("text") or payload.get("prompt")
     generate_content = payload.get(
@@ -111,38 +162,85 @@ async def generate_audio(payload: Dict[str, Any]):
         raise HTTPException(
             400, detail="Invalid or missing 'text' or 'prompt'")
 
-    audio_url, generated_text = await local_generate_audio(
-        prompt,
-        generate_content=generate_content
-    )
+    return await create_audio(prompt, generate_content, str(request.base_url), client, request)
 
-    return {
-        "audio": audio_url,
-        "text": generated_text,
-        "prompt": prompt
-    }
 
+@router.post("/audio/batch")
+async def generate_audio_batch(request: Request, payload: Dict[str, Any],
+                               client: httpx.AsyncClient = Depends(gemini_client)):
+    """Generate many audio clips concurrently, streamed back as NDJSON as each one finishes.
 
-@router.post("/mindmap")
-async def generate_mindmap(payload: Dict[str, Any]):
-    """Generate a mind map structure from a topic using AI."""
-    topic = payload.get("topic") or payload.get("prompt")
+    `items` are prompts (or {"prompt" | "text", "generate_content"} objects);
+    `generate_content` (default true), `concurrency` and `timeout` (seconds per
+    item) apply to the whole batch. Each item is charged like one /audio call.
+    """
+    generate_default = payload.get("generate_content", True)
+    base_url = str(request.base_url)
 
-    if not isinstance(topic, str) or not topic.strip():
-        raise HTTPException(
-            400, detail="Invalid or missing 'topic' or 'prompt'")
+    async def run(item: Any) -> Dict[str, Any]:
+        options = item if isinstance(item, dict) else {"prompt": item}
+        prompt = options.get("text") or options.get("prompt")
+        if not isinstance(prompt, str) or not prompt.strip():
+            raise HTTPException(400, detail="Invalid or missing 'text' or 'prompt'")
+        await admission.pace(request, "audio")
+        return await create_audio(prompt, options.get("generate_content", generate_default), base_url, client, request)
 
-    GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
-    GEMINI_MODEL = os.getenv("GEMINI_MODEL", "gemini-2.5-flash")
+    return batches.stream(payload, run)
 
-    if not GEMINI_API_KEY:
-        raise HTTPException(500, detail="GEMINI_API_KEY not configured")
 
+async def stream_audio(prompt: str, generate_content: bool,
+                       client: Optional[httpx.AsyncClient] = None) -> StreamingResponse:
+    """Chunked audio/mpeg response that starts as soon as the first TTS chunk is ready."""
+    text_content = await generate_content_for_audio(prompt, client) if generate_content else prompt
+    chunks = tts.stream(text_content, lang="en")
+    # Synthesize the first chunk before answering so TTS errors keep a proper status
     try:
-        async with httpx.AsyncClient(timeout=60.0) as client:
-            url = f"https://generativelanguage.googleapis.com/v1beta/models/{GEMINI_MODEL}:generateContent?key={GEMINI_API_KEY}"
+        first = await chunks.__anext__()
+    except StopAsyncIteration:
+        raise HTTPException(400, detail="Nothing to synthesize")
+    except ImportError:
+        raise HTTPException(
+            500, detail="TTS not available. Install: pip install gtts")
+    except Exception as e:
+        raise HTTPException(502, detail=f"Audio generation failed: {str(e)}")
+
+    async def body() -> AsyncIterator[bytes]:
+        try:
+            yield first
+            async for part in chunks:
+                yield part
+        finally:
+            await chunks.aclose()
+
+    return StreamingResponse(
+        body(),
+        media_type="audio/mpeg",
+        headers={"X-Audio-Text": quote(text_content), "Cache-Control": "no-store"},
+    )
 
-            prompt = f"""Create a well-structured mind map for: "{topic}"
+
+@router.post("/audio/stream", dependencies=[Depends(admission.limit("audio"))])
+async def generate_audio_stream(payload: Dict[str, Any],
+                                client: httpx.AsyncClient = Depends(gemini_client)):
+    """Like /audio, but streams MP3 bytes back; the spoken text is in X-Audio-Text (URL-encoded)."""
+    prompt = payload.get("text") or payload.get("prompt")
+    if not isinstance(prompt, str) or not prompt.strip():
+        raise HTTPException(
+            400, detail="Invalid or missing 'text' or 'prompt'")
+    return await stream_audio(prompt, bool(payload.get("generate_content", True)), client)
+
+
+@router.get("/audio/stream", dependencies=[Depends(admission.limit("audio"))])
+async def generate_audio_stream_get(text: str = Query(..., min_length=1), generate_content: bool = True,
+                                    client: httpx.AsyncClient = Depends(gemini_client)):
+    """GET form of /audio/stream, usable directly as an <audio> src."""
+    if not text.strip():
+        raise HTTPException(400, detail="Invalid or missing 'text'")
+    return await stream_audio(text, generate_content, client)
+
+
+def mindmap_prompt(topic: str) -> str:
+    return f"""Create a well-structured mind map for: "{topic}"
 
 Generate ONLY a JSON object with this EXACT structure (no markdown, no explanation):
 
@@ -178,65 +276,394 @@ RULES:
 9. Position values don't matter (will be auto-arranged)
 10. Return ONLY the JSON object, no markdown code blocks, no extra text"""
 
-            payload_data = {
-                "contents": [{
-                    "parts": [{"text": prompt}]
-                }]
-            }
 
-            response = await client.post(url, json=payload_data)
+def clean_mindmap(mindmap: Any) -> Dict[str, Any]:
+    """Keep the nodes with an id and the edges between kept nodes, so a sloppy
+    model reply can neither break the layout nor be cached as is."""
+    if not isinstance(mindmap, dict) or not isinstance(mindmap.get("nodes"), list) \
+            or not isinstance(mindmap.get("edges"), list):
+        raise ValueError("Invalid mind map structure")
+    nodes, ids = [], set()
+    for node in mindmap["nodes"]:
+        if not isinstance(node, dict) or not isinstance(node.get("id"), (str, int)) or str(node["id"]) in ids:
+            continue
+        ids.add(str(node["id"]))
+        nodes.append({**node, "id": str(node["id"])})
+    if not nodes:
+        raise ValueError("Invalid mind map structure: no nodes")
+    edges = []
+    for edge in mindmap["edges"]:
+        if not isinstance(edge, dict):
+            continue
+        source, target = str(edge.get("source")), str(edge.get("target"))
+        if source in ids and target in ids:
+            edges.append({"id": f"e{source}-{target}", **edge, "source": source, "target": target})
+    dropped = len(mindmap["nodes"]) - len(nodes) + len(mindmap["edges"]) - len(edges)
+    if dropped:
+        logger.info("Dropped %d malformed mind map nodes/edges", dropped)
+    return {**mindmap, "nodes": nodes, "edges": edges}
+
+
+async def build_mindmap(topic: str, client: Optional[httpx.AsyncClient] = None) -> Dict[str, Any]:
+    """Ask Gemini for a mind map of `topic` and return the parsed nodes/edges."""
+    GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
+    GEMINI_MODEL = os.getenv("GEMINI_MODEL", "gemini-2.5-flash")
+
+    if not GEMINI_API_KEY:
+        raise HTTPException(500, detail="GEMINI_API_KEY not configured")
+
+    try:
+        prompt = mindmap_prompt(topic)
 
-            if response.status_code == 200:
-                data = response.json()
-                print(f"Gemini API Response: {data}")  # Debug log
+        # Route fallback and circuit breakers live in gemini_generate
+        data = await gemini_generate(prompt, client, GEMINI_MODEL)
+        logger.debug("Gemini API Response: %s", data)
 
-                if "candidates" in data and len(data["candidates"]) > 0:
-                    content = data["candidates"][0]["content"]["parts"][0]["text"]
-                    print(f"Generated content: {content}")  # Debug log
+        if "candidates" in data and len(data["candidates"]) > 0:
+            content = data["candidates"][0]["content"]["parts"][0]["text"]
+            logger.debug("Generated content: %s", content)
 
-                    # Extract JSON from response (may be wrapped in markdown code blocks)
-                    # Try to find JSON in code blocks first
-                    json_match = re.search(
-                        r'```(?:json)?\s*(\{.*?\})\s*```', content, re.DOTALL)
-                    if json_match:
-                        json_str = json_match.group(1)
-                    else:
-                        # Try to find raw JSON
-                        json_match = re.search(r'\{.*\}', content, re.DOTALL)
-                        if json_match:
-                            json_str = json_match.group(0)
-                        else:
-                            print(f"No JSON found in content: {content}")
-                            raise ValueError("No JSON found in response")
-
-                    mindmap_data = json.loads(json_str)
-                    print(f"Parsed mindmap data: {mindmap_data}")  # Debug log
-
-                    # Validate structure
-                    if "nodes" not in mindmap_data or "edges" not in mindmap_data:
-                        raise ValueError("Invalid mind map structure")
-
-                    return {
-                        "success": True,
-                        "mindmap": mindmap_data,
-                        "topic": topic
-                    }
-
-            print(
-                f"Failed response status: {response.status_code}, body: {response.text}")
-            raise HTTPException(
-                502, detail=f"Failed to generate mind map: {response.text}")
+            mindmap_data = json.loads(extract_json(content), strict=False)
+            logger.debug("Parsed mindmap data: %s", mindmap_data)
 
+            return clean_mindmap(mindmap_data)
+
+        logger.warning("No candidates in Gemini response: %s", data)
+        raise HTTPException(
+            502, detail="Failed to generate mind map: empty response")
+
+    except HTTPException as e:
+        logger.warning("Mind map generation failed: %s", e.detail)
+        raise
     except json.JSONDecodeError as e:
-        print(f"JSON decode error: {str(e)}")
+        logger.warning("JSON decode error: %s", e)
         raise HTTPException(
             500, detail=f"Invalid JSON response from AI: {str(e)}")
     except Exception as e:
-        print(f"Mind map generation error: {str(e)}")
+        logger.warning("Mind map generation error: %s", e)
         raise HTTPException(
             500, detail=f"Mind map generation failed: {str(e)}")
 
 
+def _layout(mindmap: Dict[str, Any], mode: str) -> Dict[str, Any]:
+    # NumPy is imported on first use (or by the startup warmup), not at import time
+    from ..mindmap_layout import layout_mindmap
+    try:
+        return layout_mindmap(mindmap, mode)
+    except Exception as e:
+        logger.warning("Mind map layout failed: %r", e)
+        raise HTTPException(502, detail=f"Mind map layout failed: {e!r}")
+
+
+def _place_children(mindmap: Dict[str, Any], parent_id: str, child_ids: list) -> Dict[str, Any]:
+    from ..mindmap_layout import place_children
+    try:
+        return place_children(mindmap, parent_id, child_ids)
+    except Exception as e:
+        logger.warning("Mind map layout failed: %r", e)
+        raise HTTPException(502, detail=f"Mind map layout failed: {e!r}")
+
+
+def layout_mode(value: Optional[str] = None) -> str:
+    mode = (value or os.getenv("MINDMAP_LAYOUT", "radial")).lower()
+    if mode not in LAYOUT_MODES:
+        raise HTTPException(400, detail=f"Invalid 'layout', expected one of {', '.join(LAYOUT_MODES)}")
+    return mode
+
+
+async def create_mindmap(topic: str, client: Optional[httpx.AsyncClient] = None,
+                         request: Optional[Request] = None, layout: Optional[str] = None) -> Dict[str, Any]:
+    """Response body for /api/media/mindmap (also used by the job queue)."""
+    mode = layout_mode(layout)
+    mindmap_data = await response_cache.get_or_set(
+        "mindmap",
+        os.getenv("GEMINI_MODEL", "gemini-2.5-flash"),
+        topic,
+        None,
+        request,
+        lambda: build_mindmap(topic, client),
+        similar=True,
+    )
+    # Layout runs after the cache so the stored graph serves every layout mode
+    mindmap_data = await asyncio.to_thread(_layout, mindmap_data, mode)
+
+    return {
+        "success": True,
+        "mindmap": mindmap_data,
+        "topic": topic
+    }
+
+
+@router.post("/mindmap", dependencies=[Depends(admission.limit("mindmap"))])
+async def generate_mindmap(request: Request, payload: Dict[str, Any],
+                           client: httpx.AsyncClient = Depends(gemini_client)):
+    """Generate a mind map structure from a topic using AI."""
+    topic = payload.get("topic") or payload.get("prompt")
+
+    if not isinstance(topic, str) or not topic.strip():
+        raise HTTPException(
+            400, detail="Invalid or missing 'topic' or 'prompt'")
+
+    return await create_mindmap(topic, client, request, payload.get("layout"))
+
+
+@router.post("/mindmap/batch")
+async def generate_mindmap_batch(request: Request, payload: Dict[str, Any],
+                                 client: httpx.AsyncClient = Depends(gemini_client)):
+    """Generate many mind maps concurrently, streamed back as NDJSON as each one finishes.
+
+    `items` are topics (or {"topic" | "prompt", "layout"} objects); `layout`,
+    `concurrency` and `timeout` (seconds per item) apply to the whole batch.
+    Each item is charged like one /mindmap call.
+    """
+    layout = layout_mode(payload.get("layout"))
+
+    async def run(item: Any) -> Dict[str, Any]:
+        options = item if isinstance(item, dict) else {"topic": item}
+        topic = options.get("topic") or options.get("prompt")
+        if not isinstance(topic, str) or not topic.strip():
+            raise HTTPException(400, detail="Invalid or missing 'topic' or 'prompt'")
+        await admission.pace(request, "mindmap")
+        return await create_mindmap(topic, client, request, options.get("layout") or layout)
+
+    return batches.stream(payload, run)
+
+
+async def mindmap_events(topic: str, mode: str, client: Optional[httpx.AsyncClient] = None,
+                         request: Optional[Request] = None) -> AsyncIterator[tuple]:
+    """Yield ("node", node) and ("edge", edge) as soon as each one has been parsed
+    from Gemini's streamed reply, then ("done", <create_mindmap body>).
+
+    An edge is held back until both of its nodes have been sent; edges that
+    still point at unknown nodes when the reply ends are dropped.
+    """
+    model = os.getenv("GEMINI_MODEL", "gemini-2.5-flash")
+    mindmap_data = await response_cache.lookup("mindmap", model, topic, None, request, similar=True)
+    if mindmap_data is not None:
+        for node in mindmap_data["nodes"]:
+            yield "node", node
+        for edge in mindmap_data["edges"]:
+            yield "edge", edge
+    else:
+        stream = JSONObjectStream(("nodes", "edges"))
+        sent, pending = set(), []
+        async for text in gemini_chat_stream(mindmap_prompt(topic), client, model):
+            for key, item in stream.feed(text):
+                if not isinstance(item, dict):
+                    continue
+                if key == "nodes" and "id" in item and item["id"] not in sent:
+                    sent.add(item["id"])
+                    yield "node", item
+                    ready = [e for e in pending if e["source"] in sent and e["target"] in sent]
+                    pending = [e for e in pending if e not in ready]
+                    for edge in ready:
+                        yield "edge", edge
+                elif key == "edges" and "source" in item and "target" in item:
+                    if item["source"] in sent and item["target"] in sent:
+                        yield "edge", item
+                    else:
+                        pending.append(item)
+            if stream.complete:
+                break
+        try:
+            mindmap_data = stream.value()
+        except ValueError as e:
+            logger.warning("Incomplete mind map stream for %r: %s", topic, e)
+            raise HTTPException(502, detail=f"Mind map stream ended early: {str(e)}")
+        logger.debug("Parsed mindmap data: %s", mindmap_data)
+        try:
+            mindmap_data = clean_mindmap(mindmap_data)
+        except ValueError as e:
+            raise HTTPException(500, detail=f"Mind map generation failed: {e}")
+        await response_cache.store("mindmap", model, topic, None, mindmap_data, similar=True)
+
+    mindmap_data = await asyncio.to_thread(_layout, mindmap_data, mode)
+    yield "done", {"success": True, "mindmap": mindmap_data, "topic": topic}
+
+
+@router.post("/mindmap/stream", dependencies=[Depends(admission.limit("mindmap"))])
+async def generate_mindmap_stream(request: Request, payload: Dict[str, Any],
+                                  client: httpx.AsyncClient = Depends(gemini_client)):
+    """Stream mind map nodes and edges as they are generated.
+
+    Server-Sent Events (`node`, `edge`, `done`, `error`) by default; NDJSON lines
+    of `{"type", "data"}` with `"format": "ndjson"` or `Accept: application/x-ndjson`.
+    """
+    topic = payload.get("topic") or payload.get("prompt")
+    if not isinstance(topic, str) or not topic.strip():
+        raise HTTPException(
+            400, detail="Invalid or missing 'topic' or 'prompt'")
+    mode = layout_mode(payload.get("layout"))
+    fmt = payload.get("format") or (
+        "ndjson" if "application/x-ndjson" in request.headers.get("accept", "") else "sse")
+    if fmt not in ("sse", "ndjson"):
+        raise HTTPException(400, detail="Invalid 'format', expected 'sse' or 'ndjson'")
+
+    def encode(kind: str, data: Any) -> str:
+        if fmt == "ndjson":
+            return json.dumps({"type": kind, "data": data}, ensure_ascii=False) + "\n"
+        return sse_event(data, event=kind)
+
+    events = mindmap_events(topic, mode, client, request)
+    # Wait for the first node so setup errors still surface as a normal HTTP error
+    try:
+        first = await events.__anext__()
+    except StopAsyncIteration:
+        first = None
+    except httpx.HTTPError as e:
+        raise HTTPException(502, detail=f"Upstream stream failed: {e}")
+
+    async def body() -> AsyncIterator[str]:
+        try:
+            if first is not None:
+                yield encode(*first)
+            async for kind, data in events:
+                if await request.is_disconnected():
+                    break
+                yield encode(kind, data)
+        except HTTPException as e:
+            yield encode("error", {"detail": e.detail})
+        except httpx.HTTPError as e:
+            yield encode("error", {"detail": f"Upstream stream failed: {e}"})
+        except Exception as e:
+            logger.exception("Mind map stream for %r failed", topic)
+            yield encode("error", {"detail": f"Mind map generation failed: {e}"})
+        finally:
+            await events.aclose()
+
+    return StreamingResponse(
+        body(),
+        media_type="application/x-ndjson" if fmt == "ndjson" else "text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+def _node_path(mindmap: Dict[str, Any], node_id: str) -> list:
+    """Labels from the root down to `node_id`, used as context for the model."""
+    labels = {n["id"]: (n.get("data") or {}).get("label", n["id"]) for n in mindmap["nodes"]}
+    parent = {e["target"]: e["source"] for e in mindmap.get("edges", [])}
+    path, seen = [], set()
+    while node_id is not None and node_id not in seen:
+        seen.add(node_id)
+        path.append(labels.get(node_id, node_id))
+        node_id = parent.get(node_id)
+    return path[::-1]
+
+
+async def build_children(path: list, existing: list, count: int,
+                         client: Optional[httpx.AsyncClient] = None) -> list:
+    """Ask Gemini only for the children of the last node in `path`."""
+    GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
+    GEMINI_MODEL = os.getenv("GEMINI_MODEL", "gemini-2.5-flash")
+
+    if not GEMINI_API_KEY:
+        raise HTTPException(500, detail="GEMINI_API_KEY not configured")
+
+    prompt = f"""In a mind map, expand the node "{path[-1]}" (path from the centre: {" > ".join(path)}).
+
+Generate ONLY a JSON object with this EXACT structure (no markdown, no explanation):
+
+{{"children": [{{"label": "Sub-concept", "description": "Detail", "type": "ideaNode"}}]}}
+
+RULES:
+1. Create exactly {count} children
+2. Do not repeat existing children: {", ".join(existing) or "none"}
+3. Use node types: ideaNode (most nodes), processNode (methods/steps), decisionNode (choices)
+4. Labels: 2-4 words max
+5. Descriptions: 5-10 words"""
+
+    try:
+        data = await gemini_generate(prompt, client, GEMINI_MODEL)
+        content = data["candidates"][0]["content"]["parts"][0]["text"]
+        children = json.loads(extract_json(content), strict=False).get("children")
+        if not isinstance(children, list):
+            raise ValueError("Invalid children structure")
+        return [c for c in children if isinstance(c, dict) and c.get("label")][:count]
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(500, detail=f"Mind map expansion failed: {str(e)}")
+
+
+def merge_children(mindmap: Dict[str, Any], node_id: str, children: list) -> tuple:
+    """Add `children` under `node_id`; returns (merged map, new nodes, new edges)."""
+    taken = {n["id"] for n in mindmap["nodes"]}
+    taken_edges = {e.get("id") for e in mindmap.get("edges", [])}
+    nodes, edges = [], []
+    k = 1
+    for child in children:
+        while f"{node_id}-{k}" in taken:
+            k += 1
+        child_id = f"{node_id}-{k}"
+        taken.add(child_id)
+        node_type = child.get("type") if child.get("type") in CHILD_NODE_TYPES else "ideaNode"
+        nodes.append({
+            "id": child_id,
+            "type": node_type,
+            "data": {"label": str(child["label"]), "description": str(child.get("description", ""))},
+            "position": {"x": 0, "y": 0},
+        })
+        edge_id = f"e{node_id}-{child_id}"
+        if edge_id in taken_edges:
+            edge_id = f"{edge_id}-{len(taken_edges)}"
+        taken_edges.add(edge_id)
+        edges.append({"id": edge_id, "source": node_id, "target": child_id})
+    merged = {**mindmap, "nodes": mindmap["nodes"] + nodes, "edges": mindmap.get("edges", []) + edges}
+    return merged, nodes, edges
+
+
+async def expand_mindmap_node(mindmap: Dict[str, Any], node_id: str, count: int = 4,
+                              client: Optional[httpx.AsyncClient] = None,
+                              request: Optional[Request] = None) -> Dict[str, Any]:
+    """Generate children for one node, merge them and lay out only that subtree."""
+    if not any(n.get("id") == node_id for n in mindmap["nodes"]):
+        raise HTTPException(404, detail=f"Node '{node_id}' not found in mind map")
+    if any("x" not in (n.get("position") or {}) for n in mindmap["nodes"]):
+        mindmap = await asyncio.to_thread(_layout, mindmap, layout_mode())
+
+    path = _node_path(mindmap, node_id)
+    existing = [(n.get("data") or {}).get("label", "") for n in mindmap["nodes"]
+                if any(e["source"] == node_id and e["target"] == n["id"] for e in mindmap.get("edges", []))]
+    children = await response_cache.get_or_set(
+        "mindmap",
+        os.getenv("GEMINI_MODEL", "gemini-2.5-flash"),
+        " > ".join(path),
+        {"expand": count, "existing": sorted(existing)},
+        request,
+        lambda: build_children(path, existing, count, client),
+    )
+    merged, nodes, edges = merge_children(mindmap, node_id, children)
+    merged = await asyncio.to_thread(_place_children, merged, node_id, [n["id"] for n in nodes])
+    positions = {n["id"]: n["position"] for n in merged["nodes"]}
+    return {
+        "success": True,
+        "mindmap": merged,
+        "nodeId": node_id,
+        "added": {"nodes": [{**n, "position": positions[n["id"]]} for n in nodes], "edges": edges},
+    }
+
+
+@router.post("/mindmap/expand", dependencies=[Depends(admission.limit("expand"))])
+async def expand_mindmap(request: Request, payload: Dict[str, Any],
+                         client: httpx.AsyncClient = Depends(gemini_client)):
+    """Add AI-generated children to one node of an existing mind map."""
+    mindmap = payload.get("mindmap")
+    node_id = payload.get("nodeId")
+    if not isinstance(mindmap, dict) or not isinstance(mindmap.get("nodes"), list) \
+            or not all(isinstance(n, dict) and "id" in n for n in mindmap["nodes"]):
+        raise HTTPException(400, detail="Invalid or missing 'mindmap'")
+    if not isinstance(mindmap.get("edges", []), list) \
+            or not all(isinstance(e, dict) and "source" in e and "target" in e for e in mindmap.get("edges", [])):
+        raise HTTPException(400, detail="Invalid 'mindmap.edges'")
+    if not isinstance(node_id, str) or not node_id:
+        raise HTTPException(400, detail="Invalid or missing 'nodeId'")
+    count = payload.get("count", 4)
+    if not isinstance(count, int) or not 1 <= count <= 10:
+        raise HTTPException(400, detail="'count' must be an integer between 1 and 10")
+
+    return await expand_mindmap_node(mindmap, node_id, count, client, request)
+
+
 @router.get("/health")
 async def media_health():
     """Check media generation service health."""
@@ -247,5 +674,10 @@ async def media_health():
             "available": True,
             "geminiKeyPresent": bool(GEMINI_API_KEY),
             "note": "Uses gTTS (Google Text-to-Speech) for audio, Gemini for content generation"
-        }
+        },
+        "tts": tts.stats(),
+        "upstream": pool.stats("gemini"),
+        "routes": upstream_routes.stats("gemini"),
+        "cache": response_cache.stats(),
+        "singleFlight": single_flight.stats(),
     }
@@ -0,0 +1,40 @@
+from fastapi import APIRouter
+from fastapi.responses import PlainTextResponse
+
+from ..admission import admission
+from ..jobs import job_queue
+from ..metrics import Counter, Gauge, registry
+from ..upstream import pool
+
+router = APIRouter(tags=["metrics"])
+
+upstream_in_flight = registry.register(Gauge(
+    "upstream_pool_in_flight", "Requests in flight on the pooled upstream client."))
+upstream_connections = registry.register(Counter(
+    "upstream_pool_connections_opened_total", "TCP connections opened by the pooled upstream client."))
+job_queue_depth = registry.register(Gauge(
+    "job_queue_depth", "Jobs waiting to run, by kind."))
+admission_active = registry.register(Gauge(
+    "admission_upstream_active", "Upstream calls holding an admission slot."))
+admission_waiting = registry.register(Gauge(
+    "admission_upstream_waiting", "Requests queued for an upstream admission slot."))
+
+
+def _collect() -> None:
+    for name, entry in pool.stats().items():
+        upstream_in_flight.set(entry["inFlight"], upstream=name)
+        upstream_connections.set_total(entry["newConnections"], upstream=name)
+    for kind, entry in job_queue.stats().items():
+        job_queue_depth.set(entry["queued"], kind=kind)
+    for name, gate in admission.gates.items():
+        admission_active.set(gate.active, upstream=name)
+        admission_waiting.set(gate.waiting, upstream=name)
+
+
+registry.add_collector(_collect)
+
+
+@router.get("/metrics", include_in_schema=False)
+async def metrics():
+    """Prometheus text exposition of this worker's metrics."""
+    return PlainTextResponse(registry.render(), media_type="text/plain; version=0.0.4")
@@ -1,30 +1,158 @@
-from fastapi import APIRouter, Depends, HTTPException
+import asyncio
+import os
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response, WebSocket, WebSocketDisconnect
+from pydantic import TypeAdapter
+from sqlalchemy import delete, insert, update
 from sqlmodel import select
-from typing import List
+from typing import List, Optional
 from ..db import get_session
-from ..models import Task, TaskCreate, TaskUpdate
+from ..models import Task, TaskBatch, TaskBatchResult, TaskCreate, TaskUpdate
+from ..task_cache import task_lists
+from ..task_sync import task_sync
 
 router = APIRouter(prefix="/api/tasks", tags=["tasks"])
 
+_task_list = TypeAdapter(List[Task])
+
+
+def _delta(task: Task) -> dict:
+    """Compact task state for sync deltas (the channel already names the user)."""
+    return {"id": task.id, "title": task.title, "completed": task.completed}
+
 
 @router.get("/{user_id}", response_model=List[Task])
-def get_tasks(user_id: str, session=Depends(get_session)):
-    tasks = session.exec(select(Task).where(Task.user_id == user_id)).all()
-    return tasks
+async def get_tasks(user_id: str, request: Request,
+                    limit: Optional[int] = Query(None, ge=1, le=1000),
+                    after: Optional[int] = Query(None, description="Return tasks with id greater than this cursor"),
+                    completed: Optional[bool] = None,
+                    session=Depends(get_session)):
+    """List a user's tasks in id order.
+
+    Without `limit` the whole list is returned. With `limit`, a full page sets
+    X-Next-Cursor; pass it back as `after` to get the next page. Responses carry
+    an ETag of the user's list version; If-None-Match is answered with 304.
+    """
+    headers = {}
+    full_list = limit is None and after is None and completed is None
+    if task_lists.enabled:
+        etag = task_lists.etag(user_id)
+        headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+        if etag in [t.strip() for t in request.headers.get("if-none-match", "").split(",")]:
+            task_lists.counters["notModified"] += 1
+            return Response(status_code=304, headers=headers)
+        if full_list:
+            body = task_lists.get(user_id)
+            if body is not None:
+                return Response(body, media_type="application/json", headers=headers)
+    version = task_lists.version(user_id)
+
+    query = select(Task).where(Task.user_id == user_id)
+    if completed is not None:
+        query = query.where(Task.completed == completed)
+    if after is not None:
+        query = query.where(Task.id > after)
+    query = query.order_by(Task.id)
+    if limit is not None:
+        query = query.limit(limit)
+    tasks = (await session.exec(query)).all()
+    if limit is not None and len(tasks) == limit:
+        headers["X-Next-Cursor"] = str(tasks[-1].id)
+    body = _task_list.dump_json(tasks)
+    if task_lists.enabled and full_list:
+        task_lists.set(user_id, version, body)
+    return Response(body, media_type="application/json", headers=headers)
+
+
+@router.post("/batch", response_model=TaskBatchResult)
+async def batch_tasks(payload: TaskBatch, session=Depends(get_session)):
+    """Create, update and delete many tasks in one transaction.
+
+    Any unknown id in `update` or `delete` rejects the whole batch with a 404.
+    """
+    max_items = int(os.getenv("TASK_BATCH_MAX", "1000"))
+    if len(payload.create) + len(payload.update) + len(payload.delete) > max_items:
+        raise HTTPException(413, detail=f"Batch larger than {max_items} items")
+
+    update_ids = [u.id for u in payload.update]
+    owners = {}
+    if update_ids or payload.delete:
+        owners = dict((await session.exec(
+            select(Task.id, Task.user_id).where(Task.id.in_(update_ids + payload.delete)))).all())
+        missing = sorted({i for i in update_ids + payload.delete if i not in owners})
+        if missing:
+            raise HTTPException(404, detail=f"Tasks not found: {missing}")
+
+    created: List[Task] = []
+    if payload.create:
+        # One executemany-style INSERT ... RETURNING for all new rows
+        rows = [{"title": t.title, "completed": False, "user_id": t.user_id or None}
+                for t in payload.create]
+        created = list((await session.scalars(insert(Task).returning(Task), rows)).all())
+
+    if payload.update:
+        rows = [u.model_dump(exclude_unset=True, exclude_none=True) for u in payload.update]
+        # ORM bulk UPDATE by primary key
+        await session.execute(update(Task), rows)
+
+    deleted = 0
+    if payload.delete:
+        deleted = (await session.execute(delete(Task).where(Task.id.in_(payload.delete)))).rowcount
+
+    await session.commit()
+    task_lists.bump([t.user_id for t in created] + list(owners.values()))
+    updated: List[Task] = []
+    if update_ids:
+        updated = (await session.exec(
+            select(Task).where(Task.id.in_(update_ids)).order_by(Task.id)
+            .execution_options(populate_existing=True))).all()
+    for task in created:
+        await task_sync.publish(task.user_id, "add", task=_delta(task))
+    for task in updated:
+        await task_sync.publish(task.user_id, "update", task=_delta(task))
+    for task_id in dict.fromkeys(payload.delete):
+        await task_sync.publish(owners[task_id], "delete", id=task_id)
+    return TaskBatchResult(created=created, updated=updated, deleted=deleted)
+
+
+@router.post("/{user_id}/complete-all")
+async def complete_all(user_id: str, session=Depends(get_session)):
+    """Mark every open task of the user as done."""
+    result = await session.execute(
+        update(Task).where(Task.user_id == user_id, Task.completed == False)  # noqa: E712
+        .values(completed=True))
+    await session.commit()
+    task_lists.bump([user_id])
+    if result.rowcount:
+        await task_sync.publish(user_id, "completeAll")
+    return {"success": True, "updated": result.rowcount}
+
+
+@router.delete("/{user_id}/completed")
+async def delete_completed(user_id: str, session=Depends(get_session)):
+    """Delete every completed task of the user."""
+    result = await session.execute(
+        delete(Task).where(Task.user_id == user_id, Task.completed == True))  # noqa: E712
+    await session.commit()
+    task_lists.bump([user_id])
+    if result.rowcount:
+        await task_sync.publish(user_id, "deleteCompleted")
+    return {"success": True, "deleted": result.rowcount}
 
 
 @router.post("", response_model=Task)
-def add_task(payload: TaskCreate, session=Depends(get_session)):
+async def add_task(payload: TaskCreate, session=Depends(get_session)):
     task = Task(title=payload.title, user_id=payload.user_id or None)
     session.add(task)
-    session.commit()
-    session.refresh(task)
+    await session.commit()
+    await session.refresh(task)
+    task_lists.bump([task.user_id])
+    await task_sync.publish(task.user_id, "add", task=_delta(task))
     return task
 
 
 @router.put("/{task_id}", response_model=Task)
-def toggle_task(task_id: int, payload: TaskUpdate, session=Depends(get_session)):
-    task = session.get(Task, task_id)
+async def toggle_task(task_id: int, payload: TaskUpdate, session=Depends(get_session)):
+    task = await session.get(Task, task_id)
     if not task:
         raise HTTPException(404, detail="Task not found")
     if payload.title is not None:
@@ -34,16 +162,81 @@ def toggle_task(task_id: int, payload: TaskUpdate, session=Depends(get_session))
     else:
         task.completed = not task.completed
     session.add(task)
-    session.commit()
-    session.refresh(task)
+    await session.commit()
+    await session.refresh(task)
+    task_lists.bump([task.user_id])
+    await task_sync.publish(task.user_id, "update", task=_delta(task))
     return task
 
 
 @router.delete("/{task_id}")
-def delete_task(task_id: int, session=Depends(get_session)):
-    task = session.get(Task, task_id)
+async def delete_task(task_id: int, session=Depends(get_session)):
+    task = await session.get(Task, task_id)
     if not task:
         raise HTTPException(404, detail="Task not found")
-    session.delete(task)
-    session.commit()
+    await session.delete(task)
+    await session.commit()
+    task_lists.bump([task.user_id])
+    await task_sync.publish(task.user_id, "delete", id=task_id)
     return {"success": True}
+
+
+@router.websocket("/{user_id}/ws")
+async def task_updates(websocket: WebSocket, user_id: str,
+                       since: Optional[int] = None, epoch: Optional[str] = None):
+    """Push the user's task changes as they are committed.
+
+    The first message is {"op": "hello", "epoch", "seq"}. Every change follows as
+    {"seq", "op": "add" | "update" | "delete" | "completeAll" | "deleteCompleted", ...}.
+    To resume after a reconnect pass the last `seq` seen as `since` (with the
+    `epoch` from hello): the missed changes are replayed first. When they are no
+    longer kept, or the client falls behind, {"op": "resync"} is sent and the
+    client should reload the list with GET /api/tasks/{user_id}.
+    """
+    if not task_sync.enabled:
+        await websocket.close(code=1013)
+        return
+    await websocket.accept()
+    broker = task_sync.broker
+    # Subscribe before replaying so nothing committed in between is lost
+    sub = broker.subscribe(user_id)
+    receiver = asyncio.create_task(_drain(websocket))
+    try:
+        last = await broker.current(user_id)
+        await websocket.send_json({"op": "hello", "epoch": broker.epoch, "seq": last})
+        if since is not None:
+            missed = await broker.replay(user_id, since) if epoch in (None, broker.epoch) else None
+            if missed is None:
+                await websocket.send_json({"op": "resync", "seq": last})
+            else:
+                for message in missed:
+                    await websocket.send_json(message)
+                    last = max(last, message["seq"])
+        while not receiver.done():
+            getter = asyncio.ensure_future(sub.queue.get())
+            await asyncio.wait({getter, receiver}, return_when=asyncio.FIRST_COMPLETED)
+            if not getter.done():
+                getter.cancel()
+                break
+            message = getter.result()
+            if message["seq"] > last or message["op"] == "resync":
+                await websocket.send_json(message)
+                last = max(last, message["seq"])
+            if sub.overflowed:
+                break
+    except WebSocketDisconnect:
+        pass
+    finally:
+        broker.unsubscribe(sub)
+        receiver.cancel()
+    if sub.overflowed:
+        await websocket.close(code=1013)
+
+
+async def _drain(websocket: WebSocket) -> None:
+    """Read (and ignore) client messages, e.g. keepalive pings, until it disconnects."""
+    try:
+        while True:
+            await websocket.receive_text()
+    except (WebSocketDisconnect, RuntimeError):
+        pass
@@ -0,0 +1,266 @@
+import logging
+import os
+import re
+import threading
+import time
+import zlib
+from typing import Any, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Per-route minimum cosine similarity, override with SIMILAR_<ROUTE>_THRESHOLD;
+# other routes use SIMILAR_THRESHOLD. Art and audio are stricter: one changed
+# word ("man"/"woman", "sunset"/"sunrise") is a different picture or song.
+ROUTE_THRESHOLDS: Dict[str, float] = {
+    "art": 0.97,
+    "audio": 0.97,
+}
+
+# Words that do not change what is generated ("mind map on X", "an image of X")
+STOP_WORDS = frozenset(
+    "a an the of on about for to in and with me my please generate create make draw "
+    "show give image picture photo illustration audio".split()
+)
+# Words that flip a prompt's meaning; weighted up so "not X" never matches "X"
+NEGATIONS = frozenset(
+    "no not never without nor cannot don doesn didn isn aren wasn weren won wouldn shouldn couldn".split()
+)
+# Bumped when `embed` changes; index files of another version are discarded
+EMBED_VERSION = 2
+_MIND_MAP = re.compile(r"\bmind\s*-?\s*maps?\b|\bmindmaps?\b")
+_WORD = re.compile(r"[^\W_]+")
+
+
+def prompt_terms(prompt: str) -> List[str]:
+    """Lower-cased words of a prompt without punctuation and filler words."""
+    words = _WORD.findall(_MIND_MAP.sub(" ", prompt.casefold()))
+    return [w for w in words if w not in STOP_WORDS] or words
+
+
+def embed(prompt: str, dim: int):
+    """Unit-length hashed embedding, stable across processes: each feature adds
+    +-weight to one of `dim` buckets picked by CRC32.
+
+    Features are the words (negations weighted x2), character trigrams of the
+    padded words at low weight (for plurals and typos), ordered word bigrams
+    and the sequence of numbers, so "dog chasing cat" differs from "cat chasing
+    dog" and "python 2 vs 3" from "python 3 vs 2".
+    """
+    import numpy as np
+
+    terms = prompt_terms(prompt)
+    features: List[Tuple[str, float]] = []
+    for word in terms:
+        features.append(("w:" + word, 2.0 if word in NEGATIONS else 1.0))
+        padded = f"<{word}>"
+        features.extend((padded[i:i + 3], 0.3) for i in range(len(padded) - 2))
+    features.extend((f"b:{a} {b}", 1.0) for a, b in zip(terms, terms[1:]))
+    numbers = [word for word in terms if word.isdigit()]
+    if len(numbers) > 1:
+        features.append(("n:" + " ".join(numbers), 2.0))
+    vec = np.zeros(dim, dtype=np.float32)
+    if not features:
+        return vec
+    hashes = np.fromiter((zlib.crc32(f.encode("utf-8")) for f, _ in features), dtype=np.uint32, count=len(features))
+    weights = np.fromiter((w for _, w in features), dtype=np.float32, count=len(features))
+    np.add.at(vec, hashes % dim, np.where(hashes >> 31, -weights, weights))
+    norm = np.linalg.norm(vec)
+    return vec / norm if norm else vec
+
+
+class SimilarityIndex:
+    """Near-duplicate prompt index for the response cache.
+
+    Each entry maps a prompt embedding to the cache key its result is stored
+    under, within a namespace (route, model and call parameters). Vectors live
+    in one preallocated float32 matrix of SIMILAR_MAX_ENTRIES rows, searched
+    with a single matrix-vector product; when full, the least recently used
+    entry is replaced. The index is saved to SIMILAR_INDEX_PATH every
+    SIMILAR_SAVE_INTERVAL seconds after a change and on shutdown (per process;
+    with several workers the last one to save wins).
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._loaded = False
+        self.dim = int(os.getenv("SIMILAR_DIM", "256"))
+        self.capacity = int(os.getenv("SIMILAR_MAX_ENTRIES", "20000"))
+        self.path = os.getenv("SIMILAR_INDEX_PATH", "similar_index.npz")
+        self.size = 0
+        self.vectors = self.namespaces = self.used = None
+        self.keys: List[Optional[str]] = []
+        self._rows: Dict[str, int] = {}
+        self._namespace_ids: Dict[str, int] = {}
+        self._dirty = False
+        self._saved = time.monotonic()
+        self.counters = {"adds": 0, "evictions": 0, "lookups": 0, "candidates": 0, "saves": 0}
+
+    @property
+    def enabled(self) -> bool:
+        return os.getenv("SIMILAR_ENABLED", "true").lower() != "false"
+
+    @staticmethod
+    def threshold(route: Optional[str] = None) -> float:
+        default = float(os.getenv("SIMILAR_THRESHOLD", "0.93"))
+        if route is None:
+            return default
+        return float(os.getenv(f"SIMILAR_{route.upper()}_THRESHOLD", ROUTE_THRESHOLDS.get(route, default)))
+
+    def _allocate(self) -> None:
+        import numpy as np
+
+        self.vectors = np.zeros((self.capacity, self.dim), dtype=np.float32)
+        self.namespaces = np.full(self.capacity, -1, dtype=np.int32)
+        self.used = np.zeros(self.capacity, dtype=np.float64)
+        self.keys = [None] * self.capacity
+
+    def _ensure(self) -> None:
+        if self._loaded:
+            return
+        self._allocate()
+        if self.path and os.path.exists(self.path):
+            try:
+                self._load()
+            except Exception as e:
+                logger.warning("Ignoring unreadable similarity index %s: %s", self.path, e)
+                self._allocate()
+                self.size = 0
+                self._rows.clear()
+                self._namespace_ids.clear()
+        self._loaded = True
+
+    def _load(self) -> None:
+        import numpy as np
+
+        with np.load(self.path, allow_pickle=False) as data:
+            version = int(data["version"]) if "version" in data.files else 1
+            if version != EMBED_VERSION:
+                logger.info("Similarity index %s uses embedding version %d, not %d; starting empty",
+                            self.path, version, EMBED_VERSION)
+                return
+            vectors = data["vectors"]
+            if vectors.shape[1] != self.dim:
+                logger.info("Similarity index %s has dim %d, not %d; starting empty",
+                            self.path, vectors.shape[1], self.dim)
+                return
+            # Keep the most recently used rows when the file holds more than fit
+            order = np.argsort(-data["used"])[:self.capacity]
+            names = [str(n) for n in data["namespace_names"]]
+            keys = data["keys"]
+            self.size = len(order)
+            self.vectors[:self.size] = vectors[order]
+            self.used[:self.size] = data["used"][order]
+            self.namespaces[:self.size] = data["namespaces"][order]
+            self._namespace_ids = {name: i for i, name in enumerate(names)}
+            for row, src in enumerate(order):
+                self.keys[row] = str(keys[src])
+                self._rows[self.keys[row]] = row
+
+    def _namespace_id(self, namespace: str) -> int:
+        if namespace not in self._namespace_ids:
+            self._namespace_ids[namespace] = len(self._namespace_ids)
+        return self._namespace_ids[namespace]
+
+    def search(self, namespace: str, prompt: str, threshold: Optional[float] = None,
+               top_k: Optional[int] = None) -> List[Tuple[str, float]]:
+        """Cache keys of the most similar stored prompts in `namespace` at or above
+        `threshold` (default SIMILAR_THRESHOLD), best first. Blocking (NumPy);
+        callers use a thread."""
+        import numpy as np
+
+        query = embed(prompt, self.dim)
+        top_k = top_k or int(os.getenv("SIMILAR_TOP_K", "3"))
+        threshold = self.threshold() if threshold is None else threshold
+        with self._lock:
+            self._ensure()
+            self.counters["lookups"] += 1
+            ns = self._namespace_ids.get(namespace)
+            if ns is None or not self.size:
+                return []
+            scores = self.vectors[:self.size] @ query
+            scores[self.namespaces[:self.size] != ns] = -1.0
+            k = min(top_k, self.size)
+            best = np.argpartition(-scores, k - 1)[:k]
+            best = best[np.argsort(-scores[best])]
+            found = [(self.keys[row], float(scores[row])) for row in best if scores[row] >= threshold]
+        self.counters["candidates"] += len(found)
+        return found
+
+    def add(self, namespace: str, prompt: str, key: str) -> None:
+        import numpy as np
+
+        vec = embed(prompt, self.dim)
+        with self._lock:
+            self._ensure()
+            row = self._rows.get(key)
+            if row is None:
+                if self.size < self.capacity:
+                    row = self.size
+                    self.size += 1
+                else:
+                    row = int(np.argmin(self.used[:self.size]))
+                    if self._rows.get(self.keys[row]) == row:
+                        del self._rows[self.keys[row]]
+                        self.counters["evictions"] += 1
+                self.keys[row] = key
+                self._rows[key] = row
+            self.vectors[row] = vec
+            self.namespaces[row] = self._namespace_id(namespace)
+            self.used[row] = time.time()
+            self._dirty = True
+            self.counters["adds"] += 1
+
+    def touch(self, key: str) -> None:
+        with self._lock:
+            row = self._rows.get(key)
+            if row is not None:
+                self.used[row] = time.time()
+
+    def forget(self, key: str) -> None:
+        """Drop an entry whose cached result is gone (the row is reused first)."""
+        with self._lock:
+            row = self._rows.pop(key, None)
+            if row is not None:
+                self.namespaces[row] = -1
+                self.used[row] = 0.0
+                self._dirty = True
+
+    def save_due(self) -> bool:
+        return self._dirty and time.monotonic() - self._saved >= float(os.getenv("SIMILAR_SAVE_INTERVAL", "30"))
+
+    def save(self) -> None:
+        """Write the index atomically (blocking)."""
+        if not self._dirty or not self.path:
+            return
+        import numpy as np
+
+        with self._lock:
+            live = [row for row in range(self.size) if self._rows.get(self.keys[row]) == row]
+            arrays = {
+                "vectors": self.vectors[live].copy(),
+                "namespaces": self.namespaces[live].copy(),
+                "used": self.used[live].copy(),
+                "keys": np.array([self.keys[row] for row in live], dtype=str),
+                "namespace_names": np.array(list(self._namespace_ids), dtype=str),
+                "version": np.array(EMBED_VERSION),
+            }
+            self._dirty = False
+            self._saved = time.monotonic()
+        tmp = f"{self.path}.tmp.npz"
+        np.savez(tmp, **arrays)
+        os.replace(tmp, self.path)
+        self.counters["saves"] += 1
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            **self.counters,
+            "enabled": self.enabled,
+            "entries": len(self._rows),
+            "maxEntries": self.capacity,
+            "dim": self.dim,
+            "thresholds": {route: self.threshold(route) for route in ("mindmap", "art", "audio")},
+            "memoryBytes": self.capacity * (self.dim * 4 + 12) if self._loaded else 0,
+        }
+
+
+similar_index = SimilarityIndex()
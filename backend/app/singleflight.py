@@ -0,0 +1,83 @@
+import asyncio
+import os
+from typing import Any, Awaitable, Callable, Dict
+
+
+class _Flight:
+    __slots__ = ("task", "waiters")
+
+    def __init__(self, task: asyncio.Future):
+        self.task = task
+        self.waiters = 0
+
+
+class SingleFlight:
+    """Coalesces identical concurrent calls into one upstream request.
+
+    The first caller for a key starts the work as a task; concurrent callers
+    with the same key await that task instead of starting their own. Each
+    caller waits through a shield, so one caller going away (client
+    disconnect, timeout) does not cancel the others; the upstream call is
+    only cancelled once every waiter has gone.
+    """
+
+    def __init__(self):
+        self._flights: Dict[str, _Flight] = {}
+        self.counters: Dict[str, Dict[str, int]] = {}
+
+    @property
+    def enabled(self) -> bool:
+        return os.getenv("COALESCE_ENABLED", "true").lower() != "false"
+
+    def _count(self, route: str, name: str) -> None:
+        counters = self.counters.setdefault(route, {"calls": 0, "saved": 0, "cancelled": 0})
+        counters[name] += 1
+
+    async def do(self, route: str, key: str, produce: Callable[[], Awaitable[Any]]) -> Any:
+        if not self.enabled:
+            return await produce()
+        flight = self._flights.get(key)
+        if flight is None:
+            flight = _Flight(asyncio.ensure_future(produce()))
+            self._flights[key] = flight
+            self._count(route, "calls")
+
+            def done(task: asyncio.Future, key: str = key, flight: _Flight = flight) -> None:
+                if self._flights.get(key) is flight:
+                    del self._flights[key]
+                if not task.cancelled():
+                    task.exception()  # retrieved here in case every waiter left
+
+            flight.task.add_done_callback(done)
+        else:
+            self._count(route, "saved")
+        flight.waiters += 1
+        try:
+            return await asyncio.shield(flight.task)
+        except asyncio.CancelledError:
+            if flight.waiters == 1 and not flight.task.done():
+                # Last waiter gone: stop the upstream call and let new callers start afresh
+                if self._flights.get(key) is flight:
+                    del self._flights[key]
+                flight.task.cancel()
+                self._count(route, "cancelled")
+            raise
+        finally:
+            flight.waiters -= 1
+
+    def stats(self) -> Dict[str, Any]:
+        """`calls` reached the upstream; `saved` joined one already in flight."""
+        return {
+            "enabled": self.enabled,
+            "inflight": len(self._flights),
+            "routes": {
+                name: {
+                    **c,
+                    "savedRatio": round(c["saved"] / (c["calls"] + c["saved"]), 3),
+                }
+                for name, c in self.counters.items()
+            },
+        }
+
+
+single_flight = SingleFlight()
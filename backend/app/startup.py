@@ -0,0 +1,204 @@
+"""Cold-start profiling and background warmup.
+
+With STARTUP_PROFILE=true (set in the process environment, .env is read too
+late) every module imported while the app starts is timed, as are the
+lifespan steps, and the slowest ones are logged once the app is ready.
+
+    cd backend
+    python -m app.startup --budget-ms 1500
+
+starts the app in a fresh process the same way and prints the report,
+exiting non-zero when time-to-ready exceeds the budget.
+"""
+import importlib
+import logging
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# Optional heavy modules ("module" or "module:attribute" for lazily loaded
+# attributes) imported off the event loop after startup, with the condition
+# under which they will be needed
+WARMUP_MODULES = {
+    "app.mindmap_layout": lambda: True,
+    "huggingface_hub:InferenceClient": lambda: bool(os.getenv("HF_API_KEY")) and not os.getenv("HF_BASE_URL"),
+    "PIL.Image": lambda: bool(os.getenv("HF_API_KEY")) and not os.getenv("HF_BASE_URL"),
+    "gtts": lambda: os.getenv("TTS_ENGINE", "gtts").lower() == "gtts",
+}
+
+
+class _TimedLoader:
+    """Wraps a module loader to time exec_module; everything else is delegated."""
+
+    def __init__(self, loader, profile: "StartupProfile"):
+        self._loader = loader
+        self._profile = profile
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self._loader, name)
+
+    def create_module(self, spec):
+        return self._loader.create_module(spec)
+
+    def exec_module(self, module) -> None:
+        self._profile._enter()
+        try:
+            self._loader.exec_module(module)
+        finally:
+            self._profile._leave(module.__name__)
+
+
+class _TimedFinder:
+    def __init__(self, profile: "StartupProfile"):
+        self._profile = profile
+
+    def find_spec(self, name, path=None, target=None):
+        for finder in sys.meta_path:
+            if finder is self or not hasattr(finder, "find_spec"):
+                continue
+            spec = finder.find_spec(name, path, target)
+            if spec is not None:
+                if spec.loader is not None and hasattr(spec.loader, "exec_module"):
+                    spec.loader = _TimedLoader(spec.loader, self._profile)
+                return spec
+        return None
+
+
+class StartupProfile:
+    """Import times (cumulative and self) per module plus named startup steps."""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.imports: Dict[str, Dict[str, float]] = {}
+        self.steps: Dict[str, float] = {}
+        self.ready: Optional[float] = None
+        self._finder: Optional[_TimedFinder] = None
+        # Per thread: [start, time spent in nested imports] for each import in progress
+        self._local = threading.local()
+
+    @property
+    def enabled(self) -> bool:
+        return os.getenv("STARTUP_PROFILE", "false").lower() == "true"
+
+    def start_imports(self) -> None:
+        if self.enabled and self._finder is None:
+            self._finder = _TimedFinder(self)
+            sys.meta_path.insert(0, self._finder)
+
+    def stop_imports(self) -> None:
+        if self._finder is not None and self._finder in sys.meta_path:
+            sys.meta_path.remove(self._finder)
+        self._finder = None
+
+    def _enter(self) -> None:
+        stack = self._local.__dict__.setdefault("stack", [])
+        stack.append([time.perf_counter(), 0.0])
+
+    def _leave(self, name: str) -> None:
+        stack = self._local.stack
+        start, nested = stack.pop()
+        total = time.perf_counter() - start
+        if stack:
+            stack[-1][1] += total
+        self.imports[name] = {"cumulative": total, "self": total - nested}
+
+    @contextmanager
+    def step(self, name: str) -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.steps[name] = time.perf_counter() - start
+
+    def mark_ready(self) -> None:
+        self.ready = time.perf_counter() - self.started
+        self.stop_imports()
+        if self.enabled:
+            for line in self.format().splitlines():
+                logger.info(line)
+
+    def report(self, top: Optional[int] = None) -> Dict[str, Any]:
+        top = top or int(os.getenv("STARTUP_PROFILE_TOP", "25"))
+        slowest = sorted(self.imports.items(), key=lambda kv: kv[1]["self"], reverse=True)[:top]
+        return {
+            "readySeconds": round(self.ready, 4) if self.ready is not None else None,
+            "profiled": self.enabled,
+            "modules": len(self.imports),
+            "steps": {k: round(v, 4) for k, v in self.steps.items()},
+            "slowestImports": [
+                {"module": name, "selfMs": round(t["self"] * 1000, 1), "cumulativeMs": round(t["cumulative"] * 1000, 1)}
+                for name, t in slowest
+            ],
+        }
+
+    def format(self) -> str:
+        report = self.report()
+        lines = [f"startup: ready in {report['readySeconds'] * 1000:.0f} ms, {report['modules']} modules imported"]
+        lines += [f"  step {name:<24}{seconds * 1000:8.1f} ms" for name, seconds in report["steps"].items()]
+        lines += [f"  import {i['module']:<40}{i['selfMs']:8.1f} ms self {i['cumulativeMs']:8.1f} ms total"
+                  for i in report["slowestImports"]]
+        return "\n".join(lines)
+
+
+startup_profile = StartupProfile()
+
+
+def warmup() -> List[str]:
+    """Import the optional heavy modules that this configuration will use (blocking;
+    the lifespan runs it in a thread once the server is accepting requests)."""
+    loaded = []
+    for name, needed in WARMUP_MODULES.items():
+        module, _, attribute = name.partition(":")
+        if (module in sys.modules and not attribute) or not needed():
+            continue
+        start = time.perf_counter()
+        try:
+            loaded_module = importlib.import_module(module)
+            if attribute:
+                getattr(loaded_module, attribute)
+        except (ImportError, AttributeError):
+            continue
+        loaded.append(name)
+        logger.debug("warmup: imported %s in %.1f ms", name, (time.perf_counter() - start) * 1000)
+    return loaded
+
+
+def _measure() -> Dict[str, Any]:
+    """Import the app and run its startup, as uvicorn would, in this process."""
+    import asyncio
+
+    os.environ["STARTUP_PROFILE"] = "true"
+    startup_profile.started = time.perf_counter()
+    from .main import app
+
+    async def run() -> None:
+        async with app.router.lifespan_context(app):
+            pass
+
+    asyncio.run(run())
+    return startup_profile.report()
+
+
+if __name__ == "__main__":
+    import argparse
+    import json
+
+    parser = argparse.ArgumentParser(description="Measure the app's cold start")
+    parser.add_argument("--budget-ms", type=float, help="exit with status 1 if time-to-ready exceeds this")
+    parser.add_argument("--json", action="store_true", help="print the report as JSON")
+    args = parser.parse_args()
+    os.environ["STARTUP_WARMUP"] = "false"
+    os.environ.setdefault("LOG_LEVEL", "WARNING")  # the report is printed below instead
+    # The module app.main reports to, not this __main__ copy
+    from app import startup
+
+    report = startup._measure()
+    print(json.dumps(report, indent=2) if args.json else startup.startup_profile.format())
+    if args.budget_ms and report["readySeconds"] * 1000 > args.budget_ms:
+        print(f"over budget: {report['readySeconds'] * 1000:.0f} ms > {args.budget_ms:.0f} ms", file=sys.stderr)
+        sys.exit(1)
@@ -0,0 +1,62 @@
+import os
+import uuid
+from collections import OrderedDict
+from typing import Dict, Iterable, Optional, Tuple
+
+
+class TaskListCache:
+    """Per-user task list versions plus a small LRU of serialized list bodies.
+
+    Every task write bumps the owner's version; the ETag is derived from it,
+    so an unchanged list can be answered with 304 (or from the cached body)
+    without touching the database. Versions live in this process, and the
+    ETag carries a per-process token so a restart never yields a false 304.
+    With several workers, each keeps its own view: set TASK_LIST_CACHE=false
+    there unless task writes are routed to a single worker.
+    """
+
+    def __init__(self):
+        self._token = uuid.uuid4().hex[:8]
+        self._versions: Dict[str, int] = {}
+        self._bodies: "OrderedDict[str, Tuple[int, bytes]]" = OrderedDict()
+        self.counters = {"hits": 0, "misses": 0, "notModified": 0, "invalidations": 0}
+
+    @property
+    def enabled(self) -> bool:
+        return os.getenv("TASK_LIST_CACHE", "true").lower() != "false"
+
+    def version(self, user_id: str) -> int:
+        return self._versions.get(user_id, 0)
+
+    def etag(self, user_id: str) -> str:
+        return f'"{self._token}-{self.version(user_id)}"'
+
+    def bump(self, user_ids: Iterable[Optional[str]]) -> None:
+        for user_id in set(user_ids):
+            if user_id is None:
+                continue
+            self._versions[user_id] = self.version(user_id) + 1
+            self._bodies.pop(user_id, None)
+            self.counters["invalidations"] += 1
+
+    def get(self, user_id: str) -> Optional[bytes]:
+        entry = self._bodies.get(user_id)
+        if entry is None or entry[0] != self.version(user_id):
+            self.counters["misses"] += 1
+            return None
+        self._bodies.move_to_end(user_id)
+        self.counters["hits"] += 1
+        return entry[1]
+
+    def set(self, user_id: str, version: int, body: bytes) -> None:
+        # Skip if a write landed while the list was being read
+        if version != self.version(user_id):
+            return
+        self._bodies[user_id] = (version, body)
+        self._bodies.move_to_end(user_id)
+        max_items = int(os.getenv("TASK_LIST_CACHE_MAX", "1024"))
+        while len(self._bodies) > max_items:
+            self._bodies.popitem(last=False)
+
+
+task_lists = TaskListCache()
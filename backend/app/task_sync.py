@@ -0,0 +1,255 @@
+import asyncio
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from collections import deque
+from typing import Any, Callable, Deque, Dict, List, Optional, Set
+
+
+class Subscription:
+    """One subscriber's bounded queue of task deltas. If the subscriber falls too
+    far behind, its queue is replaced by a single "resync" message."""
+
+    def __init__(self, channel: str, max_queue: int):
+        self.channel = channel
+        self.queue: asyncio.Queue = asyncio.Queue(max_queue)
+        self.overflowed = False
+
+    def deliver(self, message: Dict[str, Any]) -> None:
+        if self.overflowed:
+            return
+        try:
+            self.queue.put_nowait(message)
+        except asyncio.QueueFull:
+            self.overflowed = True
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            self.queue.put_nowait({"op": "resync", "seq": message["seq"]})
+
+
+class LocalBroker:
+    """In-process fan-out: sequence numbers, a per-channel replay backlog and
+    subscribers all live in this worker. Use it with a single worker."""
+
+    name = "local"
+
+    def __init__(self):
+        self.epoch = uuid.uuid4().hex[:8]
+        self._seq = 0
+        self._subscribers: Dict[str, Set[Subscription]] = {}
+        self._backlog: Dict[str, Deque[Dict[str, Any]]] = {}
+        # Per channel: highest seq dropped from the backlog (older resumes need a resync)
+        self._evicted: Dict[str, int] = {}
+        self.counters = {"published": 0, "delivered": 0, "replayed": 0, "resyncs": 0}
+
+    @staticmethod
+    def backlog_size() -> int:
+        return int(os.getenv("TASK_SYNC_BACKLOG", "256"))
+
+    def subscribe(self, channel: str) -> Subscription:
+        sub = Subscription(channel, int(os.getenv("TASK_SYNC_QUEUE", "256")))
+        self._subscribers.setdefault(channel, set()).add(sub)
+        return sub
+
+    def unsubscribe(self, sub: Subscription) -> None:
+        subs = self._subscribers.get(sub.channel)
+        if subs is not None:
+            subs.discard(sub)
+            if not subs:
+                del self._subscribers[sub.channel]
+
+    def _fan_out(self, channel: str, message: Dict[str, Any]) -> None:
+        for sub in list(self._subscribers.get(channel, ())):
+            sub.deliver(message)
+            self.counters["delivered"] += 1
+
+    def _remember(self, channel: str, message: Dict[str, Any]) -> None:
+        backlog = self._backlog.setdefault(channel, deque())
+        backlog.append(message)
+        while len(backlog) > self.backlog_size():
+            self._evicted[channel] = backlog.popleft()["seq"]
+
+    async def publish(self, channel: str, message: Dict[str, Any]) -> int:
+        self._seq += 1
+        message = {"seq": self._seq, **message}
+        self._remember(channel, message)
+        self.counters["published"] += 1
+        self._fan_out(channel, message)
+        return self._seq
+
+    async def current(self, channel: str) -> int:
+        backlog = self._backlog.get(channel)
+        return backlog[-1]["seq"] if backlog else self._evicted.get(channel, 0)
+
+    async def replay(self, channel: str, since: int) -> Optional[List[Dict[str, Any]]]:
+        """Messages after `since`, or None if some of them are no longer kept."""
+        if since < self._evicted.get(channel, 0) or since > self._seq:
+            self.counters["resyncs"] += 1
+            return None
+        missed = [m for m in self._backlog.get(channel, ()) if m["seq"] > since]
+        self.counters["replayed"] += len(missed)
+        return missed
+
+    async def stop(self) -> None:
+        pass
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            **self.counters,
+            "broker": self.name,
+            "epoch": self.epoch,
+            "channels": len(self._subscribers),
+            "subscribers": sum(len(s) for s in self._subscribers.values()),
+        }
+
+
+class SQLiteBroker(LocalBroker):
+    """Cross-worker broker for one host: every publish is appended to a SQLite
+    log (its row id is the sequence number) and each worker polls the log every
+    TASK_SYNC_POLL seconds to fan new rows out to its own subscribers. The log,
+    and so resuming, also survives restarts."""
+
+    name = "sqlite"
+
+    def __init__(self, path: Optional[str] = None):
+        super().__init__()
+        self.path = path or os.getenv("TASK_SYNC_DB_PATH", "task_sync.db")
+        self._conn: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+        self._last = 0
+        self._poller: Optional[asyncio.Task] = None
+        self.epoch = self._call(self._read_epoch)
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            conn = sqlite3.connect(self.path, timeout=5.0, check_same_thread=False, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS task_events ("
+                "seq INTEGER PRIMARY KEY AUTOINCREMENT, channel TEXT NOT NULL, "
+                "payload TEXT NOT NULL, created REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS ix_task_events_channel ON task_events (channel, seq)")
+            conn.execute("CREATE TABLE IF NOT EXISTS task_sync_meta (key TEXT PRIMARY KEY, value TEXT)")
+            self._conn = conn
+        return self._conn
+
+    def _call(self, fn: Callable[[sqlite3.Connection], Any]) -> Any:
+        with self._lock:
+            return fn(self._connect())
+
+    def _read_epoch(self, conn: sqlite3.Connection) -> str:
+        conn.execute("INSERT OR IGNORE INTO task_sync_meta (key, value) VALUES ('epoch', ?)",
+                     (uuid.uuid4().hex[:8],))
+        self._last = conn.execute("SELECT COALESCE(MAX(seq), 0) FROM task_events").fetchone()[0]
+        return conn.execute("SELECT value FROM task_sync_meta WHERE key = 'epoch'").fetchone()[0]
+
+    def subscribe(self, channel: str) -> Subscription:
+        if self._poller is None or self._poller.done():
+            self._poller = asyncio.create_task(self._poll())
+        return super().subscribe(channel)
+
+    async def publish(self, channel: str, message: Dict[str, Any]) -> int:
+        def insert(conn: sqlite3.Connection) -> int:
+            seq = conn.execute(
+                "INSERT INTO task_events (channel, payload, created) VALUES (?, ?, ?)",
+                (channel, json.dumps(message, separators=(",", ":")), time.time())).lastrowid
+            if seq % 100 == 0:
+                conn.execute("DELETE FROM task_events WHERE seq <= ?",
+                             (seq - int(os.getenv("TASK_SYNC_LOG_ROWS", "100000")),))
+            return seq
+
+        seq = await asyncio.to_thread(self._call, insert)
+        self.counters["published"] += 1
+        return seq  # subscribers (in every worker) get it from the poller
+
+    async def _poll(self) -> None:
+        interval = float(os.getenv("TASK_SYNC_POLL", "0.1"))
+        while True:
+            await asyncio.sleep(interval)
+            if not self._subscribers:
+                continue
+            rows = await asyncio.to_thread(self._call, lambda conn: conn.execute(
+                "SELECT seq, channel, payload FROM task_events WHERE seq > ? ORDER BY seq",
+                (self._last,)).fetchall())
+            for seq, channel, payload in rows:
+                self._last = seq
+                if channel in self._subscribers:
+                    self._fan_out(channel, {"seq": seq, **json.loads(payload)})
+
+    async def current(self, channel: str) -> int:
+        return await asyncio.to_thread(self._call, lambda conn: conn.execute(
+            "SELECT COALESCE(MAX(seq), 0) FROM task_events WHERE channel = ?", (channel,)).fetchone()[0])
+
+    async def replay(self, channel: str, since: int) -> Optional[List[Dict[str, Any]]]:
+        def query(conn: sqlite3.Connection):
+            oldest = conn.execute("SELECT MIN(seq) FROM task_events").fetchone()[0]
+            if oldest is not None and since < oldest - 1:
+                return None
+            return conn.execute(
+                "SELECT seq, payload FROM task_events WHERE channel = ? AND seq > ? ORDER BY seq",
+                (channel, since)).fetchall()
+
+        rows = await asyncio.to_thread(self._call, query)
+        if rows is None:
+            self.counters["resyncs"] += 1
+            return None
+        self.counters["replayed"] += len(rows)
+        return [{"seq": seq, **json.loads(payload)} for seq, payload in rows]
+
+    async def stop(self) -> None:
+        if self._poller is not None:
+            self._poller.cancel()
+            self._poller = None
+
+
+BROKERS: Dict[str, Callable[[], LocalBroker]] = {
+    "local": LocalBroker,
+    "sqlite": SQLiteBroker,
+}
+
+
+def register_broker(name: str, factory: Callable[[], LocalBroker]) -> None:
+    BROKERS[name] = factory
+
+
+class TaskSync:
+    """Publishes task deltas per user to the broker chosen by TASK_SYNC_BROKER."""
+
+    def __init__(self):
+        self._broker: Optional[LocalBroker] = None
+
+    @property
+    def enabled(self) -> bool:
+        return os.getenv("TASK_SYNC_ENABLED", "true").lower() != "false"
+
+    @property
+    def broker(self) -> LocalBroker:
+        if self._broker is None:
+            name = os.getenv("TASK_SYNC_BROKER", "local").lower()
+            factory = BROKERS.get(name)
+            if factory is None:
+                raise RuntimeError(f"Unknown TASK_SYNC_BROKER '{name}'")
+            self._broker = factory()
+        return self._broker
+
+    async def publish(self, user_id: Optional[str], op: str, **fields: Any) -> None:
+        if user_id is None or not self.enabled:
+            return
+        await self.broker.publish(user_id, {"op": op, **fields})
+
+    async def stop(self) -> None:
+        if self._broker is not None:
+            await self._broker.stop()
+
+    def stats(self) -> Dict[str, Any]:
+        if self._broker is None:
+            return {"enabled": self.enabled, "broker": os.getenv("TASK_SYNC_BROKER", "local").lower()}
+        return {"enabled": self.enabled, **self._broker.stats()}
+
+
+task_sync = TaskSync()
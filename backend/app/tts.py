@@ -0,0 +1,223 @@
+import asyncio
+import hashlib
+import io
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import AsyncIterator, Callable, Dict, List, Optional
+
+from .metrics import record_upstream
+
+
+class TTSEngine:
+    """A blocking text-to-speech backend producing MP3 bytes for one chunk of text."""
+
+    name = "base"
+
+    def synthesize(self, text: str, lang: str) -> bytes:
+        raise NotImplementedError
+
+
+class GTTSEngine(TTSEngine):
+    """Google Text-to-Speech via gTTS (network call per chunk)."""
+
+    name = "gtts"
+
+    def synthesize(self, text: str, lang: str) -> bytes:
+        from gtts import gTTS  # ImportError is reported to the caller
+        buf = io.BytesIO()
+        gTTS(text=text, lang=lang, slow=False).write_to_fp(buf)
+        return buf.getvalue()
+
+
+# One silent MPEG-1 Layer III frame: 128 kbps, 44.1 kHz, ~26 ms of audio
+_SILENT_FRAME = b"\xff\xfb\x90\x00" + b"\x00" * 413
+
+
+class OfflineEngine(TTSEngine):
+    """Local stand-in for tests and benchmarks: emits silent MP3 frames
+    (about 60 ms per character) after a configurable simulated latency."""
+
+    name = "offline"
+
+    def synthesize(self, text: str, lang: str) -> bytes:
+        delay_ms = float(os.getenv("TTS_OFFLINE_LATENCY_MS", "0"))
+        delay_ms += float(os.getenv("TTS_OFFLINE_MS_PER_CHAR", "0")) * len(text)
+        if delay_ms:
+            time.sleep(delay_ms / 1000)
+        return _SILENT_FRAME * max(1, len(text) * 60 // 26)
+
+
+class HTTPEngine(TTSEngine):
+    """Any HTTP TTS service: POSTs {"text", "lang"} as JSON to TTS_HTTP_URL and
+    expects MP3 bytes back (self-hosted TTS servers, the benchmark fakes)."""
+
+    name = "http"
+    _client = None
+    _lock = threading.Lock()
+
+    @classmethod
+    def client(cls):
+        with cls._lock:
+            if cls._client is None:
+                import httpx
+                cls._client = httpx.Client(timeout=float(os.getenv("TTS_HTTP_TIMEOUT", "30")))
+            return cls._client
+
+    def synthesize(self, text: str, lang: str) -> bytes:
+        url = os.getenv("TTS_HTTP_URL")
+        if not url:
+            raise RuntimeError("TTS_HTTP_URL not configured")
+        r = self.client().post(url, json={"text": text, "lang": lang})
+        r.raise_for_status()
+        return r.content
+
+
+ENGINES: Dict[str, Callable[[], TTSEngine]] = {
+    "gtts": GTTSEngine,
+    "offline": OfflineEngine,
+    "http": HTTPEngine,
+}
+
+
+def register_engine(name: str, factory: Callable[[], TTSEngine]) -> None:
+    ENGINES[name] = factory
+
+
+def get_engine() -> TTSEngine:
+    name = os.getenv("TTS_ENGINE", "gtts").lower()
+    factory = ENGINES.get(name)
+    if factory is None:
+        raise RuntimeError(f"Unknown TTS_ENGINE '{name}'")
+    return factory()
+
+
+_SENTENCE_RE = re.compile(r"(?<=[.!?;:])\s+")
+
+
+def split_text(text: str, max_chars: Optional[int] = None) -> List[str]:
+    """Split text into verse/sentence chunks, merging short ones up to max_chars."""
+    max_chars = max_chars or int(os.getenv("TTS_CHUNK_CHARS", "200"))
+    pieces: List[str] = []
+    for line in text.splitlines():
+        line = line.strip()
+        if not line:
+            continue
+        for sentence in _SENTENCE_RE.split(line):
+            sentence = sentence.strip()
+            # Hard-wrap very long sentences on word boundaries
+            while len(sentence) > max_chars:
+                cut = sentence.rfind(" ", 0, max_chars)
+                cut = cut if cut > 0 else max_chars
+                pieces.append(sentence[:cut].strip())
+                sentence = sentence[cut:].strip()
+            if sentence:
+                pieces.append(sentence)
+
+    # The first piece stays on its own so the first audio is ready quickly
+    chunks: List[str] = pieces[:1]
+    for piece in pieces[1:]:
+        if len(chunks) > 1 and len(chunks[-1]) + 1 + len(piece) <= max_chars:
+            chunks[-1] = f"{chunks[-1]}\n{piece}"
+        else:
+            chunks.append(piece)
+    return chunks
+
+
+class TTSPipeline:
+    """Synthesizes chunks in parallel on a thread pool and yields them in order.
+
+    Finished chunks are kept in a byte-bounded LRU keyed by (engine, lang, text),
+    and concurrent requests for the same chunk share one synthesis.
+    """
+
+    def __init__(self):
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._cache: "OrderedDict[str, bytes]" = OrderedDict()
+        self._cache_bytes = 0
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self.counters = {"chunks": 0, "synthesized": 0, "cacheHits": 0, "coalesced": 0}
+
+    @property
+    def executor(self) -> ThreadPoolExecutor:
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(
+                max_workers=int(os.getenv("TTS_WORKERS", "4")), thread_name_prefix="tts")
+        return self._executor
+
+    def _remember(self, key: str, audio: bytes) -> None:
+        max_bytes = int(os.getenv("TTS_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+        self._cache[key] = audio
+        self._cache_bytes += len(audio)
+        while self._cache_bytes > max_bytes and self._cache:
+            _, old = self._cache.popitem(last=False)
+            self._cache_bytes -= len(old)
+
+    async def _chunk(self, engine: TTSEngine, text: str, lang: str) -> bytes:
+        key = hashlib.sha256(f"{engine.name}\0{lang}\0{text}".encode("utf-8")).hexdigest()
+        self.counters["chunks"] += 1
+        cached = self._cache.get(key)
+        if cached is not None:
+            self._cache.move_to_end(key)
+            self.counters["cacheHits"] += 1
+            return cached
+        fut = self._inflight.get(key)
+        if fut is not None:
+            self.counters["coalesced"] += 1
+            return await asyncio.shield(fut)
+
+        elapsed = [0.0]
+
+        def run() -> bytes:
+            start = time.perf_counter()
+            try:
+                return engine.synthesize(text, lang)
+            finally:
+                elapsed[0] = time.perf_counter() - start
+
+        loop = asyncio.get_running_loop()
+        fut = loop.run_in_executor(self.executor, run)
+        self._inflight[key] = fut
+
+        def done(f: asyncio.Future) -> None:
+            # Cache even if every waiter has gone away in the meantime
+            self._inflight.pop(key, None)
+            if f.cancelled():
+                record_upstream("tts", engine.name, elapsed[0], "cancelled")
+            elif f.exception() is not None:
+                record_upstream("tts", engine.name, elapsed[0], "failure")
+            else:
+                self.counters["synthesized"] += 1
+                self._remember(key, f.result())
+                record_upstream("tts", engine.name, elapsed[0], "success", len(f.result()))
+
+        fut.add_done_callback(done)
+        return await asyncio.shield(fut)
+
+    async def stream(self, text: str, lang: str = "en") -> AsyncIterator[bytes]:
+        """Yield MP3 data chunk by chunk, in order, as soon as each is ready."""
+        engine = get_engine()
+        tasks = [asyncio.ensure_future(self._chunk(engine, c, lang)) for c in split_text(text)]
+        try:
+            for task in tasks:
+                yield await task
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    async def synthesize(self, text: str, lang: str = "en") -> bytes:
+        return b"".join([part async for part in self.stream(text, lang)])
+
+    def stats(self) -> Dict[str, object]:
+        return {
+            **self.counters,
+            "engine": os.getenv("TTS_ENGINE", "gtts").lower(),
+            "cachedChunks": len(self._cache),
+            "cachedBytes": self._cache_bytes,
+        }
+
+
+tts = TTSPipeline()
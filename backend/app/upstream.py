@@ -0,0 +1,199 @@
+import os
+import ssl
+import time
+from typing import Any, Dict, Optional
+
+import httpx
+
+try:
+    import h2  # type: ignore  # noqa: F401
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
+
+# Per-upstream defaults; each value can be overridden with UPSTREAM_<NAME>_<KEY>
+UPSTREAMS: Dict[str, Dict[str, Any]] = {
+    "gemini": {"timeout": 60.0, "connect_timeout": 10.0},
+    "hf": {"timeout": 120.0, "connect_timeout": 10.0},
+}
+
+
+def _env_float(name: str, default: float) -> float:
+    try:
+        return float(os.getenv(name, default))
+    except (TypeError, ValueError):
+        return default
+
+
+def _env_int(name: str, default: int) -> int:
+    try:
+        return int(os.getenv(name, default))
+    except (TypeError, ValueError):
+        return default
+
+
+class _PoolStats:
+    """Counters fed by the instrumented transport of one upstream client."""
+
+    def __init__(self):
+        self.requests = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.new_connections = 0
+        self.errors = 0
+        self.total_seconds = 0.0
+
+    def as_dict(self) -> Dict[str, Any]:
+        reused = max(self.requests - self.new_connections, 0)
+        return {
+            "requests": self.requests,
+            "inFlight": self.in_flight,
+            "maxInFlight": self.max_in_flight,
+            "newConnections": self.new_connections,
+            "reusedConnections": reused,
+            "reuseRatio": round(reused / self.requests, 3) if self.requests else None,
+            "errors": self.errors,
+            "avgSeconds": round(self.total_seconds / self.requests, 4) if self.requests else None,
+        }
+
+
+class _InstrumentedTransport(httpx.AsyncHTTPTransport):
+    """AsyncHTTPTransport that counts in-flight requests and fresh TCP connects."""
+
+    def __init__(self, stats: _PoolStats, **kwargs):
+        super().__init__(**kwargs)
+        self.stats = stats
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        stats = self.stats
+
+        async def trace(event_name: str, info: Dict[str, Any]) -> None:
+            if event_name == "connection.connect_tcp.complete":
+                stats.new_connections += 1
+
+        request.extensions = {**request.extensions, "trace": trace}
+        stats.requests += 1
+        stats.in_flight += 1
+        stats.max_in_flight = max(stats.max_in_flight, stats.in_flight)
+        start = time.perf_counter()
+        try:
+            return await super().handle_async_request(request)
+        except Exception:
+            stats.errors += 1
+            raise
+        finally:
+            stats.in_flight -= 1
+            stats.total_seconds += time.perf_counter() - start
+
+    def pool_state(self) -> Dict[str, Any]:
+        pool = self._pool
+        connections = list(pool.connections)
+        return {
+            "connections": len(connections),
+            "idle": sum(1 for c in connections if c.is_idle()),
+            "http2": sum(1 for c in connections if "HTTP/2" in repr(c)),
+            # Requests waiting for a connection slot (pool exhausted)
+            "queued": sum(1 for r in getattr(pool, "_requests", []) if r.connection is None),
+        }
+
+
+class UpstreamPool:
+    """One pooled, keep-alive httpx.AsyncClient per upstream API.
+
+    Clients are opened in the FastAPI lifespan and shared by every request;
+    outside the app (scripts, benchmarks) they are created lazily on first use.
+    """
+
+    def __init__(self):
+        self._clients: Dict[str, httpx.AsyncClient] = {}
+        self._transports: Dict[str, _InstrumentedTransport] = {}
+        self._stats: Dict[str, _PoolStats] = {}
+        self._ssl_contexts: Dict[bool, ssl.SSLContext] = {}
+
+    def _ssl_context(self, http2: bool) -> ssl.SSLContext:
+        # Loading the CA bundle is the slowest part of creating a client; do it once
+        context = self._ssl_contexts.get(http2)
+        if context is None:
+            context = self._ssl_contexts[http2] = httpx.create_ssl_context(http2=http2)
+        return context
+
+    def _settings(self, name: str) -> Dict[str, Any]:
+        prefix = f"UPSTREAM_{name.upper()}_"
+        base = UPSTREAMS.get(name, {"timeout": 60.0, "connect_timeout": 10.0})
+        http2 = os.getenv("UPSTREAM_HTTP2", "true").lower() != "false"
+        return {
+            "timeout": _env_float(prefix + "TIMEOUT", base["timeout"]),
+            "connect_timeout": _env_float(prefix + "CONNECT_TIMEOUT", base["connect_timeout"]),
+            "max_connections": _env_int(prefix + "MAX_CONNECTIONS",
+                                        _env_int("UPSTREAM_MAX_CONNECTIONS", 100)),
+            "max_keepalive": _env_int(prefix + "MAX_KEEPALIVE",
+                                      _env_int("UPSTREAM_MAX_KEEPALIVE", 20)),
+            "keepalive_expiry": _env_float(prefix + "KEEPALIVE_EXPIRY",
+                                           _env_float("UPSTREAM_KEEPALIVE_EXPIRY", 30.0)),
+            "http2": http2 and HTTP2_AVAILABLE,
+        }
+
+    def _create(self, name: str) -> httpx.AsyncClient:
+        cfg = self._settings(name)
+        limits = httpx.Limits(
+            max_connections=cfg["max_connections"],
+            max_keepalive_connections=cfg["max_keepalive"],
+            keepalive_expiry=cfg["keepalive_expiry"],
+        )
+        stats = self._stats.setdefault(name, _PoolStats())
+        transport = _InstrumentedTransport(
+            stats, http2=cfg["http2"], limits=limits, verify=self._ssl_context(cfg["http2"]))
+        timeout = httpx.Timeout(cfg["timeout"], connect=cfg["connect_timeout"])
+        client = httpx.AsyncClient(transport=transport, timeout=timeout)
+        self._transports[name] = transport
+        self._clients[name] = client
+        return client
+
+    async def start(self) -> None:
+        for name in UPSTREAMS:
+            if name not in self._clients:
+                self._create(name)
+
+    async def aclose(self) -> None:
+        clients, self._clients = self._clients, {}
+        self._transports = {}
+        for client in clients.values():
+            await client.aclose()
+
+    def client(self, name: str) -> httpx.AsyncClient:
+        client = self._clients.get(name)
+        if client is None or client.is_closed:
+            client = self._create(name)
+        return client
+
+    def stats(self, name: Optional[str] = None) -> Dict[str, Any]:
+        names = [name] if name else list(UPSTREAMS)
+        out: Dict[str, Any] = {}
+        for n in names:
+            cfg = self._settings(n)
+            entry = self._stats.get(n, _PoolStats()).as_dict()
+            transport = self._transports.get(n)
+            entry["pool"] = transport.pool_state() if transport else None
+            entry["limits"] = {
+                "maxConnections": cfg["max_connections"],
+                "maxKeepalive": cfg["max_keepalive"],
+                "keepaliveExpiry": cfg["keepalive_expiry"],
+                "timeout": cfg["timeout"],
+                "http2": cfg["http2"],
+            }
+            out[n] = entry
+        return out
+
+
+pool = UpstreamPool()
+
+
+def gemini_client() -> httpx.AsyncClient:
+    """FastAPI dependency returning the shared Gemini client."""
+    return pool.client("gemini")
+
+
+def hf_client() -> httpx.AsyncClient:
+    """FastAPI dependency returning the shared Hugging Face client."""
+    return pool.client("hf")
@@ -0,0 +1,137 @@
+"""Encode time and size of the image pipeline variants against the old PNG path.
+
+The old path re-encoded every generated image as a full-size PNG and shipped
+it base64-encoded; the pipeline builds a WebP/AVIF full image, a thumbnail and
+a BlurHash on a process pool. Uses a synthetic 1024x1024 image unless --input
+points at a real one.
+
+    cd backend
+    python -m benchmarks.bench_images --images 16 --workers 4
+    python -m benchmarks.bench_images --input generated.png --quality 75
+"""
+import argparse
+import asyncio
+import base64
+import io
+import os
+import time
+
+
+def synthetic_image(size: int):
+    """Smooth colour fields with some texture, closer to a generated picture than noise."""
+    import numpy as np
+    from PIL import Image
+
+    y, x = np.mgrid[0:size, 0:size] / size
+    rng = np.random.default_rng(0)
+    channels = [
+        np.sin(x * 6 + 1) * 0.5 + np.cos(y * 4) * 0.3,
+        np.sin((x + y) * 5) * 0.6,
+        np.cos(x * 3 - y * 7) * 0.5 + np.sin(y * 2) * 0.2,
+    ]
+    rgb = np.stack(channels, axis=-1) * 90 + 128 + rng.normal(0, 6, (size, size, 3))
+    return Image.fromarray(rgb.clip(0, 255).astype(np.uint8))
+
+
+def timed(fn, repeat: int):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+async def loop_lag(stop: asyncio.Event) -> float:
+    """Worst lateness of a 5 ms timer while `stop` is unset: what other requests would feel."""
+    worst = 0.0
+    while not stop.is_set():
+        start = time.perf_counter()
+        await asyncio.sleep(0.005)
+        worst = max(worst, time.perf_counter() - start - 0.005)
+    return worst
+
+
+async def during(work) -> tuple:
+    stop = asyncio.Event()
+    sampler = asyncio.create_task(loop_lag(stop))
+    start = time.perf_counter()
+    await work
+    elapsed = time.perf_counter() - start
+    stop.set()
+    return elapsed, await sampler
+
+
+async def main(args):
+    os.environ["IMAGE_QUALITY"] = str(args.quality)
+    os.environ["IMAGE_THUMB_SIZE"] = str(args.thumb_size)
+    os.environ["IMAGE_WORKERS"] = str(args.workers)
+
+    from PIL import Image, features
+
+    from app.images import _save, blurhash, encode_variants, image_pipeline, settings
+
+    img = Image.open(args.input).convert("RGB") if args.input else synthetic_image(args.size)
+    buf = io.BytesIO()
+    img.save(buf, format="PNG", compress_level=1)
+    source = buf.getvalue()
+    print(f"image {img.width}x{img.height}, quality {args.quality}, thumb {args.thumb_size}px")
+    print(f"{'variant':<28}{'encode ms':>10}{'bytes':>12}{'vs PNG':>8}")
+
+    def row(name, seconds, size, base):
+        print(f"{name:<28}{seconds * 1000:>10.1f}{size:>12,}{size / base:>8.1%}")
+
+    def encode_png() -> bytes:
+        out = io.BytesIO()
+        img.save(out, format="PNG")
+        return out.getvalue()
+
+    png_s, png = timed(encode_png, args.repeat)
+    b64 = len(base64.b64encode(png))
+    row("PNG (old path)", png_s, len(png), len(png))
+    row("PNG as base64 data URL", png_s, b64, len(png))
+    for fmt in ("webp", "avif"):
+        if not features.check(fmt):
+            print(f"{fmt.upper() + ' full':<28}{'not supported by this Pillow build':>30}")
+            continue
+        seconds, data = timed(lambda: _save(img, fmt, args.quality), args.repeat)
+        row(f"{fmt.upper()} full (q{args.quality})", seconds, len(data), len(png))
+        thumb = img.copy()
+        thumb.thumbnail((args.thumb_size, args.thumb_size), Image.Resampling.BILINEAR, reducing_gap=2.0)
+        seconds, data = timed(lambda: _save(thumb, fmt, 70), args.repeat)
+        row(f"{fmt.upper()} thumb", seconds, len(data), len(png))
+    small = img.copy()
+    small.thumbnail((32, 32))
+    seconds, hash_ = timed(lambda: blurhash(small), args.repeat)
+    row(f"BlurHash {hash_[:12]}...", seconds, len(hash_), len(png))
+
+    options = settings()
+    seconds, _ = timed(lambda: encode_variants(source, options), args.repeat)
+    print(f"\nall variants ({options['format']}) for one image, in process: {seconds * 1000:.1f} ms")
+
+    # Throughput: the process pool against encoding on threads (the old executor model)
+    from concurrent.futures import ThreadPoolExecutor
+
+    loop = asyncio.get_running_loop()
+    await image_pipeline.process(source, "image/png")  # start the workers
+    pool_s, pool_lag = await during(asyncio.gather(
+        *(image_pipeline.process(source, "image/png") for _ in range(args.images))))
+    with ThreadPoolExecutor(args.workers) as threads:
+        thread_s, thread_lag = await during(asyncio.gather(
+            *(loop.run_in_executor(threads, encode_variants, source, options) for _ in range(args.images))))
+    await image_pipeline.shutdown()
+    print(f"\n{args.images} images, {args.workers} workers:")
+    print(f"  process pool {pool_s:6.2f} s ({args.images / pool_s:4.1f}/s), worst event-loop lag {pool_lag * 1000:6.1f} ms")
+    print(f"  threads      {thread_s:6.2f} s ({args.images / thread_s:4.1f}/s), worst event-loop lag {thread_lag * 1000:6.1f} ms")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--input", help="image file to use instead of the synthetic one")
+    parser.add_argument("--size", type=int, default=1024)
+    parser.add_argument("--quality", type=int, default=80)
+    parser.add_argument("--thumb-size", type=int, default=256)
+    parser.add_argument("--images", type=int, default=8, help="images for the throughput run")
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument("--repeat", type=int, default=3, help="best of N for per-variant timings")
+    asyncio.run(main(parser.parse_args()))
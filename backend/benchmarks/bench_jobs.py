@@ -0,0 +1,76 @@
+"""Burst-submission benchmark for the /api/jobs queue.
+
+Runs the real app in-process (no network) with the job handlers replaced by a
+simulated upstream call of fixed latency, submits a burst of jobs and reports
+accepted/rejected counts, submit latency and end-to-end throughput.
+
+    cd backend
+    python -m benchmarks.bench_jobs --jobs 200 --latency 0.5
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import tempfile
+import time
+
+
+async def main(args):
+    os.environ.setdefault("DB_URL", f"sqlite:///{tempfile.mkdtemp()}/bench_jobs.db")
+    os.environ[f"JOB_{args.kind.upper()}_CONCURRENCY"] = str(args.concurrency)
+    os.environ[f"JOB_{args.kind.upper()}_QUEUE_MAX"] = str(args.queue_max)
+
+    import httpx
+    from app.jobs import job_queue
+    from app.main import app
+
+    async def simulated(payload):
+        await asyncio.sleep(args.latency)
+        return {"ok": True}
+
+    job_queue.register(args.kind, simulated)
+
+    async with app.router.lifespan_context(app):
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            body = {"prompt": "bench", "topic": "bench"}
+            submit_times = []
+
+            async def submit():
+                t = time.perf_counter()
+                r = await client.post(f"/api/jobs/{args.kind}", json=body)
+                submit_times.append(time.perf_counter() - t)
+                return r
+
+            start = time.perf_counter()
+            responses = await asyncio.gather(*[submit() for _ in range(args.jobs)])
+            accepted = [r.json()["jobId"] for r in responses if r.status_code == 202]
+            rejected = sum(1 for r in responses if r.status_code == 429)
+
+            pending = set(accepted)
+            while pending:
+                await asyncio.sleep(0.05)
+                for job_id in list(pending):
+                    r = await client.get(f"/api/jobs/{job_id}")
+                    if r.json()["status"] in ("succeeded", "failed"):
+                        pending.discard(job_id)
+            elapsed = time.perf_counter() - start
+
+    submit_ms = sorted(t * 1000 for t in submit_times)
+    print(f"kind={args.kind} jobs={args.jobs} concurrency={args.concurrency} "
+          f"queue_max={args.queue_max} latency={args.latency}s")
+    print(f"accepted={len(accepted)} rejected(429)={rejected}")
+    print(f"submit p50={statistics.median(submit_ms):.1f}ms "
+          f"p99={submit_ms[int(len(submit_ms) * 0.99) - 1]:.1f}ms")
+    print(f"completed in {elapsed:.2f}s -> {len(accepted) / elapsed:.1f} jobs/s "
+          f"(ideal {args.concurrency / args.latency:.1f} jobs/s)")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--kind", default="mindmap", choices=["art", "audio", "mindmap"])
+    parser.add_argument("--jobs", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--queue-max", type=int, default=150)
+    parser.add_argument("--latency", type=float, default=0.2)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,61 @@
+"""Layout time against node count for the server-side mind map layout engine.
+
+Builds random trees (a topic node with a given branching factor), then times
+the seed placement, the force-directed refinement and an incremental
+expansion of one leaf, for every size.
+
+    cd backend
+    python -m benchmarks.bench_layout --sizes 12 100 500 1000 2000 5000
+"""
+import argparse
+import random
+import time
+
+from app.mindmap_layout import layout_mindmap, place_children, radial_positions, tree_positions
+
+
+def random_mindmap(n: int, branching: int, rng: random.Random) -> dict:
+    nodes = [{"id": "node-1", "type": "topicNode", "data": {"label": "Topic"}, "position": {"x": 0, "y": 0}}]
+    edges = []
+    for i in range(2, n + 1):
+        parent = rng.randint(max(1, (i - 1) // branching), i - 1)
+        nodes.append({"id": f"node-{i}", "type": "ideaNode", "data": {"label": f"Idea {i}"},
+                      "position": {"x": 0, "y": 0}})
+        edges.append({"id": f"e{parent}-{i}", "source": f"node-{parent}", "target": f"node-{i}"})
+    return {"nodes": nodes, "edges": edges}
+
+
+def timed(fn, *args, **kwargs):
+    start = time.perf_counter()
+    result = fn(*args, **kwargs)
+    return result, (time.perf_counter() - start) * 1000
+
+
+def main(args):
+    rng = random.Random(args.seed)
+    print(f"{'nodes':>6} {'radial':>9} {'tree':>9} {'radial+force':>13} {'expand':>9}  (ms)")
+    for n in args.sizes:
+        mindmap = random_mindmap(n, args.branching, rng)
+        _, radial_ms = timed(radial_positions, mindmap)
+        _, tree_ms = timed(tree_positions, mindmap)
+        laid_out, full_ms = timed(layout_mindmap, mindmap, "radial")
+
+        leaf = laid_out["nodes"][-1]["id"]
+        children = [{"id": f"{leaf}-{k}", "type": "ideaNode", "data": {"label": f"Child {k}"},
+                     "position": {"x": 0, "y": 0}} for k in range(1, args.expand + 1)]
+        expanded = {
+            "nodes": laid_out["nodes"] + children,
+            "edges": laid_out["edges"] + [{"id": f"e{leaf}-{c['id']}", "source": leaf, "target": c["id"]}
+                                          for c in children],
+        }
+        _, expand_ms = timed(place_children, expanded, leaf, [c["id"] for c in children])
+        print(f"{n:>6} {radial_ms:>9.1f} {tree_ms:>9.1f} {full_ms:>13.1f} {expand_ms:>9.1f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[12, 100, 500, 1000, 2000, 5000])
+    parser.add_argument("--branching", type=int, default=4)
+    parser.add_argument("--expand", type=int, default=4, help="children added by the expansion step")
+    parser.add_argument("--seed", type=int, default=7)
+    main(parser.parse_args())
@@ -0,0 +1,321 @@
+"""Load test of the real app against local fake Gemini, HF and TTS upstreams.
+
+Starts benchmarks.fakes and `uvicorn app.main:app` (one worker, temporary
+database, cache and artifact directory) as subprocesses, runs every scenario
+at every concurrency level and reports latency percentiles, throughput,
+upstream calls, and the app's event-loop lag and memory (scraped from
+/metrics). Save the JSON report on each commit and compare two of them:
+
+    cd backend
+    python -m benchmarks.bench_load --scenarios chat,mindmap,tasks --concurrency 1,16,64 --duration 10
+    python -m benchmarks.bench_load --json before.json
+    python -m benchmarks.bench_load --json after.json --compare before.json
+    python -m benchmarks.bench_load --env COALESCE_ENABLED=false --hot-ratio 0.5 --scenarios chat
+
+Prompts are unique unless --hot-ratio sends that fraction of requests with
+one of a few repeated prompts (exercising the response cache and coalescing).
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import re
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import uuid
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+import httpx
+
+from . import fakes
+
+HOT_PROMPTS = 4
+
+
+def _prompt(kind: str, i: int, args) -> str:
+    if random.random() < args.hot_ratio:
+        return f"{kind} hot prompt {i % HOT_PROMPTS}"
+    return f"{kind} {uuid.uuid4().hex[:12]} {i}"
+
+
+async def _read(r: httpx.Response) -> int:
+    async for _ in r.aiter_bytes():
+        pass
+    return r.status_code
+
+
+def _post(path: str, body: Callable[[int, Any], Dict[str, Any]]):
+    async def run(client: httpx.AsyncClient, i: int, args) -> int:
+        return (await client.post(path, json=body(i, args))).status_code
+    return run
+
+
+def _stream(path: str, body: Callable[[int, Any], Dict[str, Any]]):
+    async def run(client: httpx.AsyncClient, i: int, args) -> int:
+        async with client.stream("POST", path, json=body(i, args)) as r:
+            return await _read(r)
+    return run
+
+
+async def _tasks(client: httpx.AsyncClient, i: int, args) -> int:
+    # Mostly reads, like the task list page: one create per four list fetches
+    user = f"bench-user-{i % 32}"
+    if i % 5 == 0:
+        r = await client.post("/api/tasks", json={"title": f"task {i}", "user_id": user})
+    else:
+        r = await client.get(f"/api/tasks/{user}")
+    return r.status_code
+
+
+_conversations: Dict[int, str] = {}
+
+
+async def _chat_session(client: httpx.AsyncClient, i: int, args) -> int:
+    # Every request continues one of 32 server-side conversations, which grow for the whole run
+    slot = i % 32
+    if slot not in _conversations:
+        _conversations[slot] = (await client.post("/api/conversations")).json()["id"]
+    r = await client.post("/api/ai/chat", json={"message": _prompt("chat", i, args),
+                                                "conversationId": _conversations[slot]})
+    return r.status_code
+
+
+SCENARIOS: Dict[str, Callable[[httpx.AsyncClient, int, Any], Awaitable[int]]] = {
+    "chat": _post("/api/ai/chat", lambda i, a: {"message": _prompt("chat", i, a)}),
+    "chat_stream": _stream("/api/ai/chat/stream", lambda i, a: {"message": _prompt("chat", i, a)}),
+    "chat_session": _chat_session,
+    "art": _post("/api/ai/art", lambda i, a: {"prompt": _prompt("art", i, a)}),
+    "audio": _post("/api/media/audio", lambda i, a: {"prompt": _prompt("audio", i, a)}),
+    "audio_stream": _stream("/api/media/audio/stream", lambda i, a: {"prompt": _prompt("audio", i, a)}),
+    "mindmap": _post("/api/media/mindmap", lambda i, a: {"topic": _prompt("mindmap", i, a)}),
+    "mindmap_stream": _stream("/api/media/mindmap/stream",
+                              lambda i, a: {"topic": _prompt("mindmap", i, a), "format": "ndjson"}),
+    "tasks": _tasks,
+}
+
+_SAMPLE_RE = re.compile(r'^([a-zA-Z_:][\w:]*)(\{[^}]*\})?\s+(\S+)$')
+
+
+def parse_metrics(text: str) -> Dict[Tuple[str, str], float]:
+    """Prometheus text format -> {(name, "{labels}"): value}."""
+    samples = {}
+    for line in text.splitlines():
+        m = _SAMPLE_RE.match(line)
+        if m:
+            samples[(m.group(1), m.group(2) or "")] = float(m.group(3))
+    return samples
+
+
+def _lag(before: Dict, after: Dict) -> Dict[str, Optional[float]]:
+    """Mean and p99 (bucket upper bound) event-loop lag between two scrapes."""
+    def delta(key):
+        return after.get(key, 0.0) - before.get(key, 0.0)
+
+    count = delta(("event_loop_lag_seconds_count", ""))
+    if count <= 0:
+        return {"lagMeanMs": None, "lagP99Ms": None}
+    buckets = sorted(
+        (float("inf") if le == "+Inf" else float(le), delta((name, labels)))
+        for (name, labels) in after if name == "event_loop_lag_seconds_bucket"
+        for le in re.findall(r'le="([^"]+)"', labels)
+    )
+    p99 = next((bound for bound, cumulative in buckets if cumulative >= 0.99 * count), None)
+    return {
+        "lagMeanMs": round(delta(("event_loop_lag_seconds_sum", "")) / count * 1000, 2),
+        "lagP99Ms": None if p99 is None or p99 == float("inf") else round(p99 * 1000, 1),
+    }
+
+
+def percentile(ordered: List[float], q: float) -> Optional[float]:
+    if not ordered:
+        return None
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+async def run_level(client: httpx.AsyncClient, fakes_url: str, name: str, concurrency: int, args) -> Dict[str, Any]:
+    scenario = SCENARIOS[name]
+    counter = iter(range(10 ** 9))
+    latencies: List[float] = []
+    statuses: Dict[str, int] = {}
+
+    async def worker(deadline: float, record: bool) -> None:
+        while time.perf_counter() < deadline:
+            start = time.perf_counter()
+            try:
+                status = str(await scenario(client, next(counter), args))
+            except httpx.HTTPError as e:
+                status = type(e).__name__
+            if record:
+                latencies.append(time.perf_counter() - start)
+                statuses[status] = statuses.get(status, 0) + 1
+
+    if args.warmup:
+        deadline = time.perf_counter() + args.warmup
+        await asyncio.gather(*(worker(deadline, False) for _ in range(concurrency)))
+
+    before = parse_metrics((await client.get("/metrics")).text)
+    upstream_before = (await client.get(f"{fakes_url}/stats")).json()
+    start = time.perf_counter()
+    deadline = start + args.duration
+    await asyncio.gather(*(worker(deadline, True) for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+    after = parse_metrics((await client.get("/metrics")).text)
+    upstream_after = (await client.get(f"{fakes_url}/stats")).json()
+
+    latencies.sort()
+    errors = sum(n for s, n in statuses.items() if not (s.isdigit() and int(s) < 400))
+    return {
+        "scenario": name,
+        "concurrency": concurrency,
+        "requests": len(latencies),
+        "errors": errors,
+        "statuses": statuses,
+        "rps": round(len(latencies) / elapsed, 2),
+        **{f"p{int(q * 100)}Ms": round(percentile(latencies, q) * 1000, 1) if latencies else None
+           for q in (0.5, 0.95, 0.99)},
+        "maxMs": round(latencies[-1] * 1000, 1) if latencies else None,
+        **_lag(before, after),
+        "rssMb": round(after.get(("process_resident_memory_bytes", ""), 0) / 2 ** 20, 1),
+        "peakRssMb": round(after.get(("process_max_resident_memory_bytes", ""), 0) / 2 ** 20, 1),
+        "upstreamCalls": {k: upstream_after[k] - upstream_before.get(k, 0) for k in upstream_after},
+    }
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+async def _wait_ready(url: str, proc: subprocess.Popen, timeout: float = 30.0) -> None:
+    deadline = time.perf_counter() + timeout
+    async with httpx.AsyncClient() as client:
+        while time.perf_counter() < deadline:
+            if proc.poll() is not None:
+                raise RuntimeError(f"{proc.args} exited with {proc.returncode}")
+            try:
+                await client.get(url)
+                return
+            except httpx.TransportError:
+                await asyncio.sleep(0.1)
+    raise RuntimeError(f"{url} not ready after {timeout}s")
+
+
+def _git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _print(results: List[Dict[str, Any]], baseline: Optional[Dict[Tuple[str, int], Dict]] = None) -> None:
+    print(f"{'scenario':<15}{'conc':>5}{'reqs':>7}{'err':>5}{'rps':>9}{'p50':>8}{'p95':>8}{'p99':>8}"
+          f"{'lag':>7}{'lag99':>7}{'rss':>7}  upstream")
+    for r in results:
+        fmt = lambda v, w: f"{'-' if v is None else v:>{w}}"  # noqa: E731
+        calls = ",".join(f"{k}={v}" for k, v in r["upstreamCalls"].items() if v)
+        print(f"{r['scenario']:<15}{r['concurrency']:>5}{r['requests']:>7}{r['errors']:>5}{r['rps']:>9}"
+              f"{fmt(r['p50Ms'], 8)}{fmt(r['p95Ms'], 8)}{fmt(r['p99Ms'], 8)}"
+              f"{fmt(r['lagMeanMs'], 7)}{fmt(r['lagP99Ms'], 7)}{r['rssMb']:>7}  {calls}")
+        old = (baseline or {}).get((r["scenario"], r["concurrency"]))
+        if old:
+            def change(key):
+                if not old.get(key) or r.get(key) is None:
+                    return "-"
+                return f"{(r[key] - old[key]) / old[key] * 100:+.1f}%"
+            print(f"{'  vs baseline':<32}{change('rps'):>9}{change('p50Ms'):>8}{change('p95Ms'):>8}"
+                  f"{change('p99Ms'):>8}{change('lagMeanMs'):>7}{'':>7}{change('rssMb'):>7}")
+    print("latencies in ms, rss in MiB; lag = event-loop lag mean / p99 bucket")
+
+
+async def main(args):
+    scenarios = [s.strip() for s in args.scenarios.split(",") if s.strip()]
+    unknown = [s for s in scenarios if s not in SCENARIOS]
+    if unknown:
+        raise SystemExit(f"unknown scenarios {unknown}, expected some of {', '.join(SCENARIOS)}")
+    levels = [int(c) for c in args.concurrency.split(",")]
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = {(r["scenario"], r["concurrency"]): r for r in json.load(f)["results"]}
+
+    fake_port, app_port = _free_port(), _free_port()
+    fakes_url, app_url = f"http://127.0.0.1:{fake_port}", f"http://127.0.0.1:{app_port}"
+    with tempfile.TemporaryDirectory(prefix="mindspace-bench-") as tmp:
+        env = {
+            **os.environ,
+            "GEMINI_API_KEY": "bench",
+            "HF_API_KEY": "bench",
+            "GEMINI_BASE_URL": fakes_url,
+            "HF_BASE_URL": fakes_url,
+            "TTS_ENGINE": "http",
+            "TTS_HTTP_URL": f"{fakes_url}/tts",
+            "MOCK_AI": "false",
+            "METRICS_ENABLED": "true",
+            "DB_URL": f"sqlite:///{tmp}/bench.db",
+            "CACHE_DB_PATH": f"{tmp}/cache.db",
+            "ARTIFACT_DIR": f"{tmp}/artifacts",
+            "LOG_LEVEL": "WARNING",
+            # Every simulated user shares one IP; enable with --env ADMISSION_ENABLED=true
+            "ADMISSION_ENABLED": "false",
+            "ADMISSION_DB_PATH": f"{tmp}/admission.db",
+        }
+        for item in args.env:
+            key, _, value = item.partition("=")
+            env[key] = value
+        procs = [
+            subprocess.Popen([sys.executable, "-m", "benchmarks.fakes", "--port", str(fake_port),
+                              *fakes.forward_arguments(args)]),
+            subprocess.Popen([sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(app_port),
+                              "--log-level", "warning", "--no-access-log"], env=env),
+        ]
+        try:
+            await _wait_ready(f"{fakes_url}/stats", procs[0])
+            await _wait_ready(f"{app_url}/", procs[1])
+            limits = httpx.Limits(max_connections=max(levels) + 4, max_keepalive_connections=max(levels) + 4)
+            results = []
+            async with httpx.AsyncClient(base_url=app_url, timeout=args.timeout, limits=limits) as client:
+                for name in scenarios:
+                    for concurrency in levels:
+                        results.append(await run_level(client, fakes_url, name, concurrency, args))
+                        print(f"  {name} x{concurrency}: {results[-1]['rps']} req/s", file=sys.stderr)
+        finally:
+            for proc in procs:
+                proc.terminate()
+            for proc in procs:
+                proc.wait(10)
+
+    _print(results, baseline)
+    if args.json:
+        report = {
+            "commit": _git_commit(),
+            "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "settings": {k: v for k, v in vars(args).items() if k not in ("json", "compare")},
+            "results": results,
+        }
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"wrote {args.json}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS),
+                        help=f"comma-separated, from {', '.join(SCENARIOS)}")
+    parser.add_argument("--concurrency", default="1,8,32", help="comma-separated concurrency levels")
+    parser.add_argument("--duration", type=float, default=10.0, help="measured seconds per level")
+    parser.add_argument("--warmup", type=float, default=1.0, help="unmeasured seconds before each level")
+    parser.add_argument("--timeout", type=float, default=120.0)
+    parser.add_argument("--hot-ratio", type=float, default=0.0,
+                        help="fraction of requests reusing one of a few prompts")
+    parser.add_argument("--env", action="append", default=[], metavar="KEY=VALUE",
+                        help="extra environment for the app (repeatable)")
+    parser.add_argument("--json", help="write the report here")
+    parser.add_argument("--compare", help="earlier --json report to show deltas against")
+    fakes.add_arguments(parser)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,183 @@
+"""Lookup latency, memory and match accuracy of the near-duplicate prompt index.
+
+Fills the index with synthetic prompts spread over the mindmap, art and audio
+namespaces, then times searches (a mix of near-duplicates of stored prompts
+and unseen ones) and a save/load round trip of the index file. It then scores
+labelled prompt pairs, paraphrases that should match and hard negatives that
+must not (swapped word order, one word changed, an added negation, swapped
+numbers), and prints recall and false-positive rate per threshold, which is
+what the SIMILAR_*THRESHOLD defaults are picked from.
+
+    cd backend
+    python -m benchmarks.bench_similar --entries 100000
+    python -m benchmarks.bench_similar --entries 100000 --dim 512 --threshold 0.9
+"""
+import argparse
+import json
+import os
+import random
+import statistics
+import tempfile
+import time
+
+WORDS = (
+    "machine learning neural network history rome greece quantum physics biology cell "
+    "photosynthesis climate change ocean river mountain sunset forest city night cat dog "
+    "dragon castle robot astronaut space galaxy planet economy market stock music jazz "
+    "painting renaissance war revolution french industrial chemistry organic algebra "
+    "geometry calculus poetry novel theatre football cooking bread wine coffee travel "
+    "japan india brazil desert island volcano storm winter summer garden flower tree"
+).split()
+STYLES = ("", "oil painting", "watercolor", "pixel art", "photo", "sketch", "3d render")
+NAMESPACES = ('["mindmap","gemini-2.5-flash",{}]',
+              '["art","stable-diffusion",{"format":"variants"}]',
+              '["audio","gemini-2.5-flash",{"format":"artifact","generate_content":true}]')
+
+
+def synthetic_prompt(rng: random.Random) -> str:
+    words = rng.sample(WORDS, rng.randint(2, 5))
+    style = rng.choice(STYLES)
+    return " ".join(words) + (f", {style}" if style else "")
+
+
+# Hand-written pairs: (a, b, should match)
+PAIRS = (
+    ("mindmap on machine learning", "Machine Learning mind map", True),
+    ("A cat astronaut, floating in space!", "a cat astronaut floating in space", True),
+    ("The French Revolution", "french revolution", True),
+    ("photosynthesis in plants", "Photosynthesis in plants.", True),
+    ("sunset over mountains, oil painting", "oil painting of a sunset over the mountains", True),
+    ("a red sports car at night", "red sports car, night", True),
+    ("history of the roman empire", "The Roman Empire history", True),
+    ("dog chasing a cat", "cat chasing a dog", False),
+    ("python 2 vs python 3", "python 3 vs python 2", False),
+    ("portrait of a woman in a red dress", "portrait of a man in a red dress", False),
+    ("song about not giving up", "song about giving up", False),
+    ("sunset over the ocean", "sunrise over the ocean", False),
+    ("World War 2", "World War 1", False),
+    ("happy birthday song", "sad birthday song", False),
+    ("a cat on a mat", "a cat under a mat", False),
+    ("machine learning", "machine learning basics", False),
+)
+
+
+def paraphrase(prompt: str, rng: random.Random) -> str:
+    """Same words in the same order with another case, punctuation and filler."""
+    words = prompt.replace(",", rng.choice(("", ",", " in"))).split()
+    return rng.choice(("", "mind map on ", "an image of ", "The ")) + " ".join(words).title() + rng.choice(("", "!", "."))
+
+
+def hard_negative(prompt: str, rng: random.Random) -> str:
+    """A prompt with mostly the same words but a different meaning."""
+    words = prompt.replace(",", "").split()
+    change = rng.randrange(4)
+    if change == 0 and len(words) > 2:
+        i, j = rng.sample(range(len(words)), 2)
+        words[i], words[j] = words[j], words[i]
+    elif change == 1:
+        words[rng.randrange(len(words))] = rng.choice(WORDS)
+    elif change == 2:
+        words.insert(rng.randrange(len(words)), "not")
+    else:
+        words[rng.randrange(len(words))] = f"{rng.randint(1, 9)} vs {rng.randint(10, 99)}"
+    return " ".join(words)
+
+
+def accuracy(rng: random.Random, dim: int, thresholds, samples: int) -> None:
+    from app.similar import embed, prompt_terms
+
+    pairs = [(embed(a, dim) @ embed(b, dim), same) for a, b, same in PAIRS]
+    for _ in range(samples):
+        prompt = synthetic_prompt(rng)
+        pairs.append((embed(prompt, dim) @ embed(paraphrase(prompt, rng), dim), True))
+        other = hard_negative(prompt, rng)
+        if prompt_terms(other) != prompt_terms(prompt):  # e.g. only a filler word moved
+            pairs.append((embed(prompt, dim) @ embed(other, dim), False))
+    positives = [score for score, same in pairs if same]
+    negatives = [score for score, same in pairs if not same]
+    print(f"accuracy on {len(positives)} paraphrase and {len(negatives)} hard-negative pairs:")
+    for threshold in thresholds:
+        recall = sum(score >= threshold for score in positives) / len(positives)
+        false_pos = sum(score >= threshold for score in negatives) / len(negatives)
+        print(f"  threshold {threshold:.2f}: recall {recall:6.1%}  false positives {false_pos:6.2%}")
+    for a, b, same in PAIRS:
+        if not same:
+            print(f"  {embed(a, dim) @ embed(b, dim):.3f}  {a!r} vs {b!r}")
+
+
+def percentile(values, q: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+def main(args):
+    path = os.path.join(tempfile.mkdtemp(), "similar_index.npz")
+    os.environ.update(SIMILAR_DIM=str(args.dim), SIMILAR_MAX_ENTRIES=str(args.entries),
+                      SIMILAR_INDEX_PATH=path, SIMILAR_TOP_K=str(args.top_k))
+
+    from app.similar import SimilarityIndex, embed
+
+    rng = random.Random(0)
+    index = SimilarityIndex()
+    prompts = [(rng.choice(NAMESPACES), synthetic_prompt(rng)) for _ in range(args.entries)]
+    start = time.perf_counter()
+    for i, (namespace, prompt) in enumerate(prompts):
+        index.add(namespace, prompt, f"key-{i}")
+    add_s = time.perf_counter() - start
+    print(f"{args.entries:,} prompts, dim {args.dim}: added in {add_s:.1f} s "
+          f"({add_s / args.entries * 1e6:.0f} us each), matrix {index.vectors.nbytes / 2**20:.1f} MiB")
+
+    start = time.perf_counter()
+    for _ in range(1000):
+        embed(synthetic_prompt(rng), args.dim)
+    print(f"embedding alone: {(time.perf_counter() - start) * 1000:.0f} us per prompt")
+
+    latencies, hits, false_hits = [], 0, 0
+    for i in range(args.queries):
+        seen = i % 2 == 0
+        if seen:
+            j = rng.randrange(args.entries)
+            namespace, prompt = prompts[j][0], paraphrase(prompts[j][1], rng)
+        else:
+            namespace, prompt = rng.choice(NAMESPACES), synthetic_prompt(rng) + " " + rng.choice(WORDS)
+        start = time.perf_counter()
+        threshold = args.threshold or index.threshold(json.loads(namespace)[0])
+        found = index.search(namespace, prompt, threshold)
+        latencies.append(time.perf_counter() - start)
+        if seen and any(key == f"key-{j}" for key, _ in found):
+            hits += 1
+        elif not seen and found:
+            false_hits += 1
+    half = args.queries // 2
+    thresholds = args.threshold or ", ".join(f"{route} {index.threshold(route)}" for route in ("mindmap", "art", "audio"))
+    print(f"search over {index.size:,} entries, top-{args.top_k}, threshold {thresholds}:")
+    print(f"  p50 {percentile(latencies, 0.5) * 1000:.2f} ms  p95 {percentile(latencies, 0.95) * 1000:.2f} ms  "
+          f"p99 {percentile(latencies, 0.99) * 1000:.2f} ms  mean {statistics.mean(latencies) * 1000:.2f} ms")
+    print(f"  paraphrases found {hits}/{half}; unseen prompts matched something {false_hits}/{args.queries - half} "
+          f"(random prompts share words, so some of these are real near-duplicates)")
+
+    start = time.perf_counter()
+    index.save()
+    save_s = time.perf_counter() - start
+    start = time.perf_counter()
+    reloaded = SimilarityIndex()
+    reloaded.search(NAMESPACES[0], prompts[0][1])
+    load_s = time.perf_counter() - start
+    print(f"save {save_s:.2f} s, load {load_s:.2f} s, file {os.path.getsize(path) / 2**20:.1f} MiB, "
+          f"{reloaded.size:,} entries reloaded")
+    os.remove(path)
+
+    accuracy(rng, args.dim, sorted({0.85, 0.9, 0.93, 0.95, 0.97, 0.99} | ({args.threshold} - {None})),
+             args.pairs)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--entries", type=int, default=100_000)
+    parser.add_argument("--queries", type=int, default=2000)
+    parser.add_argument("--dim", type=int, default=256)
+    parser.add_argument("--threshold", type=float, default=None,
+                        help="Search threshold for every route (default: the per-route thresholds)")
+    parser.add_argument("--pairs", type=int, default=2000, help="Synthetic prompts to derive labelled pairs from")
+    parser.add_argument("--top-k", type=int, default=3)
+    main(parser.parse_args())
@@ -0,0 +1,56 @@
+"""Time-to-first-audio benchmark for the chunked TTS pipeline.
+
+Uses the offline TTS engine with a simulated per-request and per-character
+latency, and compares synthesizing the whole text in one call (the old
+behaviour) against the parallel chunked pipeline.
+
+    cd backend
+    python -m benchmarks.bench_tts --verses 12 --latency-ms 300 --ms-per-char 4
+"""
+import argparse
+import asyncio
+import os
+import time
+
+POEM_LINE = "The quiet river carries light across the sleeping town,"
+
+
+async def main(args):
+    os.environ["TTS_ENGINE"] = "offline"
+    os.environ["TTS_OFFLINE_LATENCY_MS"] = str(args.latency_ms)
+    os.environ["TTS_OFFLINE_MS_PER_CHAR"] = str(args.ms_per_char)
+    os.environ["TTS_WORKERS"] = str(args.workers)
+
+    from app.tts import OfflineEngine, split_text, tts
+
+    text = "\n".join(f"{POEM_LINE} verse {i}." for i in range(args.verses))
+
+    start = time.perf_counter()
+    await asyncio.to_thread(OfflineEngine().synthesize, text, "en")
+    single = time.perf_counter() - start
+
+    start = time.perf_counter()
+    first = None
+    async for _ in tts.stream(text):
+        if first is None:
+            first = time.perf_counter() - start
+    total = time.perf_counter() - start
+
+    start = time.perf_counter()
+    await tts.synthesize(text)
+    cached = time.perf_counter() - start
+
+    print(f"text={len(text)} chars, chunks={len(split_text(text))}, workers={args.workers}")
+    print(f"single call:      first audio {single * 1000:8.1f} ms, total {single * 1000:8.1f} ms")
+    print(f"chunked pipeline: first audio {first * 1000:8.1f} ms, total {total * 1000:8.1f} ms")
+    print(f"repeat (cached):  total {cached * 1000:8.1f} ms")
+    print(tts.stats())
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--verses", type=int, default=12)
+    parser.add_argument("--latency-ms", type=float, default=300)
+    parser.add_argument("--ms-per-char", type=float, default=4)
+    parser.add_argument("--workers", type=int, default=4)
+    asyncio.run(main(parser.parse_args()))
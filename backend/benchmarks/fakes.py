@@ -0,0 +1,186 @@
+"""Local fake upstreams for load tests: Gemini, Hugging Face Inference and TTS.
+
+One HTTP server answers all three with configurable latency, jitter, error
+rate and payload size, so the real app can be pointed at it with
+GEMINI_BASE_URL, HF_BASE_URL and TTS_ENGINE=http / TTS_HTTP_URL=<url>/tts.
+
+    cd backend
+    python -m benchmarks.fakes --port 8765 --gemini-latency-ms 400 --hf-error-rate 0.05
+
+Routes:
+    POST /{version}/models/{model}:generateContent        Gemini reply JSON
+    POST /{version}/models/{model}:streamGenerateContent  Gemini SSE (alt=sse)
+    POST /pipeline/text-to-image/{model}, /models/{model} image bytes
+    POST /tts                                             MP3 bytes for {"text"}
+    GET  /stats                                           request counts
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+from typing import Any, Dict, List
+
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import JSONResponse, Response, StreamingResponse
+from starlette.routing import Route
+
+# (flag, type, default, help); bench_load forwards the same options
+OPTIONS = [
+    ("--gemini-latency-ms", float, 300.0, "time to first byte of a Gemini reply"),
+    ("--gemini-jitter-ms", float, 100.0, "uniform random extra latency"),
+    ("--gemini-error-rate", float, 0.0, "fraction of Gemini calls answered with a 500"),
+    ("--gemini-bytes", int, 2000, "size of a chat reply"),
+    ("--gemini-stream-chunks", int, 20, "SSE events per streamed reply"),
+    ("--gemini-chunk-ms", float, 15.0, "delay between SSE events"),
+    ("--mindmap-nodes", int, 12, "nodes in a generated mind map"),
+    ("--hf-latency-ms", float, 1500.0, "image generation latency"),
+    ("--hf-jitter-ms", float, 500.0, "uniform random extra latency"),
+    ("--hf-error-rate", float, 0.0, "fraction of image calls answered with a 503"),
+    ("--hf-bytes", int, 400_000, "approximate size of a generated PNG"),
+    ("--tts-latency-ms", float, 150.0, "latency per TTS call"),
+    ("--tts-ms-per-char", float, 1.0, "extra latency per character"),
+    ("--tts-error-rate", float, 0.0, "fraction of TTS calls answered with a 500"),
+]
+
+_SILENT_FRAME = b"\xff\xfb\x90\x00" + b"\x00" * 413
+_WORDS = ("river light morning quiet signal garden memory pattern window orbit "
+          "lantern harbor thread echo meadow circuit canvas compass").split()
+
+
+def add_arguments(parser: argparse.ArgumentParser) -> None:
+    for flag, kind, default, help_text in OPTIONS:
+        parser.add_argument(flag, type=kind, default=default, help=help_text)
+
+
+def forward_arguments(args: argparse.Namespace) -> List[str]:
+    """The OPTIONS values of `args` as a command line for this module."""
+    argv = []
+    for flag, _, _, _ in OPTIONS:
+        argv += [flag, str(getattr(args, flag[2:].replace("-", "_")))]
+    return argv
+
+
+def _text(nbytes: int) -> str:
+    words, size = [], 0
+    while size < nbytes:
+        word = random.choice(_WORDS)
+        words.append(word)
+        size += len(word) + 1
+    return " ".join(words)
+
+
+def _mindmap(topic: str, count: int) -> Dict[str, Any]:
+    count = max(count, 2)
+    nodes = [{"id": "node-1", "type": "topicNode",
+              "data": {"label": topic[:40], "description": "Central Topic"}, "position": {"x": 0, "y": 0}}]
+    edges = []
+    branches = min(4, count - 1)
+    for i in range(2, count + 1):
+        parent = 1 if i <= branches + 1 else 2 + (i - branches - 2) % branches
+        nodes.append({"id": f"node-{i}", "type": "ideaNode",
+                      "data": {"label": f"{random.choice(_WORDS).title()} {i}", "description": _text(40)},
+                      "position": {"x": 0, "y": 0}})
+        edges.append({"id": f"e{parent}-{i}", "source": f"node-{parent}", "target": f"node-{i}"})
+    return {"nodes": nodes, "edges": edges}
+
+
+def _reply(prompt: str, args: argparse.Namespace) -> str:
+    if "expand the node" in prompt:
+        return json.dumps({"children": [
+            {"label": random.choice(_WORDS).title(), "description": _text(40), "type": "ideaNode"}
+            for _ in range(5)]})
+    if "mind map for:" in prompt:
+        topic = prompt.split('"', 2)[1] if prompt.count('"') >= 2 else "Topic"
+        return json.dumps(_mindmap(topic, args.mindmap_nodes))
+    return _text(args.gemini_bytes)
+
+
+def _candidate(text: str) -> str:
+    return json.dumps({"candidates": [{"content": {"parts": [{"text": text}], "role": "model"}}]})
+
+
+def _png(size: int) -> bytes:
+    """A decodable PNG of random pixels, about `size` bytes (noise barely compresses)."""
+    import io
+
+    from PIL import Image
+
+    side = max(1, int((size / 3) ** 0.5))
+    buf = io.BytesIO()
+    Image.frombytes("RGB", (side, side), os.urandom(side * side * 3)).save(buf, "PNG", compress_level=1)
+    return buf.getvalue()
+
+
+def create_app(args: argparse.Namespace) -> Starlette:
+    counts: Dict[str, int] = {"gemini": 0, "geminiStream": 0, "hf": 0, "tts": 0, "errors": 0}
+    image = _png(args.hf_bytes)
+
+    async def delay(latency_ms: float, jitter_ms: float = 0.0) -> None:
+        await asyncio.sleep((latency_ms + random.uniform(0, jitter_ms)) / 1000)
+
+    def failed(rate: float) -> bool:
+        if rate and random.random() < rate:
+            counts["errors"] += 1
+            return True
+        return False
+
+    async def gemini(request: Request) -> Response:
+        method = request.path_params["call"].rsplit(":", 1)[-1]
+        prompt = (await request.json())["contents"][-1]["parts"][0]["text"]
+        streaming = method == "streamGenerateContent"
+        counts["geminiStream" if streaming else "gemini"] += 1
+        await delay(args.gemini_latency_ms, args.gemini_jitter_ms)
+        if failed(args.gemini_error_rate):
+            return JSONResponse({"error": {"code": 500, "message": "fake internal error"}}, 500)
+        text = _reply(prompt, args)
+        if not streaming:
+            return Response(_candidate(text), media_type="application/json")
+
+        async def events():
+            step = max(1, len(text) // max(args.gemini_stream_chunks, 1))
+            for i in range(0, len(text), step):
+                if i:
+                    await asyncio.sleep(args.gemini_chunk_ms / 1000)
+                yield f"data: {_candidate(text[i:i + step])}\r\n\r\n"
+
+        return StreamingResponse(events(), media_type="text/event-stream")
+
+    async def hf(request: Request) -> Response:
+        counts["hf"] += 1
+        await request.body()
+        await delay(args.hf_latency_ms, args.hf_jitter_ms)
+        if failed(args.hf_error_rate):
+            return JSONResponse({"error": "Model is overloaded"}, 503)
+        return Response(image, media_type="image/png")
+
+    async def tts(request: Request) -> Response:
+        counts["tts"] += 1
+        text = (await request.json()).get("text", "")
+        await delay(args.tts_latency_ms + args.tts_ms_per_char * len(text))
+        if failed(args.tts_error_rate):
+            return JSONResponse({"error": "fake TTS failure"}, 500)
+        return Response(_SILENT_FRAME * max(1, len(text) * 60 // 26), media_type="audio/mpeg")
+
+    async def stats(request: Request) -> Response:
+        return JSONResponse(counts)
+
+    return Starlette(routes=[
+        Route("/{version}/models/{call:path}", gemini, methods=["POST"]),
+        Route("/pipeline/text-to-image/{model:path}", hf, methods=["POST"]),
+        Route("/models/{model:path}", hf, methods=["POST"]),
+        Route("/tts", tts, methods=["POST"]),
+        Route("/stats", stats),
+    ])
+
+
+if __name__ == "__main__":
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    add_arguments(parser)
+    args = parser.parse_args()
+    uvicorn.run(create_app(args), host=args.host, port=args.port, log_level="warning", access_log=False)
@@ -0,0 +1,13 @@
+import os
+import tempfile
+
+# Keep every database and state file of the app out of the working tree
+_state = tempfile.mkdtemp(prefix="mindspace-tests-")
+os.environ.setdefault("DB_URL", f"sqlite:///{_state}/backend.db")
+os.environ.setdefault("CACHE_DB_PATH", os.path.join(_state, "response_cache.db"))
+os.environ.setdefault("ADMISSION_DB_PATH", os.path.join(_state, "admission.db"))
+os.environ.setdefault("TASK_SYNC_DB_PATH", os.path.join(_state, "task_sync.db"))
+os.environ.setdefault("SIMILAR_INDEX_PATH", os.path.join(_state, "similar_index.npz"))
+os.environ.setdefault("ARTIFACT_DIR", os.path.join(_state, "artifacts"))
+os.environ.setdefault("ADMISSION_ENABLED", "false")
+os.environ.setdefault("STARTUP_WARMUP", "false")
@@ -0,0 +1,32 @@
+import asyncio
+
+import pytest
+from fastapi import HTTPException
+
+from app.routers import ai
+
+
+@pytest.fixture
+def breakers_open(monkeypatch):
+    """Every HF route has an open circuit breaker, retry in 42 s."""
+    monkeypatch.setenv("HF_API_KEY", "test")
+    monkeypatch.setenv("HF_BASE_URL", "http://hf.invalid")
+    monkeypatch.setattr(ai.upstream_routes, "order", lambda upstream, chain: [])
+    monkeypatch.setattr(ai.upstream_routes, "retry_after", lambda upstream, chain: 42)
+
+
+@pytest.mark.parametrize("hedge", ["false", "true"])
+def test_open_breakers_are_reported(breakers_open, monkeypatch, hedge):
+    monkeypatch.setenv("HF_HEDGE", hedge)
+    with pytest.raises(HTTPException) as err:
+        asyncio.run(ai._hf_generate_image_bytes("a cat", client=object()))
+    assert err.value.status_code == 502
+    assert "every endpoint is failing, retry in 42s" in err.value.detail
+
+
+def test_open_breakers_in_placeholder(breakers_open, monkeypatch):
+    monkeypatch.setenv("HF_HEDGE", "true")
+    monkeypatch.setenv("HF_PLACEHOLDER_ON_FAIL", "true")
+    data, mime = asyncio.run(ai._hf_generate_image_bytes("a cat", client=object()))
+    assert mime == "image/svg+xml"
+    assert b"every endpoint is failing, retry in 42s" in data
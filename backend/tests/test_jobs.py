@@ -0,0 +1,39 @@
+import asyncio
+import time
+
+from app.db import async_session, init_db
+from app.jobs import JobQueue
+from app.models import Job
+
+
+def test_prune_deletes_only_old_finished_jobs(monkeypatch):
+    monkeypatch.setenv("JOB_RETENTION", "3600")
+    now = time.time()
+    jobs = {
+        "old-succeeded": ("succeeded", now - 7200),
+        "old-failed": ("failed", now - 7200),
+        "new-succeeded": ("succeeded", now - 60),
+        "old-running": ("running", None),
+        "queued": ("queued", None),
+    }
+
+    async def run():
+        await init_db()
+        async with async_session() as session:
+            for job_id, (status, finished_at) in jobs.items():
+                session.add(Job(id=f"prune-{job_id}", kind="art", status=status, payload="{}",
+                                created_at=now - 9000, started_at=now - 8000, finished_at=finished_at))
+            await session.commit()
+        queue = JobQueue()
+        deleted = await queue._prune()
+        left = {job_id for job_id in jobs if await queue.get(f"prune-{job_id}") is not None}
+        return deleted, left
+
+    deleted, left = asyncio.run(run())
+    assert deleted == 2
+    assert left == {"new-succeeded", "old-running", "queued"}
+
+
+def test_zero_retention_keeps_jobs(monkeypatch):
+    monkeypatch.setenv("JOB_RETENTION", "0")
+    assert asyncio.run(JobQueue()._prune()) == 0
@@ -0,0 +1,15 @@
+from app.metrics import Counter
+from app.routers.metrics import registry
+
+
+def test_counter_mirrors_cumulative_source():
+    counter = Counter("things_total", "Things.")
+    counter.set_total(3, upstream="hf")
+    counter.set_total(5, upstream="hf")
+    assert counter.render() == ['things_total{upstream="hf"} 5']
+
+
+def test_pool_connections_are_a_counter():
+    text = registry.render()
+    assert "# TYPE upstream_pool_connections_opened_total counter" in text
+    assert "upstream_pool_new_connections" not in text
@@ -0,0 +1,33 @@
+import asyncio
+
+import httpx
+
+from app.main import app
+
+
+async def _batch_with_unknown_ids():
+    async with app.router.lifespan_context(app):
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            kept = (await client.post("/api/tasks", json={"title": "keep", "user_id": "batch-user"})).json()
+            unknown = kept["id"] + 100000
+            responses = {
+                "update": await client.post("/api/tasks/batch", json={
+                    "update": [{"id": kept["id"], "completed": True}, {"id": unknown, "completed": True}]}),
+                "delete": await client.post("/api/tasks/batch", json={
+                    "create": [{"title": "new", "user_id": "batch-user"}], "delete": [kept["id"], unknown]}),
+            }
+            tasks = (await client.get("/api/tasks/batch-user")).json()
+            deleted = await client.post("/api/tasks/batch", json={"delete": [kept["id"]]})
+    return unknown, responses, tasks, deleted
+
+
+def test_unknown_ids_reject_the_whole_batch():
+    unknown, responses, tasks, deleted = asyncio.run(_batch_with_unknown_ids())
+    for response in responses.values():
+        assert response.status_code == 404
+        assert str(unknown) in response.json()["detail"]
+    # Nothing from the rejected batches was applied
+    assert [(t["title"], t["completed"]) for t in tasks] == [("keep", False)]
+    assert deleted.status_code == 200
+    assert deleted.json()["deleted"] == 1
@@ -54,7 +54,7 @@ const ArtGenerator = () => {
       {/* Result Section */}
       {art && (
         <div className="bg-slate-900/30 rounded-lg p-4 border border-slate-700/50">
-          {art.startsWith("data:image") ? (
+          {art.startsWith("data:image") || /^https?:\/\//.test(art) ? (
             <div className="flex flex-col items-center gap-3">
               <p className="text-sm text-gray-400">Generated Image</p>
               <div className="rounded-lg overflow-hidden border border-slate-700/50 bg-slate-800/50">